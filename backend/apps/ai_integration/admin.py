@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.ai_integration.models import Prompt, Knowledge, Conversation, Message
+from apps.ai_integration.models import Prompt, Knowledge, Conversation, Message, ModelRoutingConfig, ArchivedConversation
 
 
 @admin.register(Prompt)
@@ -35,10 +35,11 @@ class KnowledgeAdmin(admin.ModelAdmin):
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
-    list_display = ['session_id', 'user', 'is_voice_chat', 'status', 'started_at']
+    list_display = ['session_id', 'user', 'is_voice_chat', 'status', 'message_count', 'started_at', 'last_message_at']
     list_filter = ['is_voice_chat', 'status', 'started_at']
     search_fields = ['session_id', 'user__email']
-    readonly_fields = ['session_id', 'started_at', 'ended_at']
+    readonly_fields = ['session_id', 'started_at', 'ended_at', 'message_count', 'last_message_at',
+                       'last_message_preview', 'last_sender']
 
 
 @admin.register(Message)
@@ -46,4 +47,20 @@ class MessageAdmin(admin.ModelAdmin):
     list_display = ['conversation', 'sender', 'message_type', 'created_at']
     list_filter = ['sender', 'message_type', 'created_at']
     search_fields = ['conversation__session_id', 'content']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    readonly_fields = ['created_at']
+
+
+@admin.register(ModelRoutingConfig)
+class ModelRoutingConfigAdmin(admin.ModelAdmin):
+    list_display = ['group_id', 'is_enabled', 'fast_model', 'strong_model', 'fast_max_chars', 'updated_at']
+    list_filter = ['is_enabled']
+    search_fields = ['group_id', 'fast_model', 'strong_model']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(ArchivedConversation)
+class ArchivedConversationAdmin(admin.ModelAdmin):
+    list_display = ['session_id', 'user', 'status', 'message_count', 'ended_at', 'segment', 'archived_at']
+    list_filter = ['status', 'is_voice_chat', 'archived_at']
+    search_fields = ['id', 'session_id', 'user__email']
+    readonly_fields = [field.name for field in ArchivedConversation._meta.fields]
\ No newline at end of file
@@ -0,0 +1,328 @@
+"""
+LLM admission control for Omnifin Platform
+
+Every chat turn is admitted per tenant (``group_id``) before it reaches the
+model:
+
+- the group's cached monthly usage must be under its plan limit
+- token buckets cap requests and tokens per minute
+- a lease set caps concurrent LLM calls
+
+State lives in Redis so limits hold across workers, with an in-process
+fallback when Redis is not configured or unreachable. Requests that cannot
+be admitted wait briefly, then fail fast with a Retry-After hint.
+"""
+
+import logging
+import math
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Any
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger('omnifin')
+
+# Both buckets are checked together and only debited if both can pay, so a
+# request is never charged for a call it was refused. Returns the wait in seconds.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local force = tonumber(ARGV[2])
+local wait = 0
+local levels = {}
+for i = 1, 2 do
+    local capacity = tonumber(ARGV[i * 3])
+    local rate = tonumber(ARGV[i * 3 + 1])
+    local cost = tonumber(ARGV[i * 3 + 2])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if force == 0 and cost > tokens then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+end
+if wait == 0 then
+    for i = 1, 2 do
+        local capacity = tonumber(ARGV[i * 3])
+        local rate = tonumber(ARGV[i * 3 + 1])
+        local tokens = math.min(capacity, levels[i] - tonumber(ARGV[i * 3 + 2]))
+        redis.call('HSET', KEYS[i], 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', KEYS[i], math.ceil(capacity / rate) + 60)
+    end
+end
+return tostring(wait)
+"""
+
+# Leases expire on their own, so a crashed worker cannot hold a slot forever
+CONCURRENCY_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[4])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return 1
+"""
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; ``retry_after`` is in seconds"""
+
+    def __init__(self, reason: str, message: str, retry_after: int):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class LocalAdmissionState:
+    """In-process token buckets and concurrency leases"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, float]] = {}
+        self._leases: Dict[str, Dict[str, float]] = {}
+
+    def take(self, keys, limits, costs, force=False) -> float:
+        now = time.time()
+        with self._lock:
+            levels = []
+            wait = 0.0
+            for key, (capacity, rate), cost in zip(keys, limits, costs):
+                bucket = self._buckets.get(key, {'tokens': capacity, 'ts': now})
+                tokens = min(capacity, bucket['tokens'] + max(0.0, now - bucket['ts']) * rate)
+                levels.append(tokens)
+                if not force and cost > tokens:
+                    wait = max(wait, (cost - tokens) / rate)
+            if wait == 0:
+                for key, (capacity, _), cost, tokens in zip(keys, limits, costs, levels):
+                    self._buckets[key] = {'tokens': min(capacity, tokens - cost), 'ts': now}
+            return wait
+
+    def acquire_slot(self, key, limit, lease_seconds, lease_id) -> bool:
+        now = time.time()
+        with self._lock:
+            leases = {lease: expires for lease, expires in self._leases.get(key, {}).items() if expires > now}
+            if len(leases) >= limit:
+                self._leases[key] = leases
+                return False
+            leases[lease_id] = now + lease_seconds
+            self._leases[key] = leases
+            return True
+
+    def release_slot(self, key, lease_id) -> None:
+        with self._lock:
+            self._leases.get(key, {}).pop(lease_id, None)
+
+
+class RedisAdmissionState:
+    """Token buckets and concurrency leases shared through Redis"""
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._take = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._acquire = self.client.register_script(CONCURRENCY_SCRIPT)
+
+    def take(self, keys, limits, costs, force=False) -> float:
+        args = [time.time(), 1 if force else 0]
+        for (capacity, rate), cost in zip(limits, costs):
+            args.extend([capacity, rate, cost])
+        return float(self._take(keys=list(keys), args=args))
+
+    def acquire_slot(self, key, limit, lease_seconds, lease_id) -> bool:
+        return bool(self._acquire(keys=[key], args=[time.time(), limit, lease_seconds, lease_id]))
+
+    def release_slot(self, key, lease_id) -> None:
+        self.client.zrem(key, lease_id)
+
+
+class AdmissionTicket:
+    """An admitted LLM request; settle actual tokens and release its slot when done"""
+
+    def __init__(self, controller: 'LLMAdmissionController', scope: str, estimated_tokens: int, lease_id: str):
+        self.controller = controller
+        self.scope = scope
+        self.estimated_tokens = estimated_tokens
+        self.lease_id = lease_id
+        self.released = False
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """Correct the token bucket by the difference between estimate and actual use"""
+        if actual_tokens is None or actual_tokens == self.estimated_tokens:
+            return
+        self.controller._settle(self.scope, actual_tokens - self.estimated_tokens)
+        self.estimated_tokens = actual_tokens
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release(self.scope, self.lease_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+
+class LLMAdmissionController:
+    """Per-tenant quota, rate and concurrency gate in front of the LLM"""
+
+    KEY_PREFIX = 'ai_admission'
+    QUOTA_KEY_PREFIX = 'ai_quota'
+
+    _local_state = LocalAdmissionState()
+    _redis_state = None
+    _redis_lock = threading.Lock()
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return settings.AI_ADMISSION_ENABLED
+
+    @staticmethod
+    def scope_for(user) -> str:
+        group_id = getattr(user, 'group_id', None)
+        return f"group:{group_id}" if group_id else f"user:{user.id}"
+
+    def admit(self, user, estimated_tokens: int) -> AdmissionTicket:
+        """Admit a request or raise AdmissionRejected after at most AI_ADMISSION_MAX_QUEUE_SECONDS"""
+        scope = self.scope_for(user)
+        lease_id = uuid.uuid4().hex
+        ticket = AdmissionTicket(self, scope, estimated_tokens, lease_id)
+        if not self.enabled():
+            ticket.released = True
+            return ticket
+
+        self._check_quota(user)
+
+        deadline = time.monotonic() + settings.AI_ADMISSION_MAX_QUEUE_SECONDS
+        keys, limits = self._bucket_spec(scope)
+        costs = [1, min(estimated_tokens, settings.AI_ADMISSION_TOKENS_PER_MINUTE)]
+
+        # Queue briefly for rate budget, then for a concurrency slot
+        while True:
+            wait = self._state_call('take', keys, limits, costs)
+            if wait <= 0:
+                break
+            if time.monotonic() + wait > deadline:
+                raise AdmissionRejected(
+                    'rate_limited',
+                    'Too many AI requests for your organization. Please try again shortly.',
+                    wait
+                )
+            time.sleep(min(wait, 0.25))
+
+        while not self._state_call('acquire_slot', self._key(scope, 'concurrency'),
+                                   settings.AI_ADMISSION_MAX_CONCURRENT, settings.AI_ADMISSION_LEASE_SECONDS, lease_id):
+            if time.monotonic() >= deadline:
+                # Give back the budget taken for a call that will not happen
+                self._settle(scope, -costs[1], requests=-1)
+                raise AdmissionRejected(
+                    'concurrency_limited',
+                    'Your organization has too many AI requests in progress. Please try again shortly.',
+                    settings.AI_ADMISSION_RETRY_AFTER_SECONDS
+                )
+            time.sleep(0.05)
+
+        ticket.released = False
+        return ticket
+
+    @classmethod
+    def record_usage(cls, user, tokens_used: int, usage_type: str = 'llm') -> None:
+        """Add recorded usage to the cached quota counters"""
+        if not getattr(user, 'group_id', None):
+            return
+        key = f"{cls.QUOTA_KEY_PREFIX}:{user.group_id}"
+        quota = cache.get(key)
+        if quota:
+            quota[f'{usage_type}_used'] = quota.get(f'{usage_type}_used', 0) + tokens_used
+            cache.set(key, quota, settings.AI_ADMISSION_QUOTA_CACHE_TTL)
+
+    def _check_quota(self, user) -> None:
+        quota = self._get_quota(user)
+        if quota and quota['llm_limit'] and quota['llm_used'] >= quota['llm_limit']:
+            raise AdmissionRejected(
+                'quota_exceeded',
+                'Your organization has reached its monthly AI token limit. Upgrade your plan to continue.',
+                min(max(1, quota['period_end'] - timezone.now().timestamp()), 86400)
+            )
+
+    def _get_quota(self, user) -> Optional[Dict[str, Any]]:
+        """The group's current-period usage, cached for AI_ADMISSION_QUOTA_CACHE_TTL seconds"""
+        group_id = getattr(user, 'group_id', None)
+        if not group_id:
+            return None
+
+        key = f"{self.QUOTA_KEY_PREFIX}:{group_id}"
+        quota = cache.get(key)
+        if quota is not None:
+            return quota or None
+
+        from apps.subscriptions.usage_models import UsageSummary
+        summary = UsageSummary.objects.filter(
+            group_id=group_id,
+            subscription__status__in=['active', 'incomplete', 'trialing'],
+            period_end__gte=timezone.now()
+        ).order_by('-period_start').first()
+
+        # An empty dict caches "no subscription" so unmetered groups do not query every turn
+        quota = {
+            'llm_used': summary.llm_tokens_used,
+            'llm_limit': summary.llm_tokens_limit,
+            'period_end': summary.period_end.timestamp(),
+        } if summary else {}
+        cache.set(key, quota, settings.AI_ADMISSION_QUOTA_CACHE_TTL)
+        return quota or None
+
+    def _bucket_spec(self, scope: str):
+        requests_per_minute = settings.AI_ADMISSION_REQUESTS_PER_MINUTE
+        tokens_per_minute = settings.AI_ADMISSION_TOKENS_PER_MINUTE
+        keys = [self._key(scope, 'requests'), self._key(scope, 'tokens')]
+        limits = [(requests_per_minute, requests_per_minute / 60.0), (tokens_per_minute, tokens_per_minute / 60.0)]
+        return keys, limits
+
+    def _settle(self, scope: str, tokens: int, requests: int = 0) -> None:
+        keys, limits = self._bucket_spec(scope)
+        try:
+            self._state_call('take', keys, limits, [requests, tokens], force=True)
+        except Exception as e:
+            logger.warning(f"Could not settle admission tokens for {scope}: {str(e)}")
+
+    def _release(self, scope: str, lease_id: str) -> None:
+        try:
+            self._state_call('release_slot', self._key(scope, 'concurrency'), lease_id)
+        except Exception as e:
+            logger.warning(f"Could not release admission slot for {scope}: {str(e)}")
+
+    def _state_call(self, method: str, *args, **kwargs):
+        state = self._get_redis_state()
+        if state is not None:
+            try:
+                return getattr(state, method)(*args, **kwargs)
+            except Exception as e:
+                logger.warning(f"Redis admission state unavailable, using local limits: {str(e)}")
+        return getattr(self._local_state, method)(*args, **kwargs)
+
+    @classmethod
+    def _get_redis_state(cls) -> Optional[RedisAdmissionState]:
+        if settings.AI_ADMISSION_BACKEND != 'redis':
+            return None
+        with cls._redis_lock:
+            if cls._redis_state is None:
+                try:
+                    cls._redis_state = RedisAdmissionState(settings.REDIS_URL)
+                except Exception as e:
+                    logger.warning(f"Could not connect admission control to Redis: {str(e)}")
+                    return None
+            return cls._redis_state
+
+    @classmethod
+    def _key(cls, scope: str, name: str) -> str:
+        return f"{cls.KEY_PREFIX}:{scope}:{name}"
@@ -0,0 +1,104 @@
+"""
+Batch conversation analysis for Omnifin Platform
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from apps.ai_integration.models import Conversation
+from apps.ai_integration.services import AIAnalyticsService
+
+logger = logging.getLogger('omnifin')
+
+
+class RateLimiter:
+    """Spaces calls evenly to at most ``per_minute`` across threads"""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ConversationAnalysisBatch:
+    """Analyze completed conversations that are new or changed since their last analysis"""
+
+    def __init__(self, workers: int = None, requests_per_minute: int = None, batch_size: int = 100,
+                 force: bool = False, service: AIAnalyticsService = None):
+        self.workers = workers or settings.AI_ANALYSIS_MAX_WORKERS
+        self.rate_limiter = RateLimiter(requests_per_minute or settings.AI_ANALYSIS_REQUESTS_PER_MINUTE)
+        self.batch_size = batch_size
+        self.force = force
+        self.service = service or AIAnalyticsService()
+
+    def candidates(self):
+        """Completed conversations never analyzed, or with messages newer than their analysis"""
+        conversations = Conversation.objects.filter(status='completed', message_count__gt=0)
+        if not self.force:
+            conversations = conversations.filter(
+                Q(analyzed_at__isnull=True) | Q(last_message_at__gt=F('analyzed_at'))
+            )
+        return conversations.order_by('pk')
+
+    def run(self, limit: int = None, progress=None) -> Dict[str, int]:
+        stats = {'selected': 0, 'analyzed': 0, 'skipped': 0, 'failed': 0}
+        last_pk = None
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ai-analysis') as executor:
+            while limit is None or stats['selected'] < limit:
+                size = self.batch_size if limit is None else min(self.batch_size, limit - stats['selected'])
+                batch_qs = self.candidates() if last_pk is None else self.candidates().filter(pk__gt=last_pk)
+                batch = list(batch_qs.only('id', 'analysis_hash')[:size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                stats['selected'] += len(batch)
+
+                self._run_batch(batch, executor, stats)
+                if progress:
+                    progress(last_pk, stats)
+
+        return stats
+
+    def _run_batch(self, batch, executor, stats) -> None:
+        futures = {}
+        unchanged = []
+
+        # Transcripts are read here; worker threads only talk to the model
+        for conversation in batch:
+            transcript, content_hash, message_count = self.service.build_transcript(conversation.id)
+            if not message_count or (not self.force and content_hash == conversation.analysis_hash):
+                unchanged.append(conversation.id)
+                continue
+            futures[executor.submit(self._analyze, transcript)] = (conversation.id, content_hash)
+
+        if unchanged:
+            # Same content as the stored analysis; stamp it so it is not selected again
+            Conversation.objects.filter(id__in=unchanged).update(analyzed_at=timezone.now())
+            stats['skipped'] += len(unchanged)
+
+        for future in as_completed(futures):
+            conversation_id, content_hash = futures[future]
+            try:
+                self.service.store_analysis(conversation_id, future.result(), content_hash)
+                stats['analyzed'] += 1
+            except Exception as e:
+                logger.error(f"Error analyzing conversation {conversation_id}: {str(e)}")
+                stats['failed'] += 1
+
+    def _analyze(self, transcript: str):
+        self.rate_limiter.acquire()
+        return self.service.analyze_transcript(transcript)
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class AIIntegrationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.ai_integration'
\ No newline at end of file
+    name = 'apps.ai_integration'
+    
+    def ready(self):
+        import apps.ai_integration.signals
@@ -0,0 +1,212 @@
+"""
+Conversation cold-storage archival for Omnifin Platform
+
+Conversations that ended long ago are written to append-only NDJSON
+segment files, one gzip member per conversation, and removed from the live
+tables. Concatenated gzip members are themselves a valid gzip file, so a
+segment can be inspected with ``zcat`` while the index still allows a
+single conversation to be read by seeking to its member.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import uuid
+import zlib
+from datetime import timedelta
+from typing import Any, Dict, Iterator, List
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from apps.ai_integration.models import ArchivedConversation, Conversation, Message
+from apps.ai_integration.history_buffer import ConversationHistoryBuffer
+
+logger = logging.getLogger('omnifin')
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ArchiveSegmentWriter:
+    """Appends gzip members to the current segment, rotating it by size"""
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        self.directory = directory or str(settings.AI_ARCHIVE_DIR)
+        self.max_bytes = max_bytes or settings.AI_ARCHIVE_SEGMENT_MAX_BYTES
+        self.segment = None
+        self._file = None
+
+    def append(self, lines: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+        """Write one conversation's records as a gzip member; returns its location"""
+        if self._file is None or self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+        offset = self._file.tell()
+        checksum = hashlib.sha256()
+        compressor = zlib.compressobj(wbits=GZIP_WBITS)
+
+        def write(data: bytes) -> None:
+            if data:
+                checksum.update(data)
+                self._file.write(data)
+
+        for line in lines:
+            write(compressor.compress(json.dumps(line, cls=DjangoJSONEncoder).encode('utf-8') + b'\n'))
+        write(compressor.flush())
+
+        return {
+            'segment': self.segment,
+            'offset': offset,
+            'length': self._file.tell() - offset,
+            'checksum': checksum.hexdigest(),
+        }
+
+    def sync(self) -> None:
+        """Make everything written so far durable before the live rows go"""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _rotate(self) -> None:
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.segment = f"conversations-{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+        self._file = open(os.path.join(self.directory, self.segment), 'ab')
+
+
+class ConversationArchiver:
+    """Move conversations that ended more than ``days`` ago into archive segments"""
+
+    CONVERSATION_FIELDS = [field.attname for field in Conversation._meta.concrete_fields]
+    MESSAGE_FIELDS = [field.attname for field in Message._meta.concrete_fields]
+
+    def __init__(self, days: int = None, batch_size: int = None, delete_batch_size: int = None,
+                 writer: ArchiveSegmentWriter = None):
+        self.days = settings.AI_ARCHIVE_AFTER_DAYS if days is None else days
+        self.batch_size = batch_size or settings.AI_ARCHIVE_BATCH_SIZE
+        self.delete_batch_size = delete_batch_size or settings.AI_ARCHIVE_DELETE_BATCH_SIZE
+        self.writer = writer or ArchiveSegmentWriter()
+
+    def candidates(self):
+        cutoff = timezone.now() - timedelta(days=self.days)
+        return (
+            Conversation.objects.filter(ended_at__lt=cutoff)
+            .exclude(status='active')
+            .order_by('ended_at', 'pk')
+        )
+
+    def run(self, limit: int = None, dry_run: bool = False, progress=None) -> Dict[str, int]:
+        stats = {'conversations': 0, 'messages': 0}
+        if dry_run:
+            candidates = self.candidates()
+            stats['conversations'] = candidates.count() if limit is None else min(limit, candidates.count())
+            return stats
+
+        try:
+            while limit is None or stats['conversations'] < limit:
+                size = self.batch_size if limit is None else min(self.batch_size, limit - stats['conversations'])
+                # Archived rows are deleted, so each batch is simply the next oldest
+                batch = list(self.candidates().values(*self.CONVERSATION_FIELDS)[:size])
+                if not batch:
+                    break
+                stats['messages'] += self._archive_batch(batch)
+                stats['conversations'] += len(batch)
+                if progress:
+                    progress(stats)
+        finally:
+            self.writer.close()
+        return stats
+
+    def _archive_batch(self, batch: List[Dict[str, Any]]) -> int:
+        entries = []
+        for conversation in batch:
+            location = self.writer.append(self._records(conversation))
+            entries.append(ArchivedConversation(
+                id=conversation['id'],
+                user_id=conversation['user_id'],
+                session_id=conversation['session_id'],
+                is_voice_chat=conversation['is_voice_chat'],
+                status=conversation['status'],
+                started_at=conversation['started_at'],
+                ended_at=conversation['ended_at'],
+                message_count=conversation['message_count'],
+                last_message_at=conversation['last_message_at'],
+                **location
+            ))
+        self.writer.sync()
+
+        conversation_ids = [conversation['id'] for conversation in batch]
+        deleted = 0
+        with transaction.atomic():
+            ArchivedConversation.objects.bulk_create(entries)
+            # Raw deletes: the archive is the record, so per-row signals and
+            # audit entries for millions of messages are not wanted here
+            while True:
+                message_ids = list(
+                    Message.objects.filter(conversation_id__in=conversation_ids)
+                    .values_list('id', flat=True)[:self.delete_batch_size]
+                )
+                if not message_ids:
+                    break
+                deleted += Message.objects.filter(id__in=message_ids)._raw_delete(Message.objects.db)
+            Conversation.objects.filter(id__in=conversation_ids)._raw_delete(Conversation.objects.db)
+            transaction.on_commit(lambda: [ConversationHistoryBuffer.invalidate(cid) for cid in conversation_ids])
+
+        logger.info(f"Archived {len(batch)} conversations ({deleted} messages) to {self.writer.segment}")
+        return deleted
+
+    def _records(self, conversation: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        yield conversation
+        messages = (
+            Message.objects.filter(conversation_id=conversation['id'])
+            .order_by('created_at')
+            .values(*self.MESSAGE_FIELDS)
+        )
+        yield from messages.iterator(chunk_size=self.delete_batch_size)
+
+
+class ConversationArchiveReader:
+    """Stream a conversation back out of its archive segment"""
+
+    @staticmethod
+    def iter_records(archived: ArchivedConversation) -> Iterator[Dict[str, Any]]:
+        """Yield the conversation record, then its messages oldest first"""
+        path = os.path.join(str(settings.AI_ARCHIVE_DIR), archived.segment)
+        checksum = hashlib.sha256()
+        decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+        pending = b''
+
+        with open(path, 'rb') as segment:
+            segment.seek(archived.offset)
+            remaining = archived.length
+            while remaining > 0:
+                chunk = segment.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                checksum.update(chunk)
+                lines = (pending + decompressor.decompress(chunk)).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    if line:
+                        yield json.loads(line)
+
+        pending += decompressor.flush()
+        if pending.strip():
+            yield json.loads(pending)
+        if remaining or checksum.hexdigest() != archived.checksum:
+            raise ValueError(f"Archive record for conversation {archived.id} is truncated or corrupt")
+
+    @classmethod
+    def iter_messages(cls, archived: ArchivedConversation) -> Iterator[Dict[str, Any]]:
+        records = cls.iter_records(archived)
+        next(records, None)
+        yield from records
@@ -0,0 +1,202 @@
+"""
+Conversation context builder for Omnifin Platform
+
+Fits conversation history into a token budget. Turns that no longer fit
+are folded into a rolling summary kept on ``Conversation.metadata`` so the
+prompt stays bounded regardless of conversation length. At most as many
+recent messages as could fit the budget are loaded per turn, and the
+summary call runs under its own timeout so it cannot stall the reply.
+"""
+
+import logging
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.ai_integration.models import Conversation, Message
+from apps.ai_integration.history_buffer import ConversationHistoryBuffer
+
+logger = logging.getLogger('omnifin')
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:  # tiktoken is optional
+    _encoding = None
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_TOKEN_OVERHEAD = 4
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text, estimating ~4 characters per token without tiktoken"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+def message_tokens(message: Message) -> int:
+    """Token count of a message, cached on the row's ``token_count``"""
+    if message.token_count is None:
+        message.token_count = count_tokens(message.content)
+    return message.token_count + MESSAGE_TOKEN_OVERHEAD
+
+
+class ConversationContextBuilder:
+    """Build token-budgeted history with a rolling summary of older turns"""
+
+    SUMMARY_METADATA_KEY = 'rolling_summary'
+
+    def __init__(self, client=None, model: str = None, usage_callback=None):
+        self.client = client
+        self.usage_callback = usage_callback
+        self.model = model or settings.AI_MODEL
+        self.token_budget = settings.AI_CONTEXT_TOKEN_BUDGET
+        self.summary_max_tokens = settings.AI_SUMMARY_MAX_TOKENS
+        self.summary_min_messages = settings.AI_SUMMARY_MIN_MESSAGES
+        self.summary_timeout = settings.AI_SUMMARY_TIMEOUT_SECONDS
+        # Every message costs at least one token plus the overhead, so no more can fit
+        self.max_messages = max(1, self.token_budget // (MESSAGE_TOKEN_OVERHEAD + 1))
+
+    def build_history(self, conversation: Conversation) -> List[Dict[str, str]]:
+        """Return chat messages (oldest first) that fit the token budget"""
+        summary = conversation.metadata.get(self.SUMMARY_METADATA_KEY) or {}
+        unsummarized, backlog = self._get_unsummarized_messages(conversation, summary)
+        self._cache_token_counts(unsummarized)
+
+        summary_tokens = summary.get('token_count', 0)
+        recent, overflow = self._fit_to_budget(unsummarized, self.token_budget - summary_tokens)
+        if backlog:
+            # Messages older than the loaded ones are not summarized yet; fold them first, oldest first
+            overflow = self._get_backlog(conversation, summary)
+
+        # Fold overflowing turns into the summary in batches, not every turn
+        if len(overflow) >= self.summary_min_messages or (backlog and overflow):
+            updated = self._update_summary(conversation, summary, overflow)
+            if updated:
+                summary = updated
+                folded_until = overflow[-1].created_at
+                recent, _ = self._fit_to_budget(
+                    [message for message in unsummarized if message.created_at > folded_until],
+                    self.token_budget - summary['token_count']
+                )
+
+        history = []
+        if summary.get('text'):
+            history.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary['text']}"
+            })
+
+        for message in recent:
+            role = 'user' if message.sender == 'user' else 'assistant'
+            history.append({
+                "role": role,
+                "content": message.content
+            })
+
+        return history
+
+    def _get_unsummarized_messages(self, conversation: Conversation, summary: Dict):
+        """The most recent messages newer than the summary, oldest first
+
+        Returns ``(messages, backlog)``; ``backlog`` is True when older
+        unsummarized messages exist beyond those loaded.
+        """
+        summarized_until = self._summarized_until(summary)
+
+        # Active sessions are served from the cache-resident ring buffer
+        buffered = ConversationHistoryBuffer.get_messages_since(conversation, summarized_until)
+        if buffered is not None:
+            return buffered, False
+
+        messages = Message.objects.filter(conversation=conversation)
+        if summarized_until:
+            messages = messages.filter(created_at__gt=summarized_until)
+        newest = list(messages.order_by('-created_at')[:self.max_messages + 1])
+        backlog = len(newest) > self.max_messages
+        return list(reversed(newest[:self.max_messages])), backlog
+
+    def _get_backlog(self, conversation: Conversation, summary: Dict) -> List[Message]:
+        """The oldest unsummarized messages, at most one window's worth"""
+        summarized_until = self._summarized_until(summary)
+        messages = Message.objects.filter(conversation=conversation)
+        if summarized_until:
+            messages = messages.filter(created_at__gt=summarized_until)
+        return list(messages.order_by('created_at')[:self.max_messages])
+
+    @staticmethod
+    def _summarized_until(summary: Dict):
+        return parse_datetime(summary['summarized_until']) if summary.get('summarized_until') else None
+
+    def _cache_token_counts(self, messages: List[Message]) -> None:
+        """Persist token counts for messages that have not been counted yet"""
+        uncounted = [message for message in messages if message.token_count is None]
+        for message in uncounted:
+            message.token_count = count_tokens(message.content)
+        if uncounted:
+            Message.objects.bulk_update(uncounted, ['token_count'])
+
+    def _fit_to_budget(self, messages: List[Message], budget: int):
+        """Split messages into (recent that fit the budget, older overflow)"""
+        used = 0
+        split = len(messages)
+        for position in range(len(messages) - 1, -1, -1):
+            tokens = message_tokens(messages[position])
+            # The newest message is always kept, even if on its own it exceeds the budget
+            if used + tokens > budget and position < len(messages) - 1:
+                break
+            used += tokens
+            split = position
+        return messages[split:], messages[:split]
+
+    def _update_summary(self, conversation: Conversation, summary: Dict, overflow: List[Message]) -> Optional[Dict]:
+        """Incrementally fold overflowing messages into the rolling summary"""
+        if not self.client:
+            return None
+
+        try:
+            transcript = "\n".join(
+                f"{'User' if message.sender == 'user' else 'Assistant'}: {message.content}"
+                for message in overflow
+            )
+            previous = summary.get('text') or 'None yet.'
+
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You maintain a running summary of a loan application chat. Keep every fact the applicant gave (amounts, purpose, terms, income, documents) and any open questions. Be concise."
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Current summary:\n{previous}\n\nNew messages:\n{transcript}\n\nReturn the updated summary."
+                    }
+                ],
+                max_tokens=self.summary_max_tokens,
+                temperature=0.2,
+                timeout=self.summary_timeout
+            )
+            text = (response.choices[0].message.content or '').strip()
+
+            if self.usage_callback and getattr(response, 'usage', None):
+                self.usage_callback(response.usage.total_tokens)
+
+            updated = {
+                'text': text,
+                'token_count': count_tokens(text) + MESSAGE_TOKEN_OVERHEAD,
+                'summarized_until': overflow[-1].created_at.isoformat(),
+                'message_count': summary.get('message_count', 0) + len(overflow),
+                'updated_at': timezone.now().isoformat(),
+            }
+
+            conversation.metadata[self.SUMMARY_METADATA_KEY] = updated
+            conversation.save(update_fields=['metadata'])
+            return updated
+
+        except Exception as e:
+            logger.warning(f"Could not update rolling summary for conversation {conversation.id}: {str(e)}")
+            return None
@@ -0,0 +1,148 @@
+"""
+Deadline propagation and hedged upstream calls for Omnifin Platform
+
+A request's end-to-end budget travels with it as a Deadline, and every
+upstream call (LLM, STT, TTS) is given only the time that remains. An
+idempotent call may also be hedged: if the first attempt has not answered
+within the operation's recent p95 latency, an identical second attempt is
+sent and whichever succeeds first wins.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+from django.conf import settings
+
+logger = logging.getLogger('omnifin')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class DeadlineExceeded(Exception):
+    """The request's budget ran out before an upstream call could finish"""
+
+
+class Deadline:
+    """An end-to-end time budget measured on the monotonic clock"""
+
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self) -> float:
+        """Time left for the next upstream call; raises when too little is left to be useful"""
+        remaining = self.remaining()
+        if remaining < settings.AI_DEADLINE_MIN_CALL_SECONDS:
+            raise DeadlineExceeded(f"Only {remaining:.2f}s of the {self.budget_seconds}s budget left")
+        return remaining
+
+
+class LatencyTracker:
+    """Recent successful call latencies per operation, kept in this process"""
+
+    def __init__(self, window: int = None):
+        self.window = window or settings.AI_HEDGE_LATENCY_WINDOW
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(operation)
+            if samples is None:
+                samples = self._samples[operation] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, operation: str, fraction: float = 0.95) -> Optional[float]:
+        """The latency below which ``fraction`` of recent calls finished; None until enough samples exist"""
+        with self._lock:
+            samples = sorted(self._samples.get(operation, ()))
+        if len(samples) < settings.AI_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(fraction * len(samples)) - 1)]
+
+
+latency_tracker = LatencyTracker()
+
+
+def call_upstream(operation: str, call: Callable[[float], Any], deadline: Deadline, hedge: bool = False) -> Any:
+    """Run ``call(timeout)`` within the deadline, hedging it after the p95 delay if allowed
+
+    ``operation`` names the latency distribution the call belongs to (for
+    example ``chat:gpt-4o-mini``). Only pass ``hedge=True`` for calls that
+    are safe to send twice.
+    """
+    timeout = deadline.timeout()
+    delay = _hedge_delay(operation, deadline) if hedge else None
+
+    if delay is None:
+        try:
+            return _timed(operation, call, timeout)
+        except Exception as e:
+            if deadline.remaining() < settings.AI_DEADLINE_MIN_CALL_SECONDS:
+                raise DeadlineExceeded(f"{operation} did not finish within the request budget") from e
+            raise
+
+    executor = _get_executor()
+    pending = {executor.submit(_timed, operation, call, timeout)}
+    done, _ = wait(pending, timeout=delay)
+    if not done and deadline.remaining() >= settings.AI_DEADLINE_MIN_CALL_SECONDS:
+        logger.info(f"Hedging {operation} after {delay * 1000:.0f}ms")
+        pending.add(executor.submit(_timed, operation, call, deadline.remaining()))
+
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            # The losing attempts finish (or time out) in the background
+            raise DeadlineExceeded(f"{operation} did not finish within the request budget")
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+
+    if deadline.remaining() < settings.AI_DEADLINE_MIN_CALL_SECONDS:
+        raise DeadlineExceeded(f"{operation} did not finish within the request budget") from error
+    raise error
+
+
+def _hedge_delay(operation: str, deadline: Deadline) -> Optional[float]:
+    if not settings.AI_HEDGE_ENABLED:
+        return None
+    p95 = latency_tracker.percentile(operation)
+    if p95 is None:
+        return None
+    delay = max(p95, settings.AI_HEDGE_MIN_DELAY_MS / 1000.0)
+    # A hedge sent with almost no budget left cannot win
+    if delay + settings.AI_DEADLINE_MIN_CALL_SECONDS >= deadline.remaining():
+        return None
+    return delay
+
+
+def _timed(operation: str, call: Callable[[float], Any], timeout: float) -> Any:
+    started = time.monotonic()
+    result = call(timeout)
+    latency_tracker.record(operation, time.monotonic() - started)
+    return result
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.AI_HEDGE_MAX_WORKERS,
+                thread_name_prefix='ai-upstream'
+            )
+        return _executor
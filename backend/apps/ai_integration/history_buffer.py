@@ -0,0 +1,173 @@
+"""
+Conversation history ring buffer for Omnifin Platform
+
+Keeps the most recent messages of each conversation in the cache
+backend. Messages are written through on create so
+active sessions assemble history without touching the database. Appends
+and priming take a short per-conversation lock, since the cache API has
+no atomic read-modify-write of the buffer.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
+from apps.ai_integration.models import Message
+
+logger = logging.getLogger('omnifin')
+
+
+class ConversationHistoryBuffer:
+    """Cache-resident ring buffer of recent messages per conversation"""
+
+    KEY_PREFIX = 'ai_history_buffer'
+    LOCK_TIMEOUT = 5
+    LOCK_POLL_SECONDS = 0.01
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return settings.AI_HISTORY_BUFFER_ENABLED
+
+    @classmethod
+    def append(cls, message: Message) -> None:
+        """Write a newly created message through to its conversation's buffer"""
+        if not cls.enabled():
+            return
+        try:
+            key = cls._key(message.conversation_id)
+            with cls._lock(message.conversation_id):
+                buffer = cache.get(key)
+                if buffer is None:
+                    # Not primed yet; the next read loads it from the database
+                    return
+                # Priming may already have read it from the database
+                if any(entry['id'] == str(message.id) for entry in buffer['messages']):
+                    return
+
+                cls._count_tokens([message])
+                buffer['messages'].append(cls._serialize(message))
+                cls._trim(buffer)
+                cache.set(key, buffer, settings.AI_HISTORY_BUFFER_TTL)
+        except Exception as e:
+            logger.warning(f"Could not append to history buffer: {str(e)}")
+            cls.invalidate(message.conversation_id)
+
+    @classmethod
+    def get_messages_since(cls, conversation, since=None) -> Optional[List[Message]]:
+        """Messages newer than ``since`` (oldest first), or None if the buffer cannot answer"""
+        if not cls.enabled():
+            return None
+
+        buffer = cls._get_or_prime(conversation)
+        if buffer is None:
+            return None
+
+        entries = buffer['messages']
+        # Older messages were trimmed out; only answer if none of them are needed
+        if not buffer['complete']:
+            if since is None or not entries or parse_datetime(entries[0]['created_at']) > since:
+                return None
+
+        messages = [cls._deserialize(entry, conversation.id) for entry in entries]
+        if since is not None:
+            messages = [message for message in messages if message.created_at > since]
+        return messages
+
+    @classmethod
+    def invalidate(cls, conversation_id) -> None:
+        cache.delete(cls._key(conversation_id))
+
+    @classmethod
+    def _get_or_prime(cls, conversation) -> Optional[Dict[str, Any]]:
+        key = cls._key(conversation.id)
+        buffer = cache.get(key)
+        if buffer is not None:
+            return buffer
+
+        try:
+            with cls._lock(conversation.id):
+                buffer = cache.get(key)
+                if buffer is not None:
+                    return buffer
+
+                size = settings.AI_HISTORY_BUFFER_SIZE
+                recent = list(
+                    Message.objects.filter(conversation=conversation).order_by('-created_at')[:size + 1]
+                )
+                complete = len(recent) <= size
+                recent = recent[:size]
+                cls._count_tokens(recent)
+
+                buffer = {
+                    'messages': [cls._serialize(message) for message in reversed(recent)],
+                    'complete': complete,
+                }
+                cache.set(key, buffer, settings.AI_HISTORY_BUFFER_TTL)
+                return buffer
+        except Exception as e:
+            logger.warning(f"Could not prime history buffer for conversation {conversation.id}: {str(e)}")
+            return None
+
+    @staticmethod
+    def _count_tokens(messages: List[Message]) -> None:
+        """Count and persist tokens of rows from before counts were cached, once, before they are buffered"""
+        from apps.ai_integration.context_builder import count_tokens
+
+        uncounted = [message for message in messages if message.token_count is None]
+        for message in uncounted:
+            message.token_count = count_tokens(message.content)
+        if uncounted:
+            Message.objects.bulk_update(uncounted, ['token_count'])
+
+    @classmethod
+    @contextmanager
+    def _lock(cls, conversation_id):
+        """Serialize buffer updates for a conversation across processes"""
+        lock_key = f"{cls.KEY_PREFIX}:lock:{conversation_id}"
+        # A holder that died lets go when the lock expires
+        give_up_at = time.monotonic() + cls.LOCK_TIMEOUT
+        while not cache.add(lock_key, True, cls.LOCK_TIMEOUT):
+            if time.monotonic() > give_up_at:
+                raise TimeoutError(f"History buffer of conversation {conversation_id} is locked")
+            time.sleep(cls.LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            cache.delete(lock_key)
+
+    @staticmethod
+    def _trim(buffer: Dict[str, Any]) -> None:
+        overflow = len(buffer['messages']) - settings.AI_HISTORY_BUFFER_SIZE
+        if overflow > 0:
+            del buffer['messages'][:overflow]
+            buffer['complete'] = False
+
+    @staticmethod
+    def _serialize(message: Message) -> Dict[str, Any]:
+        return {
+            'id': str(message.id),
+            'sender': message.sender,
+            'message_type': message.message_type,
+            'content': message.content,
+            'token_count': message.token_count,
+            'created_at': message.created_at.isoformat(),
+        }
+
+    @staticmethod
+    def _deserialize(entry: Dict[str, Any], conversation_id) -> Message:
+        return Message(
+            id=entry['id'],
+            conversation_id=conversation_id,
+            sender=entry['sender'],
+            message_type=entry['message_type'],
+            content=entry['content'],
+            token_count=entry['token_count'],
+            created_at=parse_datetime(entry['created_at']),
+        )
+
+    @classmethod
+    def _key(cls, conversation_id) -> str:
+        return f"{cls.KEY_PREFIX}:{conversation_id}"
@@ -0,0 +1,205 @@
+"""
+Knowledge ingestion and passage retrieval for Omnifin Platform
+
+Knowledge entries are split into passages of at most
+AI_KNOWLEDGE_PASSAGE_MAX_TOKENS tokens, each stored with its token count
+and an inverted index of normalized terms. Retrieval scores passages by
+TF-IDF over that index and packs the best ones into a token budget, so a
+long entry contributes only its relevant slices to the prompt.
+"""
+
+import hashlib
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from apps.ai_integration.models import Knowledge, KnowledgePassage, KnowledgeTerm
+from apps.ai_integration.context_builder import count_tokens
+
+logger = logging.getLogger('omnifin')
+
+PARAGRAPH_BOUNDARY = re.compile(r'\n\s*\n')
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+MAX_TERM_LENGTH = 64
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but
+by can could did do does doing down during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just me more most my no nor not now of off on once only or other our ours out
+over own same she should so some such than that the their theirs them then there these they this those through to
+too under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+
+def normalize_terms(text: str) -> List[str]:
+    """Lowercased, stopword-free, lightly singularized terms of ``text``"""
+    terms = []
+    for word in TERM_PATTERN.findall((text or '').lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        terms.append(_singularize(word)[:MAX_TERM_LENGTH])
+    return terms
+
+
+def _singularize(word: str) -> str:
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def split_passages(text: str, max_tokens: int = None) -> List[str]:
+    """Split text into passages of at most ``max_tokens``, breaking at paragraphs, then sentences, then words"""
+    max_tokens = max_tokens or settings.AI_KNOWLEDGE_PASSAGE_MAX_TOKENS
+    pieces = []
+    for paragraph in PARAGRAPH_BOUNDARY.split(text or ''):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            pieces.append((paragraph, '\n\n'))
+            continue
+        for sentence in SENTENCE_BOUNDARY.split(paragraph):
+            if count_tokens(sentence) <= max_tokens:
+                pieces.append((sentence, ' '))
+                continue
+            words = sentence.split()
+            window = max(1, len(words) * max_tokens // count_tokens(sentence))
+            pieces.extend((' '.join(words[start:start + window]), ' ') for start in range(0, len(words), window))
+
+    passages = []
+    current, current_tokens = '', 0
+    for piece, separator in pieces:
+        tokens = count_tokens(piece)
+        if current:
+            # Allow a token for the separator, which can tokenize on its own
+            tokens += 1
+            if current_tokens + tokens > max_tokens:
+                passages.append(current)
+                current, current_tokens = '', 0
+                tokens -= 1
+        current = f"{current}{separator}{piece}" if current else piece
+        current_tokens += tokens
+    if current:
+        passages.append(current)
+    return passages
+
+
+class KnowledgeIngestionService:
+    """Rebuilds passages and term index rows for changed Knowledge entries in bulk"""
+
+    PASSAGE_COUNT_KEY = 'ai_knowledge_index:passage_count'
+
+    @staticmethod
+    def content_hash(entry: Knowledge) -> str:
+        return hashlib.sha256(f"{entry.title}\n{entry.content}".encode('utf-8')).hexdigest()
+
+    @classmethod
+    def ingest(cls, knowledge_ids: Iterable, force: bool = False) -> int:
+        """Re-chunk the given entries whose text changed; returns the number of passages written"""
+        entries = list(Knowledge.objects.filter(id__in=list(knowledge_ids)).only('id', 'title', 'content', 'passages_hash'))
+        changed = [entry for entry in entries if force or entry.passages_hash != cls.content_hash(entry)]
+        if not changed:
+            return 0
+
+        passages = []
+        terms = []
+        for entry in changed:
+            title_terms = normalize_terms(entry.title)
+            for position, text in enumerate(split_passages(entry.content)):
+                passage = KnowledgePassage(
+                    knowledge_id=entry.id,
+                    position=position,
+                    content=text,
+                    token_count=count_tokens(text)
+                )
+                passages.append(passage)
+                # Title terms count toward every passage of the entry
+                for term, frequency in Counter(normalize_terms(text) + title_terms).items():
+                    terms.append(KnowledgeTerm(passage=passage, term=term, frequency=frequency))
+            entry.passages_hash = cls.content_hash(entry)
+
+        changed_ids = [entry.id for entry in changed]
+        with transaction.atomic():
+            # Raw deletes: these rows are derived and carry no signals worth sending
+            KnowledgeTerm.objects.filter(passage__knowledge_id__in=changed_ids)._raw_delete(KnowledgeTerm.objects.db)
+            KnowledgePassage.objects.filter(knowledge_id__in=changed_ids)._raw_delete(KnowledgePassage.objects.db)
+            KnowledgePassage.objects.bulk_create(passages, batch_size=500)
+            KnowledgeTerm.objects.bulk_create(terms, batch_size=2000)
+            Knowledge.objects.bulk_update(changed, ['passages_hash'], batch_size=500)
+            transaction.on_commit(cls.invalidate_passage_count)
+
+        logger.info(f"Ingested {len(changed)} knowledge entries into {len(passages)} passages")
+        return len(passages)
+
+    @classmethod
+    def ingest_on_commit(cls, knowledge_id) -> None:
+        """Re-chunk an entry once the transaction that saved it commits"""
+        def run():
+            try:
+                cls.ingest([knowledge_id])
+            except Exception as e:
+                logger.error(f"Error ingesting knowledge entry {knowledge_id}: {str(e)}")
+        transaction.on_commit(run)
+
+    @classmethod
+    def invalidate_passage_count(cls) -> None:
+        cache.delete(cls.PASSAGE_COUNT_KEY)
+
+
+class KnowledgeRetriever:
+    """Ranks passages against a query and packs the best into a token budget"""
+
+    def search(self, query: str, token_budget: int = None, max_passages: int = None) -> List[Dict[str, Any]]:
+        """Best-first passages (``id``, ``knowledge_id``, ``content``, ``token_count``) fitting the budget"""
+        token_budget = token_budget or settings.AI_KNOWLEDGE_TOKEN_BUDGET
+        max_passages = max_passages or settings.AI_KNOWLEDGE_MAX_PASSAGES
+        terms = set(normalize_terms(query))
+        if not terms:
+            return []
+
+        rows = list(
+            KnowledgeTerm.objects.filter(term__in=terms, passage__knowledge__is_active=True)
+            .values_list('passage_id', 'term', 'frequency')
+        )
+        if not rows:
+            return []
+
+        # Every passage containing a query term is in ``rows``, so document
+        # frequencies come from the same result
+        document_frequency = Counter(term for _, term, _ in rows)
+        total = self._passage_count()
+        scores = defaultdict(float)
+        for passage_id, term, frequency in rows:
+            scores[passage_id] += (1 + math.log(frequency)) * math.log(1 + total / document_frequency[term])
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:max_passages * 4]
+        passages = {
+            passage['id']: passage
+            for passage in KnowledgePassage.objects.filter(id__in=ranked).values('id', 'knowledge_id', 'content', 'token_count')
+        }
+
+        packed = []
+        remaining = token_budget
+        for passage_id in ranked:
+            passage = passages.get(passage_id)
+            if passage is None or passage['token_count'] > remaining:
+                continue
+            packed.append(passage)
+            remaining -= passage['token_count']
+            if len(packed) >= max_passages:
+                break
+        return packed
+
+    def _passage_count(self) -> int:
+        total = cache.get(KnowledgeIngestionService.PASSAGE_COUNT_KEY)
+        if total is None:
+            total = KnowledgePassage.objects.filter(knowledge__is_active=True).count()
+            cache.set(KnowledgeIngestionService.PASSAGE_COUNT_KEY, total, 300)
+        return max(total, 1)
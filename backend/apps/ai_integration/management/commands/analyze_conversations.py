@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from apps.ai_integration.analysis_services import ConversationAnalysisBatch
+
+
+class Command(BaseCommand):
+    help = 'Analyze completed conversations (intent, sentiment, topics) that are new or changed since their last analysis. Intended to run on a schedule.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Conversations selected per batch')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many conversations')
+        parser.add_argument('--workers', type=int, default=None, help='Concurrent analyses (default AI_ANALYSIS_MAX_WORKERS)')
+        parser.add_argument('--requests-per-minute', type=int, default=None,
+                            help='LLM request rate limit (default AI_ANALYSIS_REQUESTS_PER_MINUTE)')
+        parser.add_argument('--force', action='store_true', help='Re-analyze conversations even if unchanged')
+
+    def handle(self, *args, **options):
+        batch = ConversationAnalysisBatch(
+            workers=options['workers'],
+            requests_per_minute=options['requests_per_minute'],
+            batch_size=options['batch_size'],
+            force=options['force']
+        )
+
+        def progress(last_pk, stats):
+            self.stdout.write(
+                f"Processed batch ending at {last_pk}: {stats['analyzed']} analyzed, "
+                f"{stats['skipped']} unchanged, {stats['failed']} failed"
+            )
+
+        stats = batch.run(limit=options['limit'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Selected {stats['selected']} conversations: {stats['analyzed']} analyzed, "
+            f"{stats['skipped']} unchanged, {stats['failed']} failed."
+        ))
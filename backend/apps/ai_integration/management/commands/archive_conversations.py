@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from apps.ai_integration.archive_services import ConversationArchiver
+
+
+class Command(BaseCommand):
+    help = 'Move conversations that ended more than --days ago (default AI_ARCHIVE_AFTER_DAYS) into compressed archive segments and delete their live rows. Intended to run on a schedule.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Archive conversations ended more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=None, help='Conversations archived per transaction')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many conversations')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the conversations that would be archived')
+
+    def handle(self, *args, **options):
+        archiver = ConversationArchiver(days=options['days'], batch_size=options['batch_size'])
+
+        def progress(stats):
+            self.stdout.write(f"Archived {stats['conversations']} conversations, {stats['messages']} messages")
+
+        stats = archiver.run(limit=options['limit'], dry_run=options['dry_run'], progress=progress)
+        if options['dry_run']:
+            self.stdout.write(f"{stats['conversations']} conversations would be archived.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {stats['conversations']} conversations and {stats['messages']} messages."
+        ))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from apps.ai_integration.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = 'Backfill Conversation.message_count, last_message_at, last_message_preview and last_sender from ai_message.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Conversations updated per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        last_message = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at')
+        conversations = Conversation.objects.annotate(
+            actual_count=Count('messages'),
+            actual_last_at=Subquery(last_message.values('created_at')[:1]),
+            actual_last_content=Subquery(last_message.values('content')[:1]),
+            actual_last_sender=Subquery(last_message.values('sender')[:1]),
+        ).order_by('pk')
+
+        total_updated = 0
+        last_pk = None
+        while True:
+            batch_qs = conversations if last_pk is None else conversations.filter(pk__gt=last_pk)
+            batch = list(batch_qs[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            changed = []
+            for conv in batch:
+                values = {
+                    'message_count': conv.actual_count,
+                    'last_message_at': conv.actual_last_at,
+                    'last_message_preview': Conversation.make_preview(conv.actual_last_content) if conv.actual_last_content else '',
+                    'last_sender': conv.actual_last_sender or '',
+                }
+                if any(getattr(conv, field) != value for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(conv, field, value)
+                    changed.append(conv)
+
+            if changed:
+                Conversation.objects.bulk_update(changed, ['message_count', 'last_message_at', 'last_message_preview', 'last_sender'])
+                total_updated += len(changed)
+            self.stdout.write(f'Processed batch ending at {last_pk}: {len(changed)} updated')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {total_updated} conversations.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from apps.ai_integration.models import Knowledge
+from apps.ai_integration.knowledge_services import KnowledgeIngestionService
+
+
+class Command(BaseCommand):
+    help = 'Split knowledge base entries into indexed passages. Entries whose text is unchanged since their last ingestion are skipped unless --force is given; run once to backfill existing entries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Entries re-chunked per bulk write')
+        parser.add_argument('--force', action='store_true', help='Rebuild passages even for unchanged entries')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        knowledge_ids = list(Knowledge.objects.order_by('created_at').values_list('id', flat=True))
+        passages = 0
+        for start in range(0, len(knowledge_ids), batch_size):
+            passages += KnowledgeIngestionService.ingest(knowledge_ids[start:start + batch_size], force=options['force'])
+            self.stdout.write(f"Processed {min(start + batch_size, len(knowledge_ids))}/{len(knowledge_ids)} entries")
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {passages} passages for {len(knowledge_ids)} knowledge entries."))
@@ -0,0 +1,176 @@
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.authentication.models import User
+from apps.ai_integration.models import Conversation, Message
+from apps.ai_integration.views import chat_message, voice_message
+
+CHAT_SCRIPT = [
+    'Hi, I would like to apply for a loan.',
+    'What documents do I need for a personal loan?',
+    'How long does approval usually take?',
+    'I need 15000 for home improvements over 36 months.',
+    'Can you tell me more about interest rates?',
+]
+
+
+class QueryCounter:
+    """Counts queries on every connection opened while attached, whichever thread runs them
+
+    CaptureQueriesContext only sees the request thread's connection; tool
+    calls and hedged requests run on pool threads with their own connections.
+    COMMIT and ROLLBACK do not go through execute wrappers, so unlike the
+    per-turn capture they are not counted here.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def attach(self, sender, connection, **kwargs):
+        # Connection wrappers outlive reconnects, so only install once
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    help = 'Drive chat_message/voice_message with N concurrent sessions and report throughput, latency percentiles and DB queries per turn.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=10, help='Number of concurrent chat sessions')
+        parser.add_argument('--turns', type=int, default=5, help='Turns per session')
+        parser.add_argument('--mode', choices=['chat', 'voice'], default='chat', help='Endpoint to drive')
+        parser.add_argument('--provider', choices=['local', 'replay', 'record', 'openai'], default='local',
+                            help='LLM provider to use (live providers require --allow-live)')
+        parser.add_argument('--latency-ms', type=int, default=None, help='Simulated latency of the local provider')
+        parser.add_argument('--allow-live', action='store_true', help='Allow providers that make real API calls')
+        parser.add_argument('--keep', action='store_true', help='Keep load-test users and conversations afterwards')
+
+    def handle(self, *args, **options):
+        provider = options['provider']
+        if provider in ('openai', 'record') and not options['allow_live']:
+            raise CommandError(f'Provider "{provider}" makes real API calls; pass --allow-live to use it.')
+
+        overrides = {'AI_PROVIDER': provider}
+        if options['latency_ms'] is not None:
+            overrides['AI_LOCAL_LATENCY_MS'] = options['latency_ms']
+
+        run_id = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(
+                email=f'loadtest+{run_id}-{index}@omnifin.local',
+                password=uuid.uuid4().hex,
+                first_name='Load',
+                last_name=f'Test {index}'
+            )
+            for index in range(options['sessions'])
+        ]
+
+        self.stdout.write(
+            f"Running {options['sessions']} sessions x {options['turns']} turns "
+            f"against {options['mode']}_message with provider={provider}"
+        )
+
+        try:
+            with override_settings(**overrides):
+                results, elapsed, total_queries = self._run(users, run_id, options)
+        finally:
+            if not options['keep']:
+                # Delete children first so audit hooks can still render each row
+                Message.objects.filter(conversation__user__in=users).delete()
+                Conversation.objects.filter(user__in=users).delete()
+                User.objects.filter(id__in=[user.id for user in users]).delete()
+
+        self._report(results, elapsed, total_queries)
+
+    def _run(self, users, run_id, options):
+        factory = APIRequestFactory()
+        results = []
+        results_lock = threading.Lock()
+
+        def run_session(index, user):
+            session_id = f'loadtest_{run_id}_{index}'
+            session_results = []
+            try:
+                for turn in range(options['turns']):
+                    message = CHAT_SCRIPT[turn % len(CHAT_SCRIPT)]
+                    if options['mode'] == 'voice':
+                        request = factory.post('/api/ai/voice/', {
+                            'session_id': session_id,
+                            'audio_file': SimpleUploadedFile('turn.webm', b'\x00' * 16000, content_type='audio/webm'),
+                        }, format='multipart')
+                        view = voice_message
+                    else:
+                        request = factory.post('/api/ai/chat/', {
+                            'session_id': session_id,
+                            'message': message,
+                        }, format='json')
+                        view = chat_message
+                    force_authenticate(request, user=user)
+
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = view(request)
+                        latency = time.perf_counter() - started
+
+                    session_results.append({
+                        'latency': latency,
+                        'queries': len(queries.captured_queries),
+                        'ok': response.status_code == 200,
+                    })
+            finally:
+                connection.close()
+
+            with results_lock:
+                results.extend(session_results)
+
+        counter = QueryCounter()
+        connection_created.connect(counter.attach)
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=len(users)) as executor:
+                for future in [executor.submit(run_session, index, user) for index, user in enumerate(users)]:
+                    future.result()
+        finally:
+            connection_created.disconnect(counter.attach)
+        return results, time.perf_counter() - started, counter.count
+
+    def _report(self, results, elapsed, total_queries):
+        if not results:
+            self.stdout.write(self.style.WARNING('No turns were executed.'))
+            return
+
+        latencies = sorted(result['latency'] * 1000 for result in results)
+        queries = [result['queries'] for result in results]
+        failures = sum(1 for result in results if not result['ok'])
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(round(p / 100.0 * (len(latencies) - 1))))]
+
+        self.stdout.write(self.style.SUCCESS(f'Turns: {len(results)} ({failures} failed) in {elapsed:.2f}s'))
+        self.stdout.write(f'Throughput: {len(results) / elapsed:.2f} turns/s')
+        self.stdout.write(
+            f'Latency ms: p50={percentile(50):.1f} p95={percentile(95):.1f} '
+            f'p99={percentile(99):.1f} max={latencies[-1]:.1f}'
+        )
+        self.stdout.write(
+            f'DB queries per turn: mean={statistics.mean(queries):.1f} '
+            f'min={min(queries)} max={max(queries)} (request thread)'
+        )
+        self.stdout.write(
+            f'DB queries per turn: mean={total_queries / len(results):.1f} '
+            f'(all threads, including tool and hedging pools)'
+        )
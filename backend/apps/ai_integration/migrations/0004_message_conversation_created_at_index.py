@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0003_conversation_summary_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at'], name='ai_message_convers_0cc073_idx'),
+        ),
+    ]
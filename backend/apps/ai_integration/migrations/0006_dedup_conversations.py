@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:37
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+PREVIEW_LENGTH = 100
+
+
+def merge_duplicate_conversations(apps, schema_editor):
+    """Fold duplicate (user, session_id) conversations into the newest one, keeping every message"""
+    Conversation = apps.get_model('ai_integration', 'Conversation')
+    Message = apps.get_model('ai_integration', 'Message')
+
+    duplicates = (
+        Conversation.objects.values('user_id', 'session_id')
+        .annotate(rows=Count('id'), first_started_at=Min('started_at'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates.iterator():
+        rows = list(
+            Conversation.objects.filter(user_id=group['user_id'], session_id=group['session_id'])
+            .order_by('-started_at')
+        )
+        keep, others = rows[0], rows[1:]
+        other_ids = [conversation.id for conversation in others]
+
+        Message.objects.filter(conversation_id__in=other_ids).update(conversation_id=keep.id)
+
+        last_message = Message.objects.filter(conversation_id=keep.id).order_by('-created_at').first()
+        content = last_message.content if last_message else ''
+        keep.message_count = Message.objects.filter(conversation_id=keep.id).count()
+        keep.last_message_at = last_message.created_at if last_message else None
+        keep.last_message_preview = content[:PREVIEW_LENGTH] + '...' if len(content) > PREVIEW_LENGTH else content
+        keep.last_sender = last_message.sender if last_message else ''
+        keep.started_at = group['first_started_at']
+        # The rolling summary covered only one of the merged histories
+        keep.metadata = {key: value for key, value in (keep.metadata or {}).items() if key != 'rolling_summary'}
+        keep.save()
+
+        Conversation.objects.filter(id__in=other_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0005_conversation_analysis'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:42
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0007_conversation_unique_user_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelRoutingConfig',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('group_id', models.UUIDField(help_text='Tenant group these routing rules apply to', unique=True)),
+                ('is_enabled', models.BooleanField(default=True, help_text='Disable to send every turn to the strong model')),
+                ('fast_model', models.CharField(blank=True, default='', help_text='Defaults to AI_FAST_MODEL', max_length=100)),
+                ('strong_model', models.CharField(blank=True, default='', help_text='Defaults to AI_MODEL', max_length=100)),
+                ('fast_max_chars', models.IntegerField(blank=True, help_text='Defaults to AI_ROUTING_FAST_MAX_CHARS', null=True)),
+                ('fast_keywords', models.JSONField(blank=True, default=list, help_text='Extra phrases that mark small talk or FAQ turns')),
+                ('strong_keywords', models.JSONField(blank=True, default=list, help_text='Extra phrases that mark intake turns')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'ai_model_routing_config',
+            },
+        ),
+    ]
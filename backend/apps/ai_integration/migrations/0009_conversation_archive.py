@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ai_integration', '0008_model_routing_config'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedConversation',
+            fields=[
+                ('id', models.UUIDField(editable=False, help_text='ID of the original conversation', primary_key=True, serialize=False)),
+                ('session_id', models.CharField(max_length=100)),
+                ('is_voice_chat', models.BooleanField(default=False)),
+                ('status', models.CharField(max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('message_count', models.IntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('segment', models.CharField(max_length=255)),
+                ('offset', models.BigIntegerField()),
+                ('length', models.BigIntegerField()),
+                ('checksum', models.CharField(help_text='SHA-256 of the compressed bytes', max_length=64)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'ai_conversation_archive',
+                'indexes': [models.Index(fields=['user', '-started_at'], name='ai_conversa_user_id_c589be_idx'), models.Index(fields=['ended_at'], name='ai_conversa_ended_a_146672_idx'), models.Index(fields=['segment'], name='ai_conversa_segment_2dd14b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0009_conversation_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledge',
+            name='passages_hash',
+            field=models.CharField(blank=True, default='', help_text='Hash of the title and content last split into passages', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='KnowledgePassage',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('position', models.IntegerField()),
+                ('content', models.TextField()),
+                ('token_count', models.IntegerField()),
+                ('knowledge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='passages', to='ai_integration.knowledge')),
+            ],
+            options={
+                'db_table': 'ai_knowledge_passage',
+                'ordering': ['knowledge', 'position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='KnowledgeTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.IntegerField()),
+                ('passage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='ai_integration.knowledgepassage')),
+            ],
+            options={
+                'db_table': 'ai_knowledge_term',
+                'indexes': [models.Index(fields=['term'], name='ai_knowledg_term_a38607_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='knowledgepassage',
+            index=models.Index(fields=['knowledge', 'position'], name='ai_knowledg_knowled_9ab21e_idx'),
+        ),
+    ]
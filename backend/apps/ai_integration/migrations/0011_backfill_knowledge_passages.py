@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:10
+
+import hashlib
+from collections import Counter
+from django.db import migrations
+
+BATCH_SIZE = 200
+
+
+def backfill_knowledge_passages(apps, schema_editor):
+    """Index knowledge entries that existed before passages were introduced
+
+    Retrieval reads only passages, so entries created before the index had
+    nothing to match until ingest_knowledge was run by hand. Every entry
+    without a passages_hash is split and indexed here, mirroring
+    KnowledgeIngestionService.ingest against the historical models.
+    """
+    from apps.ai_integration.context_builder import count_tokens
+    from apps.ai_integration.knowledge_services import normalize_terms, split_passages
+
+    Knowledge = apps.get_model('ai_integration', 'Knowledge')
+    KnowledgePassage = apps.get_model('ai_integration', 'KnowledgePassage')
+    KnowledgeTerm = apps.get_model('ai_integration', 'KnowledgeTerm')
+
+    pending = list(Knowledge.objects.filter(passages_hash='').values_list('id', flat=True))
+    for start in range(0, len(pending), BATCH_SIZE):
+        entries = list(
+            Knowledge.objects.filter(id__in=pending[start:start + BATCH_SIZE])
+            .only('id', 'title', 'content', 'passages_hash')
+        )
+        passages = []
+        terms = []
+        for entry in entries:
+            title_terms = normalize_terms(entry.title)
+            for position, text in enumerate(split_passages(entry.content)):
+                passage = KnowledgePassage(
+                    knowledge_id=entry.id,
+                    position=position,
+                    content=text,
+                    token_count=count_tokens(text)
+                )
+                passages.append(passage)
+                for term, frequency in Counter(normalize_terms(text) + title_terms).items():
+                    terms.append(KnowledgeTerm(passage=passage, term=term, frequency=frequency))
+            entry.passages_hash = hashlib.sha256(
+                f"{entry.title}\n{entry.content}".encode('utf-8')
+            ).hexdigest()
+
+        KnowledgePassage.objects.filter(knowledge_id__in=[entry.id for entry in entries]).delete()
+        KnowledgePassage.objects.bulk_create(passages, batch_size=500)
+        KnowledgeTerm.objects.bulk_create(terms, batch_size=1000)
+        Knowledge.objects.bulk_update(entries, ['passages_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0010_knowledge_passages'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_knowledge_passages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,196 @@
+"""
+Model routing for Omnifin Platform
+
+A cheap local classifier picks a route for each chat turn: small talk and
+FAQ questions go to the fast model without tools, while loan intake (and
+anything ambiguous) goes to the strong model with tools. Once a
+conversation enters intake it stays on the strong model for a while, so
+short follow-up answers ("home renovation", "yes") keep their tools.
+"""
+
+import logging
+import re
+from typing import Any, Dict, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('omnifin')
+
+FAST = 'fast'
+STRONG = 'strong'
+ROUTES = (FAST, STRONG)
+REASONS = ('small_talk', 'faq', 'intake', 'intake_in_progress', 'long_message', 'default', 'routing_disabled')
+
+
+class RouteDecision:
+    """The model (and whether to offer tools) chosen for one turn"""
+
+    def __init__(self, route: str, model: str, reason: str):
+        self.route = route
+        self.model = model
+        self.reason = reason
+
+    @property
+    def use_tools(self) -> bool:
+        return self.route == STRONG
+
+    def as_metadata(self) -> Dict[str, str]:
+        return {'route': self.route, 'model': self.model, 'route_reason': self.reason}
+
+
+class ModelRouter:
+    """Routes turns between the fast and strong models using per-tenant rules"""
+
+    KEY_PREFIX = 'ai_model_router'
+
+    SMALL_TALK_PATTERN = re.compile(
+        r"^\s*(hi|hello|hey|thanks|thank you|thx|ok|okay|cool|great|bye|goodbye|"
+        r"good (morning|afternoon|evening)|how are you)\b",
+        re.IGNORECASE
+    )
+    FAQ_KEYWORDS = (
+        'what is', 'what are', "what's", 'how do', 'how does', 'how long', 'how much time',
+        'can i', 'do you', 'who are', 'where', 'when', 'explain', 'difference between', 'contact',
+    )
+    INTAKE_KEYWORDS = (
+        'apply', 'application', 'submit', 'borrow', 'loan amount', 'loan term', 'interest rate',
+        'income', 'salary', 'employ', 'mortgage', 'refinance', 'upload', 'document',
+        'credit score', 'my loan', 'i need a loan', 'i want a loan',
+    )
+    # Amounts, rates and terms are intake answers even without a keyword
+    FIGURE_PATTERN = re.compile(
+        r"[$€£]\s*\d|\d[\d,.]*\s*(k|%|percent|months?|years?|dollars?)\b|\d{3,}",
+        re.IGNORECASE
+    )
+
+    def route(self, user, user_message: str, conversation=None) -> RouteDecision:
+        config = self.get_config(user.group_id)
+        route, reason = self.classify(user_message, config)
+
+        if route == FAST and conversation is not None and cache.get(self._sticky_key(conversation.id)):
+            route, reason = STRONG, 'intake_in_progress'
+        if route == STRONG and reason == 'intake' and conversation is not None:
+            cache.set(self._sticky_key(conversation.id), True, settings.AI_ROUTING_STICKY_SECONDS)
+
+        model = config['fast_model'] if route == FAST else config['strong_model']
+        decision = RouteDecision(route, model, reason)
+        self._incr(f'{route}:reason:{reason}')
+        logger.info(f"Routed turn to {route} model {model} ({reason})")
+        return decision
+
+    @classmethod
+    def classify(cls, text: str, config: Dict[str, Any]) -> Tuple[str, str]:
+        """Return ``(route, reason)`` for a user message"""
+        if not config['enabled']:
+            return STRONG, 'routing_disabled'
+
+        normalized = ' '.join((text or '').lower().split())
+        if not normalized:
+            return STRONG, 'default'
+        if any(keyword in normalized for keyword in cls.INTAKE_KEYWORDS + tuple(config['strong_keywords'])):
+            return STRONG, 'intake'
+        if cls.FIGURE_PATTERN.search(normalized):
+            return STRONG, 'intake'
+        if len(normalized) > config['fast_max_chars']:
+            return STRONG, 'long_message'
+        if cls.SMALL_TALK_PATTERN.match(normalized):
+            return FAST, 'small_talk'
+        if any(keyword in normalized for keyword in cls.FAQ_KEYWORDS + tuple(config['fast_keywords'])):
+            return FAST, 'faq'
+        return STRONG, 'default'
+
+    @classmethod
+    def get_config(cls, group_id) -> Dict[str, Any]:
+        """Settings defaults overlaid with the tenant's ModelRoutingConfig, cached"""
+        config = {
+            'enabled': settings.AI_ROUTING_ENABLED,
+            'fast_model': settings.AI_FAST_MODEL,
+            'strong_model': settings.AI_MODEL,
+            'fast_max_chars': settings.AI_ROUTING_FAST_MAX_CHARS,
+            'fast_keywords': [],
+            'strong_keywords': [],
+        }
+        if not group_id:
+            return config
+
+        cache_key = cls._config_key(group_id)
+        overrides = cache.get(cache_key)
+        if overrides is None:
+            from apps.ai_integration.models import ModelRoutingConfig
+            row = ModelRoutingConfig.objects.filter(group_id=group_id).first()
+            overrides = {}
+            if row:
+                overrides = {
+                    'enabled': row.is_enabled and settings.AI_ROUTING_ENABLED,
+                    'fast_model': row.fast_model,
+                    'strong_model': row.strong_model,
+                    'fast_max_chars': row.fast_max_chars,
+                    'fast_keywords': [keyword.lower() for keyword in row.fast_keywords or []],
+                    'strong_keywords': [keyword.lower() for keyword in row.strong_keywords or []],
+                }
+            cache.set(cache_key, overrides, settings.AI_ROUTING_CONFIG_CACHE_TTL)
+
+        config.update({key: value for key, value in overrides.items() if value not in (None, '')})
+        return config
+
+    @classmethod
+    def invalidate(cls, group_id) -> None:
+        cache.delete(cls._config_key(group_id))
+
+    @classmethod
+    def record(cls, decision: RouteDecision, latency_ms: float, tokens_used: Optional[int], failed: bool = False) -> None:
+        """Accumulate per-route request, latency and token counters"""
+        route = decision.route
+        cls._incr(f'{route}:requests')
+        cls._incr(f'{route}:latency_ms', int(latency_ms))
+        if tokens_used:
+            cls._incr(f'{route}:tokens', tokens_used)
+        if failed:
+            cls._incr(f'{route}:errors')
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        routes = {}
+        for route in ROUTES:
+            counters = cache.get_many([
+                cls._stat_key(f'{route}:{name}') for name in ('requests', 'latency_ms', 'tokens', 'errors')
+            ] + [cls._stat_key(f'{route}:reason:{reason}') for reason in REASONS])
+            requests = counters.get(cls._stat_key(f'{route}:requests'), 0)
+            latency_ms = counters.get(cls._stat_key(f'{route}:latency_ms'), 0)
+            tokens = counters.get(cls._stat_key(f'{route}:tokens'), 0)
+            routes[route] = {
+                'requests': requests,
+                'errors': counters.get(cls._stat_key(f'{route}:errors'), 0),
+                'tokens': tokens,
+                'avg_latency_ms': round(latency_ms / requests, 1) if requests else 0.0,
+                'avg_tokens': round(tokens / requests, 1) if requests else 0.0,
+                'reasons': {
+                    reason: counters[cls._stat_key(f'{route}:reason:{reason}')]
+                    for reason in REASONS if cls._stat_key(f'{route}:reason:{reason}') in counters
+                },
+            }
+        routes['enabled'] = settings.AI_ROUTING_ENABLED
+        return routes
+
+    @classmethod
+    def _incr(cls, name: str, delta: int = 1) -> int:
+        key = cls._stat_key(name)
+        # add() is a no-op when the counter exists, so incr() never misses
+        cache.add(key, 0, None)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, None)
+            return delta
+
+    @classmethod
+    def _stat_key(cls, name: str) -> str:
+        return f"{cls.KEY_PREFIX}:stats:{name}"
+
+    @classmethod
+    def _config_key(cls, group_id) -> str:
+        return f"{cls.KEY_PREFIX}:config:{group_id}"
+
+    @classmethod
+    def _sticky_key(cls, conversation_id) -> str:
+        return f"{cls.KEY_PREFIX}:intake:{conversation_id}"
@@ -2,8 +2,9 @@
 AI Integration models for Omnifin Platform
 """
 
+import time
 import uuid
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
 from django.utils.translation import gettext_lazy as _
 from apps.authentication.models import User
 from apps.loans.models import Application
@@ -51,6 +52,7 @@ class Knowledge(models.Model):
     content = models.TextField()
     tags = models.JSONField(default=list, blank=True)
     is_active = models.BooleanField(default=True)
+    passages_hash = models.CharField(max_length=64, blank=True, default='', help_text="Hash of the title and content last split into passages")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -68,6 +70,64 @@ class Knowledge(models.Model):
         return self.title
 
 
+class KnowledgePassage(models.Model):
+    """Bounded slice of a Knowledge entry, the unit retrieved into prompts"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    knowledge = models.ForeignKey(Knowledge, on_delete=models.CASCADE, related_name='passages')
+    position = models.IntegerField()
+    content = models.TextField()
+    token_count = models.IntegerField()
+    
+    class Meta:
+        db_table = 'ai_knowledge_passage'
+        ordering = ['knowledge', 'position']
+        indexes = [
+            models.Index(fields=['knowledge', 'position']),
+        ]
+    
+    def __str__(self):
+        return f"{self.knowledge_id} #{self.position}"
+
+
+class KnowledgeTerm(models.Model):
+    """Inverted index entry: a normalized term and how often it occurs in a passage"""
+    
+    passage = models.ForeignKey(KnowledgePassage, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=64)
+    frequency = models.IntegerField()
+    
+    class Meta:
+        db_table = 'ai_knowledge_term'
+        indexes = [
+            models.Index(fields=['term']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} x{self.frequency}"
+
+
+class ModelRoutingConfig(models.Model):
+    """Per-tenant model routing overrides; blank fields fall back to settings"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    group_id = models.UUIDField(unique=True, help_text="Tenant group these routing rules apply to")
+    is_enabled = models.BooleanField(default=True, help_text="Disable to send every turn to the strong model")
+    fast_model = models.CharField(max_length=100, blank=True, default='', help_text="Defaults to AI_FAST_MODEL")
+    strong_model = models.CharField(max_length=100, blank=True, default='', help_text="Defaults to AI_MODEL")
+    fast_max_chars = models.IntegerField(blank=True, null=True, help_text="Defaults to AI_ROUTING_FAST_MAX_CHARS")
+    fast_keywords = models.JSONField(default=list, blank=True, help_text="Extra phrases that mark small talk or FAQ turns")
+    strong_keywords = models.JSONField(default=list, blank=True, help_text="Extra phrases that mark intake turns")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'ai_model_routing_config'
+    
+    def __str__(self):
+        return f"Model routing for group {self.group_id}"
+
+
 class Conversation(models.Model):
     """AI Conversation sessions"""
     
@@ -88,6 +148,19 @@ class Conversation(models.Model):
     ended_at = models.DateTimeField(blank=True, null=True)
     metadata = models.JSONField(default=dict, blank=True)
     
+    # Denormalized summary, maintained on each Message insert and recomputed on delete
+    message_count = models.IntegerField(default=0)
+    last_message_at = models.DateTimeField(blank=True, null=True)
+    last_message_preview = models.CharField(max_length=120, blank=True, default='')
+    last_sender = models.CharField(max_length=20, blank=True, default='')
+    
+    # Structured analysis (intent, sentiment, topics, summary) from the batch job
+    analysis = models.JSONField(default=dict, blank=True)
+    analysis_hash = models.CharField(max_length=64, blank=True, default='')
+    analyzed_at = models.DateTimeField(blank=True, null=True)
+    
+    PREVIEW_LENGTH = 100
+    
     class Meta:
         db_table = 'ai_conversation'
         indexes = [
@@ -95,10 +168,99 @@ class Conversation(models.Model):
             models.Index(fields=['session_id']),
             models.Index(fields=['status']),
             models.Index(fields=['started_at']),
+            models.Index(fields=['user', '-started_at']),
+            models.Index(fields=['message_count']),
+            models.Index(fields=['status', 'analyzed_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'session_id'], name='unique_conversation_user_session'),
         ]
     
     def __str__(self):
         return f"Conversation {self.session_id} - {self.user.email}"
+    
+    @staticmethod
+    def new_session_id(user) -> str:
+        return f"conv_{user.id}_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+    
+    @classmethod
+    def resolve_session(cls, user, session_id: str, is_voice_chat: bool = False):
+        """Return ``(conversation, created)`` for (user, session_id) without creating duplicates
+        
+        On PostgreSQL this is a single statement: an ``INSERT ... ON CONFLICT
+        DO NOTHING RETURNING`` whose result is unioned with the existing row.
+        """
+        conversation = cls(user=user, session_id=session_id, is_voice_chat=is_voice_chat)
+        using = router.db_for_write(cls)
+        
+        if connections[using].vendor == 'postgresql':
+            existing = cls._upsert_session(conversation, using)
+            if existing is not None:
+                return existing
+        else:
+            existing = cls.objects.using(using).filter(user=user, session_id=session_id).first()
+            if existing:
+                return existing, False
+            try:
+                with transaction.atomic(using=using):
+                    conversation.save(force_insert=True, using=using)
+                return conversation, True
+            except IntegrityError:
+                pass
+        
+        # Lost a race with a concurrent insert that was not yet visible
+        return cls.objects.using(using).get(user=user, session_id=session_id), False
+    
+    @classmethod
+    def _upsert_session(cls, conversation, using):
+        fields = cls._meta.concrete_fields
+        connection = connections[using]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        params = [
+            field.get_db_prep_save(field.pre_save(conversation, add=True), connection=connection)
+            for field in fields
+        ]
+        table = connection.ops.quote_name(cls._meta.db_table)
+        sql = (
+            f"WITH inserted AS ("
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT (user_id, session_id) DO NOTHING RETURNING *"
+            f") "
+            f"SELECT inserted.*, TRUE AS created FROM inserted "
+            f"UNION ALL "
+            f"SELECT {table}.*, FALSE AS created FROM {table} "
+            f"WHERE user_id = %s AND session_id = %s AND NOT EXISTS (SELECT 1 FROM inserted)"
+        )
+        rows = list(cls.objects.raw(sql, params + [conversation.user_id, conversation.session_id]).using(using))
+        if not rows:
+            return None
+        
+        resolved = rows[0]
+        if resolved.created:
+            # The raw INSERT bypasses save(); keep post_save receivers informed
+            models.signals.post_save.send(sender=cls, instance=resolved, created=True, update_fields=None, raw=False, using=using)
+        return resolved, bool(resolved.created)
+    
+    @classmethod
+    def make_preview(cls, content: str) -> str:
+        """Truncated message content shown in conversation lists"""
+        content = content or ''
+        if len(content) > cls.PREVIEW_LENGTH:
+            return content[:cls.PREVIEW_LENGTH] + '...'
+        return content
+    
+    @classmethod
+    def refresh_summary(cls, conversation_id) -> None:
+        """Recompute the denormalized summary columns from the conversation's messages"""
+        messages = Message.objects.filter(conversation_id=conversation_id)
+        latest = messages.order_by('-created_at').values('created_at', 'content', 'sender').first()
+        cls.objects.filter(id=conversation_id).update(
+            message_count=messages.count(),
+            last_message_at=latest['created_at'] if latest else None,
+            last_message_preview=cls.make_preview(latest['content']) if latest else '',
+            last_sender=latest['sender'] if latest else ''
+        )
 
 
 class Message(models.Model):
@@ -124,6 +286,7 @@ class Message(models.Model):
     content = models.TextField()
     audio_url = models.URLField(blank=True, null=True)
     audio_duration = models.IntegerField(blank=True, null=True)
+    token_count = models.IntegerField(blank=True, null=True, help_text="Cached token count of content")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -132,7 +295,45 @@ class Message(models.Model):
             models.Index(fields=['conversation']),
             models.Index(fields=['sender']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['conversation', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Message {self.id} - {self.conversation.session_id}"
+
+
+class ArchivedConversation(models.Model):
+    """Index entry for a conversation moved to cold storage
+    
+    The conversation and its messages live in a gzip member of an NDJSON
+    segment file under AI_ARCHIVE_DIR: the first line is the conversation,
+    each following line one message, oldest first.
+    """
+    
+    id = models.UUIDField(primary_key=True, editable=False, help_text="ID of the original conversation")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_conversations')
+    session_id = models.CharField(max_length=100)
+    is_voice_chat = models.BooleanField(default=False)
+    status = models.CharField(max_length=20)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(blank=True, null=True)
+    message_count = models.IntegerField(default=0)
+    last_message_at = models.DateTimeField(blank=True, null=True)
+    
+    # Location of the compressed record within its segment
+    segment = models.CharField(max_length=255)
+    offset = models.BigIntegerField()
+    length = models.BigIntegerField()
+    checksum = models.CharField(max_length=64, help_text="SHA-256 of the compressed bytes")
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'ai_conversation_archive'
+        indexes = [
+            models.Index(fields=['user', '-started_at']),
+            models.Index(fields=['ended_at']),
+            models.Index(fields=['segment']),
         ]
     
     def __str__(self):
-        return f"Message {self.id} - {self.conversation.session_id}"
\ No newline at end of file
+        return f"Archived conversation {self.session_id}"
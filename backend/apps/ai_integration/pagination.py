@@ -0,0 +1,86 @@
+import uuid
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class MessageTimelinePagination(BasePagination):
+    """Cursor pagination over Message.created_at using ?before= / ?after= timestamps
+
+    ``before_id`` / ``after_id`` break ties between messages saved in the
+    same instant (a turn's messages are bulk-inserted together); without
+    them the timestamp alone is a strict bound.
+    """
+    page_size = 50
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self._get_limit(request)
+        before = self._get_cursor(request, 'before')
+        after = self._get_cursor(request, 'after')
+
+        if after:
+            # Newer messages, oldest first
+            after_id = self._get_cursor_id(request, 'after_id')
+            condition = Q(created_at__gt=after)
+            if after_id:
+                condition |= Q(created_at=after, id__gt=after_id)
+            page = list(queryset.filter(condition).order_by('created_at', 'id')[:self.limit + 1])
+            self.has_more = len(page) > self.limit
+            page = page[:self.limit]
+        else:
+            # Latest (or older than ``before``) messages, fetched newest first
+            if before:
+                before_id = self._get_cursor_id(request, 'before_id')
+                condition = Q(created_at__lt=before)
+                if before_id:
+                    condition |= Q(created_at=before, id__lt=before_id)
+                queryset = queryset.filter(condition)
+            page = list(queryset.order_by('-created_at', '-id')[:self.limit + 1])
+            self.has_more = len(page) > self.limit
+            page = list(reversed(page[:self.limit]))
+
+        self.page = page
+        return page
+
+    def get_pagination_data(self):
+        return {
+            'has_more': self.has_more,
+            'next_before': self.page[0].created_at if self.page else None,
+            'next_before_id': self.page[0].id if self.page else None,
+            'next_after': self.page[-1].created_at if self.page else None,
+            'next_after_id': self.page[-1].id if self.page else None,
+            'limit': self.limit,
+        }
+
+    def get_paginated_response(self, data):
+        return Response({'messages': data, **self.get_pagination_data()})
+
+    def _get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.page_size))
+        except (TypeError, ValueError):
+            raise ValidationError({'limit': 'Must be an integer.'})
+        return max(1, min(limit, self.max_page_size))
+
+    @staticmethod
+    def _get_cursor(request, name):
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        cursor = parse_datetime(value)
+        if cursor is None:
+            raise ValidationError({name: 'Must be an ISO 8601 timestamp.'})
+        return cursor
+
+    @staticmethod
+    def _get_cursor_id(request, name):
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            raise ValidationError({name: 'Must be a message ID.'})
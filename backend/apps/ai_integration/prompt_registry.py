@@ -0,0 +1,135 @@
+"""
+Prompt registry for Omnifin Platform
+
+Active prompts are loaded once per worker, grouped by category and compiled
+to ``string.Template`` objects. A version stamp in the cache backend is
+bumped whenever a prompt changes, so every worker reloads on its next check
+instead of querying ``Prompt`` on each chat turn.
+"""
+
+import logging
+import re
+import threading
+import time
+from string import Template
+from typing import Dict, List, Optional, Any
+from django.conf import settings
+from django.core.cache import cache
+from apps.ai_integration.models import Prompt
+
+logger = logging.getLogger('omnifin')
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are Omnifin's AI lending assistant. Help applicants understand loan products, "
+    "gather the information needed for their application and explain the required documents. "
+    "Be accurate, concise and professional, and never invent rates, approvals or lender decisions."
+)
+
+CONTROL_CHARACTERS = re.compile(r'[\x00-\x08\x0b-\x1f\x7f]')
+
+
+class CompiledPrompt:
+    """An active prompt with its pre-compiled template"""
+
+    def __init__(self, prompt: Prompt):
+        self.prompt = prompt
+        self.name = prompt.name
+        self.category = prompt.category
+        self.version = prompt.version
+        self.template = Template(prompt.content)
+
+    def render(self, variables: Dict[str, str] = None) -> str:
+        # safe_substitute leaves unknown $placeholders as written instead of failing
+        return self.template.safe_substitute(variables or {})
+
+
+class PromptRegistry:
+    """Per-worker cache of compiled active prompts"""
+
+    VERSION_KEY = 'ai_prompt_registry:version'
+
+    _lock = threading.Lock()
+    _version = None
+    _checked_at = 0.0
+    _prompts: Dict[str, List[CompiledPrompt]] = {}
+
+    @classmethod
+    def get_prompts(cls, category: str = None) -> List[CompiledPrompt]:
+        """Active prompts (latest version per name), optionally for one category"""
+        prompts = cls._load()
+        if category:
+            return list(prompts.get(category, []))
+        return [prompt for category_prompts in prompts.values() for prompt in category_prompts]
+
+    @classmethod
+    def get_prompt(cls, name: str) -> Optional[CompiledPrompt]:
+        return next((prompt for prompt in cls.get_prompts() if prompt.name == name), None)
+
+    @classmethod
+    def render_system_prompt(cls, context: Dict[str, Any] = None) -> str:
+        """Assemble the system prompt from active ``system`` prompts and the request context"""
+        variables = cls.sanitize_context(context)
+        sections = [prompt.render(variables) for prompt in cls.get_prompts('system')]
+        system_prompt = "\n\n".join(section for section in sections if section.strip()) or DEFAULT_SYSTEM_PROMPT
+
+        if variables:
+            context_str = "\n\nCurrent context:\n"
+            for key, value in variables.items():
+                context_str += f"- {key}: {value}\n"
+            system_prompt += context_str
+
+        return system_prompt
+
+    @staticmethod
+    def sanitize_context(context: Dict[str, Any] = None) -> Dict[str, str]:
+        """Flatten client-supplied context to short, single-line strings"""
+        variables = {}
+        for key, value in (context or {}).items():
+            key = re.sub(r'\W', '_', str(key))[:50]
+            if not key:
+                continue
+            value = CONTROL_CHARACTERS.sub('', str(value))
+            variables[key] = ' '.join(value.split())[:settings.AI_PROMPT_CONTEXT_VALUE_MAX_CHARS]
+        return variables
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Bump the shared version so every worker recompiles on its next check"""
+        cache.add(cls.VERSION_KEY, 1, None)
+        try:
+            cache.incr(cls.VERSION_KEY)
+        except ValueError:
+            cache.set(cls.VERSION_KEY, 1, None)
+        with cls._lock:
+            cls._version = None
+
+    @classmethod
+    def _load(cls) -> Dict[str, List[CompiledPrompt]]:
+        now = time.monotonic()
+        if cls._version is not None and now - cls._checked_at < settings.AI_PROMPT_REGISTRY_CHECK_INTERVAL:
+            return cls._prompts
+
+        version = cache.get(cls.VERSION_KEY)
+        if version is None:
+            cache.add(cls.VERSION_KEY, 1, None)
+            version = cache.get(cls.VERSION_KEY, 1)
+
+        with cls._lock:
+            if cls._version != version:
+                cls._prompts = cls._compile()
+                cls._version = version
+                logger.info(f"Compiled {sum(len(p) for p in cls._prompts.values())} active prompts (registry version {version})")
+            cls._checked_at = now
+            return cls._prompts
+
+    @staticmethod
+    def _compile() -> Dict[str, List[CompiledPrompt]]:
+        prompts = {}
+        seen = set()
+        # Newest version first, so only the latest active version of each name is kept
+        for prompt in Prompt.objects.filter(is_active=True).order_by('category', 'name', '-version'):
+            if prompt.name in seen:
+                continue
+            seen.add(prompt.name)
+            prompts.setdefault(prompt.category, []).append(CompiledPrompt(prompt))
+        return prompts
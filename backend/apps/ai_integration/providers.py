@@ -0,0 +1,329 @@
+"""
+LLM provider clients for Omnifin Platform
+
+Services talk to an OpenAI-shaped client (``chat.completions``,
+``audio.transcriptions``, ``audio.speech``, ``embeddings``). ``get_llm_client``
+picks the implementation from ``settings.AI_PROVIDER``:
+
+- ``openai``: the real OpenAI client
+- ``local``: a deterministic offline stand-in for benchmarks and load tests
+- ``record``: the real client, with every response appended to a cassette
+- ``replay``: answers from the cassette, falling back to the local stand-in
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Any
+from django.conf import settings
+
+logger = logging.getLogger('omnifin')
+
+# A single silent MPEG-1 Layer III frame, used as synthesized audio
+SILENT_MP3_FRAME = bytes.fromhex('fffb9064') + bytes(413)
+
+
+class ProviderObject:
+    """Attribute-access wrapper mirroring the OpenAI SDK response objects"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+        for key, value in data.items():
+            setattr(self, key, self._wrap(value))
+
+    @classmethod
+    def _wrap(cls, value):
+        if isinstance(value, dict):
+            return cls(value)
+        if isinstance(value, list):
+            return [cls._wrap(item) for item in value]
+        return value
+
+    def model_dump(self, **kwargs) -> Dict[str, Any]:
+        return json.loads(json.dumps(self._data))
+
+
+class BinaryResponse:
+    """Audio response exposing ``content`` and ``iter_bytes`` like the SDK"""
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def iter_bytes(self, chunk_size: int = 4096):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Namespace:
+    def __init__(self, **endpoints):
+        for name, endpoint in endpoints.items():
+            setattr(self, name, endpoint)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, (len(text or '') + 3) // 4)
+
+
+class LocalLLMClient:
+    """Deterministic offline stand-in for the OpenAI client
+
+    Replies are derived from a hash of the request, so identical requests
+    always produce identical responses. Latency, completion size and tool
+    calls are configurable through settings.
+    """
+
+    def __init__(self, latency_ms: int = None, completion_tokens: int = None, tool_call_keyword: str = None):
+        self.latency_ms = settings.AI_LOCAL_LATENCY_MS if latency_ms is None else latency_ms
+        self.completion_tokens = settings.AI_LOCAL_COMPLETION_TOKENS if completion_tokens is None else completion_tokens
+        self.tool_call_keyword = settings.AI_LOCAL_TOOL_CALL_KEYWORD if tool_call_keyword is None else tool_call_keyword
+
+        self.chat = _Namespace(completions=_Namespace(create=self._create_chat_completion))
+        self.audio = _Namespace(
+            transcriptions=_Namespace(create=self._create_transcription),
+            speech=_Namespace(
+                create=self._create_speech,
+                with_streaming_response=_Namespace(create=self._create_speech),
+            ),
+        )
+        self.embeddings = _Namespace(create=self._create_embedding)
+
+    def _sleep(self, timeout: float = None):
+        if not self.latency_ms:
+            return
+        # Honour the per-request timeout like the real client does
+        if timeout is not None and self.latency_ms / 1000.0 > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("Request timed out.")
+        time.sleep(self.latency_ms / 1000.0)
+
+    def _create_chat_completion(self, model: str, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, **kwargs):
+        self._sleep(kwargs.get('timeout'))
+        digest = _request_digest({'model': model, 'messages': messages})
+        last_user = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+        prompt_tokens = sum(_estimate_tokens(str(m.get('content') or '')) for m in messages)
+        has_tool_results = any(m.get('role') == 'tool' for m in messages)
+
+        message = {'role': 'assistant', 'content': None, 'tool_calls': None}
+        if tools and not has_tool_results and self.tool_call_keyword and self.tool_call_keyword in last_user.lower():
+            message['tool_calls'] = [
+                {
+                    'id': f"call_{digest[:12]}_{position}",
+                    'type': 'function',
+                    'function': {
+                        'name': tool['function']['name'],
+                        'arguments': json.dumps(self._fake_arguments(tool['function'].get('parameters', {}))),
+                    },
+                }
+                for position, tool in enumerate(tools)
+            ]
+            finish_reason = 'tool_calls'
+        else:
+            words = ['Thanks', 'for', 'your', 'message.', 'Here', 'is', 'a', 'deterministic', 'reply', f"({digest[:8]})."]
+            message['content'] = ' '.join((words * (self.completion_tokens // len(words) + 1))[:max(1, self.completion_tokens)])
+            finish_reason = 'stop'
+
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': prompt_tokens + self.completion_tokens,
+        }
+        if kwargs.get('stream'):
+            include_usage = (kwargs.get('stream_options') or {}).get('include_usage', False)
+            return self._stream_chunks(digest, model, message, finish_reason, usage if include_usage else None)
+
+        return ProviderObject({
+            'id': f"local-{digest[:16]}",
+            'object': 'chat.completion',
+            'model': model,
+            'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}],
+            'usage': usage,
+        })
+
+    def _stream_chunks(self, digest: str, model: str, message: Dict[str, Any], finish_reason: str, usage: Optional[Dict[str, Any]]):
+        """Yield a completion as ``chat.completion.chunk`` deltas, one word at a time"""
+        def chunk(delta, finish=None, chunk_usage=None):
+            return ProviderObject({
+                'id': f"local-{digest[:16]}",
+                'object': 'chat.completion.chunk',
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}] if delta is not None else [],
+                'usage': chunk_usage,
+            })
+
+        if message['tool_calls']:
+            yield chunk({'role': 'assistant', 'content': None, 'tool_calls': [
+                dict(call, index=position) for position, call in enumerate(message['tool_calls'])
+            ]})
+        else:
+            words = message['content'].split(' ')
+            for position, word in enumerate(words):
+                yield chunk({'content': word if position == 0 else ' ' + word, 'tool_calls': None})
+        yield chunk({'content': None, 'tool_calls': None}, finish=finish_reason)
+        if usage:
+            yield chunk(None, chunk_usage=usage)
+
+    @staticmethod
+    def _fake_arguments(parameters: Dict[str, Any]) -> Dict[str, Any]:
+        defaults = {'number': 1000, 'integer': 12, 'string': 'test', 'boolean': True}
+        return {
+            name: defaults.get(schema.get('type'), None)
+            for name, schema in parameters.get('properties', {}).items()
+        }
+
+    def _create_transcription(self, model: str, file, response_format: str = 'text', **kwargs):
+        self._sleep(kwargs.get('timeout'))
+        return "What documents do I need for a personal loan?"
+
+    def _create_speech(self, model: str, voice: str, input: str, response_format: str = 'mp3', **kwargs):
+        self._sleep(kwargs.get('timeout'))
+        # Roughly one frame per word keeps the payload proportional to the text
+        return BinaryResponse(SILENT_MP3_FRAME * max(1, len(input.split())))
+
+    def _create_embedding(self, model: str, input, **kwargs):
+        texts = input if isinstance(input, list) else [input]
+        data = []
+        for position, text in enumerate(texts):
+            digest = hashlib.sha256(text.encode('utf-8')).digest()
+            data.append({'index': position, 'embedding': [byte / 255.0 for byte in digest]})
+        return ProviderObject({'data': data, 'model': model})
+
+
+class RecordingLLMClient:
+    """Wraps the real client and appends every text response to a cassette"""
+
+    def __init__(self, inner, cassette_path: str):
+        self.inner = inner
+        self.cassette_path = cassette_path
+        self._lock = threading.Lock()
+
+        self.chat = _Namespace(completions=_Namespace(create=self._recorded('chat.completions', inner.chat.completions.create)))
+        self.audio = _Namespace(
+            transcriptions=_Namespace(create=self._recorded('audio.transcriptions', inner.audio.transcriptions.create)),
+            speech=inner.audio.speech,
+        )
+        self.embeddings = _Namespace(create=self._recorded('embeddings', inner.embeddings.create))
+
+    def _recorded(self, endpoint: str, create):
+        def wrapper(**kwargs):
+            response = create(**kwargs)
+            try:
+                payload = response if isinstance(response, str) else response.model_dump()
+                self._append({
+                    'endpoint': endpoint,
+                    'key': _request_digest(_recordable_request(endpoint, kwargs)),
+                    'response': payload,
+                })
+            except Exception as e:
+                logger.warning(f"Could not record {endpoint} response: {str(e)}")
+            return response
+        return wrapper
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.cassette_path), exist_ok=True)
+            with open(self.cassette_path, 'a', encoding='utf-8') as cassette:
+                cassette.write(json.dumps(record) + '\n')
+
+
+class ReplayLLMClient:
+    """Serves recorded responses, falling back to the local stand-in on a miss"""
+
+    # Parsed cassettes by path, shared by every client in the process
+    _cassettes: Dict[str, Dict[str, Any]] = {}
+    _cassettes_lock = threading.Lock()
+
+    def __init__(self, cassette_path: str, fallback: LocalLLMClient = None):
+        self.fallback = fallback or LocalLLMClient()
+        self.records = self._load(cassette_path)
+
+        self.chat = _Namespace(completions=_Namespace(create=self._replayed('chat.completions', self.fallback.chat.completions.create)))
+        self.audio = _Namespace(
+            transcriptions=_Namespace(create=self._replayed('audio.transcriptions', self.fallback.audio.transcriptions.create)),
+            speech=self.fallback.audio.speech,
+        )
+        self.embeddings = _Namespace(create=self._replayed('embeddings', self.fallback.embeddings.create))
+
+    @classmethod
+    def _load(cls, cassette_path: str) -> Dict[str, Any]:
+        with cls._cassettes_lock:
+            records = cls._cassettes.get(cassette_path)
+            if records is None:
+                records = cls._cassettes[cassette_path] = cls._read(cassette_path)
+            return records
+
+    @staticmethod
+    def _read(cassette_path: str) -> Dict[str, Any]:
+        records = {}
+        if not os.path.exists(cassette_path):
+            logger.warning(f"AI cassette {cassette_path} not found; replaying from the local stand-in")
+            return records
+        with open(cassette_path, encoding='utf-8') as cassette:
+            for line in cassette:
+                if line.strip():
+                    record = json.loads(line)
+                    records[(record['endpoint'], record['key'])] = record['response']
+        return records
+
+    def _replayed(self, endpoint: str, fallback_create):
+        def wrapper(**kwargs):
+            key = _request_digest(_recordable_request(endpoint, kwargs))
+            response = self.records.get((endpoint, key))
+            if response is None:
+                return fallback_create(**kwargs)
+            return response if isinstance(response, str) else ProviderObject(response)
+        return wrapper
+
+
+def _recordable_request(endpoint: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Request fields that identify a response; uploaded audio is keyed by its bytes"""
+    request = dict(kwargs)
+    # Per-call timeouts shrink with the request's deadline and do not change the answer
+    request.pop('timeout', None)
+    if endpoint == 'audio.transcriptions' and 'file' in request:
+        upload = request['file']
+        content = upload[1] if isinstance(upload, tuple) else upload
+        request['file'] = _content_digest(content)
+    return request
+
+
+def _content_digest(content) -> str:
+    """SHA-256 of uploaded bytes or a file object, hashed in chunks and rewound"""
+    digest = hashlib.sha256()
+    if isinstance(content, (bytes, bytearray)):
+        digest.update(content)
+    elif hasattr(content, 'read') and hasattr(content, 'seek'):
+        position = content.tell()
+        for chunk in iter(lambda: content.read(65536), b''):
+            digest.update(chunk)
+        content.seek(position)
+    return digest.hexdigest()
+
+
+def _request_digest(request: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def get_llm_client(provider: str = None):
+    """Return the configured OpenAI-compatible client"""
+    provider = provider or settings.AI_PROVIDER
+
+    if provider == 'local':
+        return LocalLLMClient()
+    if provider == 'replay':
+        return ReplayLLMClient(settings.AI_PROVIDER_CASSETTE)
+
+    from openai import OpenAI
+    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+
+    if provider == 'record':
+        return RecordingLLMClient(client, settings.AI_PROVIDER_CASSETTE)
+    return client
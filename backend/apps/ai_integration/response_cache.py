@@ -0,0 +1,213 @@
+"""
+AI response cache for Omnifin Platform
+
+Caches assistant replies for standalone, FAQ-style questions so repeated
+questions ("what documents do I need") skip the LLM round trip entirely.
+Only the opening question of a conversation is cached: later turns are
+answered from the user's own history, which must not reach anyone else in
+the group.
+
+Entries live in a versioned per-tenant namespace. Each store claims the
+next slot from an atomic counter; once a namespace holds
+AI_RESPONSE_CACHE_MAX_ENTRIES entries the tenant generation is bumped and
+the old entries are left to expire, so no shared key list is rewritten.
+"""
+
+import hashlib
+import logging
+import math
+import re
+import time
+from typing import Dict, List, Optional, Any
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('omnifin')
+
+EMBEDDING_DIMENSIONS = 256
+
+
+class ResponseCacheService:
+    """Tenant-scoped cache of AI responses keyed by normalized question"""
+
+    KEY_PREFIX = 'ai_response_cache'
+    PROMPT_GENERATION_KEY = 'ai_response_cache:prompt_generation'
+    KNOWLEDGE_GENERATION_KEY = 'ai_response_cache:knowledge_generation'
+
+    def __init__(self, client=None):
+        self.client = client
+        self.enabled = settings.AI_RESPONSE_CACHE_ENABLED
+        self.timeout = settings.AI_RESPONSE_CACHE_TTL
+        self.max_entries = settings.AI_RESPONSE_CACHE_MAX_ENTRIES
+        self.min_words = settings.AI_RESPONSE_CACHE_MIN_WORDS
+        self.similarity_threshold = settings.AI_RESPONSE_CACHE_SIMILARITY_THRESHOLD
+        self.embedding_model = settings.AI_RESPONSE_CACHE_EMBEDDING_MODEL
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Lowercase, strip punctuation and collapse whitespace"""
+        question = re.sub(r"[^\w\s]", " ", (question or '').lower())
+        return " ".join(question.split())
+
+    @staticmethod
+    def tenant_scope(user) -> str:
+        """Cache scope for a user: their group, or the user alone"""
+        if getattr(user, 'group_id', None):
+            return f"group:{user.group_id}"
+        return f"user:{user.id}"
+
+    def is_cacheable(self, question: str, context: Dict[str, Any] = None, has_history: bool = False) -> bool:
+        """Only standalone questions without per-request context or prior history are cached"""
+        if not self.enabled or context or has_history:
+            return False
+        return len(self.normalize_question(question).split()) >= self.min_words
+
+    def get(self, user, question: str, knowledge_ids: List[str]) -> Optional[str]:
+        """Return a cached response for the question, or None on a miss"""
+        try:
+            scope_key = self._scope_key(user)
+            normalized = self.normalize_question(question)
+            entry_key = self._entry_key(scope_key, normalized, knowledge_ids)
+
+            entry = cache.get(entry_key)
+            if entry is None and self.similarity_threshold > 0:
+                entry_key, entry = self._find_similar(scope_key, normalized, knowledge_ids)
+
+            if entry is None:
+                return None
+
+            logger.info(f"AI response cache hit for {scope_key}")
+            return entry['response']
+        except Exception as e:
+            logger.warning(f"AI response cache lookup failed: {str(e)}")
+            return None
+
+    def set(self, user, question: str, knowledge_ids: List[str], response: str) -> None:
+        """Store a response in the next free slot of the tenant's namespace"""
+        try:
+            scope_key = self._scope_key(user)
+            slot = self._claim_slot(scope_key)
+            if slot > self.max_entries:
+                # Namespace is full: start an empty one and let the old entries expire
+                self._bump(self._tenant_generation_key(user))
+                scope_key = self._scope_key(user)
+                slot = self._claim_slot(scope_key)
+
+            normalized = self.normalize_question(question)
+            entry_key = self._entry_key(scope_key, normalized, knowledge_ids)
+            cache.set(entry_key, {
+                'response': response,
+                'created_at': time.time(),
+            }, self.timeout)
+
+            if self.similarity_threshold > 0:
+                cache.set(self._slot_key(scope_key, slot), {
+                    'key': entry_key,
+                    'knowledge_ids': sorted(knowledge_ids),
+                    'embedding': self._embed(normalized),
+                }, self.timeout)
+        except Exception as e:
+            logger.warning(f"AI response cache store failed: {str(e)}")
+
+    @classmethod
+    def invalidate_prompts(cls) -> None:
+        """Invalidate every cached response built on the current prompts"""
+        cls._bump(cls.PROMPT_GENERATION_KEY)
+
+    @classmethod
+    def invalidate_knowledge(cls) -> None:
+        """Invalidate every cached response built on the current knowledge base"""
+        cls._bump(cls.KNOWLEDGE_GENERATION_KEY)
+
+    @staticmethod
+    def _bump(key: str) -> None:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time()), None)
+
+    @classmethod
+    def _generation(cls, key: str) -> int:
+        generation = cache.get(key)
+        if generation is None:
+            generation = int(time.time())
+            cache.add(key, generation, None)
+            generation = cache.get(key, generation)
+        return generation
+
+    def _tenant_generation_key(self, user) -> str:
+        return f"{self.KEY_PREFIX}:generation:{self.tenant_scope(user)}"
+
+    def _scope_key(self, user) -> str:
+        """Scope key embedding tenant, tenant generation, prompt generation and knowledge generation"""
+        tenant_generation = self._generation(self._tenant_generation_key(user))
+        prompt_generation = self._generation(self.PROMPT_GENERATION_KEY)
+        knowledge_generation = self._generation(self.KNOWLEDGE_GENERATION_KEY)
+        return f"{self.tenant_scope(user)}:t{tenant_generation}:p{prompt_generation}:k{knowledge_generation}"
+
+    def _entry_key(self, scope_key: str, normalized: str, knowledge_ids: List[str]) -> str:
+        digest = hashlib.sha256(
+            f"{normalized}|{','.join(sorted(knowledge_ids))}".encode('utf-8')
+        ).hexdigest()
+        return f"{self.KEY_PREFIX}:{scope_key}:{digest}"
+
+    def _slot_count_key(self, scope_key: str) -> str:
+        return f"{self.KEY_PREFIX}:slots:{scope_key}"
+
+    def _slot_key(self, scope_key: str, slot: int) -> str:
+        return f"{self.KEY_PREFIX}:slot:{scope_key}:{slot}"
+
+    def _claim_slot(self, scope_key: str) -> int:
+        """Atomically take the next slot number in the namespace"""
+        count_key = self._slot_count_key(scope_key)
+        cache.add(count_key, 0, self.timeout)
+        try:
+            return cache.incr(count_key)
+        except ValueError:
+            # The counter expired between add and incr
+            cache.add(count_key, 0, self.timeout)
+            return cache.incr(count_key)
+
+    def _find_similar(self, scope_key: str, normalized: str, knowledge_ids: List[str]):
+        """Find the most similar cached question above the threshold"""
+        slots = min(cache.get(self._slot_count_key(scope_key)) or 0, self.max_entries)
+        if not slots:
+            return None, None
+        index = cache.get_many([self._slot_key(scope_key, slot) for slot in range(1, slots + 1)]).values()
+
+        query_embedding = self._embed(normalized)
+        sorted_ids = sorted(knowledge_ids)
+        best_key, best_score = None, self.similarity_threshold
+
+        for item in index:
+            if not item.get('embedding') or item['knowledge_ids'] != sorted_ids:
+                continue
+            score = self._cosine_similarity(query_embedding, item['embedding'])
+            if score >= best_score:
+                best_key, best_score = item['key'], score
+
+        if not best_key:
+            return None, None
+        return best_key, cache.get(best_key)
+
+    def _embed(self, text: str) -> List[float]:
+        """Embed text with the configured model, or a local hashed term vector"""
+        if self.embedding_model and self.client:
+            response = self.client.embeddings.create(model=self.embedding_model, input=text)
+            return response.data[0].embedding
+
+        vector = [0.0] * EMBEDDING_DIMENSIONS
+        words = text.split()
+        terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for term in terms:
+            digest = hashlib.md5(term.encode('utf-8')).digest()
+            vector[int.from_bytes(digest[:4], 'big') % EMBEDDING_DIMENSIONS] += 1.0
+        return vector
+
+    @staticmethod
+    def _cosine_similarity(a: List[float], b: List[float]) -> float:
+        if len(a) != len(b):
+            return 0.0
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
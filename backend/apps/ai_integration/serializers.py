@@ -3,6 +3,8 @@ AI Integration serializers for Omnifin Platform
 """
 
 from rest_framework import serializers
+from django.db import IntegrityError, transaction
+from django.db.models import Max
 from apps.ai_integration.models import Prompt, Knowledge, Conversation, Message
 
 
@@ -24,14 +26,19 @@ class PromptCreateSerializer(serializers.ModelSerializer):
         fields = ['name', 'category', 'content']
     
     def create(self, validated_data):
-        # Check if prompt with same name exists
-        existing_prompts = Prompt.objects.filter(name=validated_data['name'])
-        if existing_prompts.exists():
-            # Increment version
-            latest_version = existing_prompts.latest('version')
-            validated_data['version'] = latest_version.version + 1
-        
-        return Prompt.objects.create(**validated_data)
+        # Next version comes from a single MAX() over the name index; a
+        # concurrent create of the same name loses the unique check and retries
+        for attempt in range(3):
+            latest_version = Prompt.objects.filter(name=validated_data['name']).aggregate(
+                latest=Max('version')
+            )['latest']
+            validated_data['version'] = (latest_version or 0) + 1
+            try:
+                with transaction.atomic():
+                    return Prompt.objects.create(**validated_data)
+            except IntegrityError:
+                if attempt == 2:
+                    raise
 
 
 class KnowledgeSerializer(serializers.ModelSerializer):
@@ -62,15 +69,31 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class ConversationSerializer(serializers.ModelSerializer):
-    """Conversation serializer"""
-    messages = MessageSerializer(many=True, read_only=True)
+class ConversationListSerializer(serializers.ModelSerializer):
+    """Lightweight conversation serializer without embedded messages"""
     
     class Meta:
         model = Conversation
         fields = ['id', 'user', 'application', 'session_id', 'is_voice_chat',
-                 'status', 'started_at', 'ended_at', 'messages', 'metadata']
-        read_only_fields = ['id', 'session_id', 'started_at']
+                 'status', 'started_at', 'ended_at', 'metadata',
+                 'message_count', 'last_message_at']
+        read_only_fields = ['id', 'session_id', 'started_at', 'message_count', 'last_message_at']
+
+
+class ConversationSerializer(ConversationListSerializer):
+    """Conversation serializer embedding the latest ``include_messages`` messages"""
+    DEFAULT_INCLUDE_MESSAGES = 50
+    messages = serializers.SerializerMethodField()
+    
+    class Meta(ConversationListSerializer.Meta):
+        fields = ConversationListSerializer.Meta.fields + ['messages']
+    
+    def get_messages(self, obj):
+        limit = self.context.get('include_messages', self.DEFAULT_INCLUDE_MESSAGES)
+        if not limit:
+            return []
+        latest = Message.objects.filter(conversation=obj).order_by('-created_at')[:limit]
+        return MessageSerializer(reversed(list(latest)), many=True).data
 
 
 class ConversationCreateSerializer(serializers.ModelSerializer):
@@ -84,8 +107,7 @@ class ConversationCreateSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         
         # Generate session ID
-        import time
-        session_id = f"conv_{user.id}_{int(time.time())}"
+        session_id = Conversation.new_session_id(user)
         
         conversation = Conversation.objects.create(
             user=user,
@@ -108,4 +130,8 @@ class VoiceUploadSerializer(serializers.Serializer):
     """Voice upload serializer"""
     audio_file = serializers.FileField()
     session_id = serializers.CharField()
-    context = serializers.JSONField(required=False)
\ No newline at end of file
+    context = serializers.JSONField(required=False)
+    # json: base64 audio in the body, stream: chunked audio/mpeg body,
+    # url: JSON with a short-lived link the audio is synthesized from,
+    # pipelined: audio/mpeg synthesized sentence by sentence while the reply generates
+    transport = serializers.ChoiceField(choices=['json', 'stream', 'url', 'pipelined'], default='json')
\ No newline at end of file
@@ -2,36 +2,51 @@
 AI Integration Services for Omnifin Platform
 """
 
-from openai import OpenAI  # ✅ CORRECT IMPORT
 import requests
 import json
 import logging
 import time
 import base64
 import os
-from typing import Dict, List, Optional, Any
+import hashlib
+import secrets
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
 from django.conf import settings
 from django.core.cache import cache
+from django.utils import timezone
 from apps.ai_integration.models import Prompt, Knowledge, Conversation, Message
+from apps.ai_integration.admission import LLMAdmissionController
+from apps.ai_integration.deadlines import Deadline, DeadlineExceeded, call_upstream
+from apps.ai_integration.model_router import ModelRouter, RouteDecision
+from apps.ai_integration.knowledge_services import KnowledgeRetriever
+from apps.ai_integration.providers import ProviderObject, get_llm_client
+from apps.ai_integration.response_cache import ResponseCacheService
+from apps.ai_integration.context_builder import ConversationContextBuilder, count_tokens
+from apps.ai_integration.turn_commit import ChatTurnUnitOfWork
+from apps.ai_integration.prompt_registry import PromptRegistry
+from apps.ai_integration.tools import tool_registry
+from apps.ai_integration.tts_cache import TTSCache
+from apps.ai_integration.voice_pipeline import pipeline_speech
 
 logger = logging.getLogger('omnifin')
 
 
 class AIChatService:
+    MAX_COMPLETION_TOKENS = 500
+    DEGRADED_REPLY = "I'm sorry, this is taking longer than usual. Please try again in a moment."
+    
     def __init__(self):
         try:
-            client_kwargs = {
-                'api_key': settings.OPENAI_API_KEY
-            }
-            
-            # client_kwargs['timeout'] = 60.0
-            # client_kwargs['max_retries'] = 2
-            
-            self.client = OpenAI(**client_kwargs)
+            self.client = get_llm_client()
             self.model = settings.AI_MODEL
             self.conversation_cache_timeout = 3600  # 1 hour
+            self.response_cache = ResponseCacheService(client=self.client)
+            self.admission = LLMAdmissionController()
+            self.router = ModelRouter()
+            self.knowledge_retriever = KnowledgeRetriever()
         except Exception as e:
-            logger.error(f"Error initializing OpenAI client: {str(e)}")
+            logger.error(f"Error initializing LLM client: {str(e)}")
             raise
     
     def get_active_prompts(self, category: str = None) -> List[Prompt]:
@@ -41,19 +56,18 @@ class AIChatService:
             prompts = prompts.filter(category=category)
         return prompts.order_by('category', 'name')
     
-    def get_relevant_knowledge(self, query: str, limit: int = 5) -> List[str]:
-        """Get relevant knowledge base entries for context"""
-        # Simple keyword matching - in production, use vector search
-        knowledge_entries = Knowledge.objects.filter(
-            is_active=True,
-            content__icontains=query.lower()
-        )[:limit]
-        
-        return [entry.content for entry in knowledge_entries]
+    def get_relevant_knowledge(self, query: str, limit: int = None) -> List[str]:
+        """Get relevant knowledge base passages for context"""
+        return [content for _, content in self._get_relevant_knowledge_entries(query, limit)]
+    
+    def _get_relevant_knowledge_entries(self, query: str, limit: int = None) -> List[tuple]:
+        """Get (passage id, content) pairs of the best passages fitting AI_KNOWLEDGE_TOKEN_BUDGET"""
+        passages = self.knowledge_retriever.search(query, max_passages=limit)
+        return [(str(passage['id']), passage['content']) for passage in passages]
     
     def create_conversation(self, user, is_voice_chat: bool = False, application_id: str = None) -> Conversation:
         """Create a new conversation session"""
-        session_id = f"conv_{user.id}_{int(time.time())}"
+        session_id = Conversation.new_session_id(user)
         
         conversation = Conversation.objects.create(
             user=user,
@@ -64,298 +78,407 @@ class AIChatService:
         
         return conversation
     
-    def process_message(self, conversation: Conversation, user_message: str, context: Dict[str, Any] = None) -> str:
-        """Process user message and generate AI response"""
+    def process_message(self, conversation: Conversation, user_message: str, context: Dict[str, Any] = None,
+                        deadline: Deadline = None) -> str:
+        """Process user message and generate AI response within the request's deadline"""
+        deadline = deadline or Deadline(settings.AI_REQUEST_BUDGET_SECONDS)
+        # Admit before anything is saved, so a rejected turn leaves no trace
+        ticket = self.admission.admit(conversation.user, self._estimate_turn_tokens(user_message))
+        turn = ChatTurnUnitOfWork(conversation)
+        decision = None
+        tool_messages = []
         try:
-            # Save user message
-            Message.objects.create(
-                conversation=conversation,
-                sender='user',
-                content=user_message
-            )
-            
-            # Build conversation history
-            messages = self._build_conversation_history(conversation)
-            
-            # Add system context and prompts
-            system_prompt = self._build_system_prompt(context)
-            messages.insert(0, {"role": "system", "content": system_prompt})
-            
-            # Add relevant knowledge
-            knowledge = self.get_relevant_knowledge(user_message)
-            if knowledge:
-                knowledge_context = "\n\nRelevant information:\n" + "\n".join(knowledge)
-                messages.append({"role": "system", "content": knowledge_context})
-            
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
-            
-            # Define tools/functions the AI can use
-            tools = self._get_available_tools()
-            
-            logger.info(f"Calling OpenAI API with model: {self.model}")
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
-                max_tokens=500,
-                temperature=0.7,
-                presence_penalty=0.1,
-                frequency_penalty=0.1
+            messages, cacheable, knowledge_ids, cached_response = self._prepare_turn(turn, user_message, context)
+            if cached_response is not None:
+                ticket.settle(0)
+                turn.commit()
+                return cached_response
+            
+            decision = self._route_turn(turn, user_message)
+            started_at = time.monotonic()
+            logger.info(f"Calling LLM provider {settings.AI_PROVIDER} with model: {decision.model}")
+            options = self._completion_options(decision)
+            response = call_upstream(
+                f"chat:{decision.model}",
+                lambda timeout: self.client.chat.completions.create(
+                    model=decision.model,
+                    messages=messages,
+                    timeout=timeout,
+                    **options
+                ),
+                deadline,
+                hedge=True
             )
             
             response_message = response.choices[0].message
             
-            # Check if AI wants to call a function
+            # Check if AI wants to call functions
             if response_message.tool_calls:
-                # Execute the function call
-                tool_call = response_message.tool_calls[0]
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-                
-                logger.info(f"AI requested function call: {function_name} with args: {function_args}")
-                
-                # Execute the function
-                function_response = self._execute_function(function_name, function_args, conversation.user)
+                # Execute every requested call concurrently, results in call order
+                tool_messages = tool_registry.execute_tool_calls(response_message.tool_calls, conversation.user)
                 
-                # Add function call to messages
+                # Add function calls and all their results to messages
                 messages.append(response_message.model_dump())
-                messages.append({
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "name": function_name,
-                    "content": json.dumps(function_response)
-                })
+                messages.extend(tool_messages)
                 
-                # Get AI's final response after function execution
-                second_response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages
+                # Get AI's final response after all functions ran, in one round trip
+                second_response = call_upstream(
+                    f"chat:{decision.model}",
+                    lambda timeout: self.client.chat.completions.create(
+                        model=decision.model,
+                        messages=messages,
+                        timeout=timeout
+                    ),
+                    deadline,
+                    hedge=True
                 )
                 ai_response = second_response.choices[0].message.content
             else:
-                # ✅ NEW SYNTAX - Extract AI response
                 ai_response = response_message.content
             
-            # Track token usage
             try:
                 tokens_used = response.usage.total_tokens
-                self._track_token_usage(conversation.user, tokens_used, 'llm')
             except Exception as e:
-                logger.warning(f"Could not track token usage: {str(e)}")
-            
-            # Save AI message
-            ai_msg = Message.objects.create(
-                conversation=conversation,
-                sender='ai',
-                content=ai_response
+                tokens_used = None
+                logger.warning(f"Could not read token usage: {str(e)}")
+            
+            ModelRouter.record(decision, (time.monotonic() - started_at) * 1000, tokens_used)
+            ticket.settle(tokens_used)
+            self._finish_turn(
+                turn, user_message, ai_response, tokens_used,
+                cacheable=cacheable and not response_message.tool_calls,
+                knowledge_ids=knowledge_ids
             )
-            
-            message_count = conversation.messages.count()
-            logger.info(f"Successfully processed message for conversation {conversation.id}. Total messages: {message_count}, AI message saved: {ai_msg.id}")
             return ai_response
+        
+        except DeadlineExceeded as e:
+            logger.warning(f"AI turn for conversation {conversation.id} ran out of time: {str(e)}")
+            if decision is not None:
+                ModelRouter.record(decision, (time.monotonic() - started_at) * 1000, None, failed=True)
+            reply = self._degraded_reply(tool_messages)
+            if tool_messages:
+                # The tools already ran; keep their outcome in the history
+                turn.add_message('ai', reply)
+            self._commit_failed_turn(turn)
+            return reply
             
         except Exception as e:
             logger.error(f"Error processing AI message: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
+            if decision is not None:
+                ModelRouter.record(decision, (time.monotonic() - started_at) * 1000, None, failed=True)
+            self._commit_failed_turn(turn)
             return "I apologize, but I'm having trouble processing your request. Please try again."
+        finally:
+            ticket.release()
     
-    def _build_conversation_history(self, conversation: Conversation) -> List[Dict[str, str]]:
-        """Build conversation history for context"""
-        messages = []
-        
-        # Get recent messages (last 10)
-        recent_messages = Message.objects.filter(conversation=conversation).order_by('-created_at')[:10]
-        
-        for message in reversed(recent_messages):
-            role = 'user' if message.sender == 'user' else 'assistant'
-            messages.append({
-                "role": role,
-                "content": message.content
-            })
-        
-        return messages
-    
-    def _build_system_prompt(self, context: Dict[str, Any] = None) -> str:
-        if context:
-            context_str = "\n\nCurrent context:\n"
-            for key, value in context.items():
-                context_str += f"- {key}: {value}\n"
-            base_prompt += context_str
-        
-        return base_prompt
+    def stream_message(self, conversation: Conversation, user_message: str, context: Dict[str, Any] = None,
+                       deadline: Deadline = None) -> Iterator[str]:
+        """Process user message, yielding the AI response text as it is generated"""
+        deadline = deadline or Deadline(settings.AI_REQUEST_BUDGET_SECONDS)
+        # Admit eagerly so a rejection surfaces before the caller starts its response
+        ticket = self.admission.admit(conversation.user, self._estimate_turn_tokens(user_message))
+        return self._stream_turn(conversation, user_message, context, ticket, deadline)
     
-    def _get_available_tools(self) -> List[Dict[str, Any]]:
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": "submit_loan_application",
-                    "description": "Submit a loan application for the user. Use this when you have collected all required information from the user.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "loan_amount": {
-                                "type": "number",
-                                "description": "The loan amount requested by the user"
-                            },
-                            "loan_purpose": {
-                                "type": "string",
-                                "description": "The purpose/reason for the loan"
-                            },
-                            "loan_term": {
-                                "type": "integer",
-                                "description": "The loan term in months"
-                            },
-                            "interest_rate": {
-                                "type": "number",
-                                "description": "The desired interest rate percentage"
-                            }
-                        },
-                        "required": ["loan_amount", "loan_purpose", "loan_term", "interest_rate"]
-                    }
-                }
-            }
-        ]
-    
-    def _execute_function(self, function_name: str, function_args: Dict[str, Any], user) -> Dict[str, Any]:
-        """Execute a function called by the AI"""
-        if function_name == "submit_loan_application":
-            return self._submit_loan_application(function_args, user)
-        else:
-            return {"error": f"Unknown function: {function_name}"}
-    
-    def _submit_loan_application(self, application_data: Dict[str, Any], user) -> Dict[str, Any]:
-        """Submit a loan application"""
+    def _stream_turn(self, conversation: Conversation, user_message: str, context: Dict[str, Any], ticket,
+                     deadline: Deadline) -> Iterator[str]:
+        turn = ChatTurnUnitOfWork(conversation)
+        decision = None
+        tool_messages = []
+        started = False
         try:
-            from apps.loans.models import Application
-            from apps.authentication.models import ApplicantProfile
-            from apps.authentication.activity_utils import log_activity
-            
-            # Check if user has applicant profile
-            if not hasattr(user, 'applicant_profile'):
-                return {
-                    "success": False,
-                    "error": "User must have an applicant profile to apply for loans. Please create your profile first."
-                }
+            messages, cacheable, knowledge_ids, cached_response = self._prepare_turn(turn, user_message, context)
+            if cached_response is not None:
+                ticket.settle(0)
+                turn.commit()
+                started = True
+                yield cached_response
+                return
             
-            applicant = user.applicant_profile
-            
-            # Get TPB if user was referred
-            tpb = None
-            if hasattr(applicant, 'referred_by') and applicant.referred_by:
-                tpb = applicant.referred_by
-            
-            # Create the application
-            application = Application.objects.create(
-                applicant=applicant,
-                tpb=tpb,
-                loan_amount=application_data['loan_amount'],
-                loan_purpose=application_data['loan_purpose'],
-                loan_term=application_data['loan_term'],
-                interest_rate=application_data['interest_rate']
+            decision = self._route_turn(turn, user_message)
+            started_at = time.monotonic()
+            logger.info(f"Streaming from LLM provider {settings.AI_PROVIDER} with model: {decision.model}")
+            # Streams are not hedged: their first tokens are already on the wire
+            options = self._completion_options(decision)
+            stream = call_upstream(
+                f"chat-stream:{decision.model}",
+                lambda timeout: self.client.chat.completions.create(
+                    model=decision.model,
+                    messages=messages,
+                    timeout=timeout,
+                    **options,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                ),
+                deadline
             )
             
-            # Log activity
-            log_activity(
-                user=user,
-                activity_type='loan_application',
-                description=f"Applied for {application_data['loan_purpose']} loan of ${application_data['loan_amount']} via AI Chat",
-                metadata={
-                    'application_id': str(application.id),
-                    'application_number': application.application_number,
-                    'loan_amount': str(application_data['loan_amount']),
-                    'loan_purpose': application_data['loan_purpose'],
-                    'loan_term': application_data['loan_term'],
-                    'interest_rate': str(application_data['interest_rate']),
-                    'source': 'ai_chat'
+            parts = []
+            tool_calls = {}
+            tokens_used = None
+            for chunk in stream:
+                if deadline.expired:
+                    raise DeadlineExceeded("Reply stream did not finish within the request budget")
+                if getattr(chunk, 'usage', None):
+                    tokens_used = chunk.usage.total_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if getattr(delta, 'content', None):
+                    started = True
+                    parts.append(delta.content)
+                    yield delta.content
+                # Tool call names and arguments arrive in fragments keyed by index
+                for fragment in getattr(delta, 'tool_calls', None) or []:
+                    call = tool_calls.setdefault(fragment.index, {'id': '', 'name': '', 'arguments': ''})
+                    call['id'] = fragment.id or call['id']
+                    if fragment.function:
+                        call['name'] += fragment.function.name or ''
+                        call['arguments'] += fragment.function.arguments or ''
+            
+            if tool_calls:
+                assistant_message = {
+                    'role': 'assistant',
+                    'content': ''.join(parts) or None,
+                    'tool_calls': [
+                        {'id': call['id'], 'type': 'function', 'function': {'name': call['name'], 'arguments': call['arguments']}}
+                        for _, call in sorted(tool_calls.items())
+                    ]
                 }
+                calls = ProviderObject(assistant_message).tool_calls
+                messages.append(assistant_message)
+                tool_messages = tool_registry.execute_tool_calls(calls, conversation.user)
+                messages.extend(tool_messages)
+                
+                parts = []
+                follow_up = call_upstream(
+                    f"chat-stream:{decision.model}",
+                    lambda timeout: self.client.chat.completions.create(
+                        model=decision.model,
+                        messages=messages,
+                        timeout=timeout,
+                        stream=True
+                    ),
+                    deadline
+                )
+                for chunk in follow_up:
+                    if deadline.expired:
+                        raise DeadlineExceeded("Reply stream did not finish within the request budget")
+                    if chunk.choices and getattr(chunk.choices[0].delta, 'content', None):
+                        started = True
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            
+            ModelRouter.record(decision, (time.monotonic() - started_at) * 1000, tokens_used)
+            ticket.settle(tokens_used)
+            self._finish_turn(
+                turn, user_message, ''.join(parts), tokens_used,
+                cacheable=cacheable and not tool_calls,
+                knowledge_ids=knowledge_ids
             )
             
-            return {
-                "success": True,
-                "application_id": str(application.id),
-                "application_number": application.application_number,
-                "status": application.status,
-                "message": f"Loan application {application.application_number} submitted successfully! The application has been completed. If you'd like to apply for another loan, please let me know."
-            }
-            
         except Exception as e:
-            logger.error(f"Error submitting loan application: {str(e)}")
+            logger.error(f"Error streaming AI message: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            if decision is not None:
+                ModelRouter.record(decision, (time.monotonic() - started_at) * 1000, None, failed=True)
+            if not started:
+                if isinstance(e, DeadlineExceeded):
+                    reply = self._degraded_reply(tool_messages)
+                    if tool_messages:
+                        turn.add_message('ai', reply)
+                    yield reply
+                else:
+                    yield "I apologize, but I'm having trouble processing your request. Please try again."
+        finally:
+            # Also covers a client that disconnects mid-stream
+            self._commit_failed_turn(turn)
+            ticket.release()
+    
+    def _route_turn(self, turn: ChatTurnUnitOfWork, user_message: str) -> RouteDecision:
+        """Pick the model for this turn and tag the turn's usage records with the route"""
+        decision = self.router.route(turn.conversation.user, user_message, turn.conversation)
+        turn.metadata.update(decision.as_metadata())
+        return decision
+    
+    def _completion_options(self, decision: RouteDecision) -> Dict[str, Any]:
+        """Sampling options for the first completion; only the strong route is offered tools"""
+        options = {
+            'max_tokens': self.MAX_COMPLETION_TOKENS,
+            'temperature': 0.7,
+            'presence_penalty': 0.1,
+            'frequency_penalty': 0.1,
+        }
+        if decision.use_tools:
+            options.update(tools=self._get_available_tools(), tool_choice="auto")
+        return options
     
-    def _track_token_usage(self, user, tokens_used, usage_type='llm'):
-        """Track token usage for the user's group"""
+    def _degraded_reply(self, tool_messages: List[Dict[str, Any]] = None) -> str:
+        """Reply used when the budget runs out; reports tool outcomes if any tool already ran"""
+        outcomes = []
+        for tool_message in tool_messages or []:
+            try:
+                result = json.loads(tool_message['content'])
+            except (TypeError, ValueError):
+                continue
+            if isinstance(result, dict) and (result.get('message') or result.get('error')):
+                outcomes.append(result.get('message') or result.get('error'))
+        if outcomes:
+            return ' '.join(outcomes)
+        return self.DEGRADED_REPLY
+    
+    def _estimate_turn_tokens(self, user_message: str) -> int:
+        """Upper-bound token estimate used to admit a turn before its prompt is built"""
+        return count_tokens(user_message) + settings.AI_CONTEXT_TOKEN_BUDGET + self.MAX_COMPLETION_TOKENS
+    
+    def _prepare_turn(self, turn: ChatTurnUnitOfWork, user_message: str, context: Dict[str, Any] = None):
+        """Buffer the user message and assemble the LLM request
+        
+        Returns ``(messages, cacheable, knowledge_ids, cached_response)``; a
+        non-None cached response has already been buffered as the AI reply.
+        """
+        conversation = turn.conversation
+        turn.add_message('user', user_message)
+        
+        # Retrieve relevant knowledge (its IDs are part of the cache key)
+        knowledge_entries = self._get_relevant_knowledge_entries(user_message)
+        knowledge_ids = [entry_id for entry_id, _ in knowledge_entries]
+        knowledge = [content for _, content in knowledge_entries]
+        
+        # Serve repeated questions from the response cache without an LLM call
+        cacheable = self.response_cache.is_cacheable(
+            user_message, context,
+            has_history=Message.objects.filter(conversation=conversation).exists()
+        )
+        if cacheable:
+            cached_response = self.response_cache.get(conversation.user, user_message, knowledge_ids)
+            if cached_response is not None:
+                turn.add_message('ai', cached_response)
+                return None, cacheable, knowledge_ids, cached_response
+        
+        # Build conversation history
+        messages = self._build_conversation_history(
+            conversation,
+            usage_callback=turn.add_usage
+        )
+        
+        # Add system context and prompts
+        system_prompt = self._build_system_prompt(context)
+        messages.insert(0, {"role": "system", "content": system_prompt})
+        
+        # Add relevant knowledge
+        if knowledge:
+            knowledge_context = "\n\nRelevant information:\n" + "\n".join(knowledge)
+            messages.append({"role": "system", "content": knowledge_context})
+        
+        # Add current user message
+        messages.append({"role": "user", "content": user_message})
+        
+        return messages, cacheable, knowledge_ids, None
+    
+    def _finish_turn(self, turn: ChatTurnUnitOfWork, user_message: str, ai_response: str, tokens_used,
+                     cacheable: bool, knowledge_ids: List[str]) -> Message:
+        """Cache the AI reply, then save the turn's messages and usage in one transaction"""
+        conversation = turn.conversation
+        # Only plain answers are reusable; tool calls have side effects
+        if cacheable and ai_response:
+            self.response_cache.set(conversation.user, user_message, knowledge_ids, ai_response)
+        
+        turn.add_usage(tokens_used or 0)
+        ai_msg = turn.add_message('ai', ai_response)
+        turn.commit()
+        
+        logger.info(f"Successfully processed message for conversation {conversation.id}. AI message saved: {ai_msg.id}")
+        return ai_msg
+    
+    def _commit_failed_turn(self, turn: ChatTurnUnitOfWork) -> None:
+        """Keep the user's message (and any usage already incurred) when the turn fails; no-op once committed"""
         try:
-            if not user.group_id:
-                return
-            
-            from apps.subscriptions.models import Subscription
-            from apps.subscriptions.usage_services import UsageTrackingService
-            
-            # Find active or incomplete subscription for group
-            subscription = Subscription.objects.filter(
-                group_id=user.group_id,
-                status__in=['active', 'incomplete', 'trialing']
-            ).first()
-            
-            if subscription:
-                UsageTrackingService.record_usage(
-                    subscription_id=str(subscription.id),
-                    usage_type=usage_type,
-                    tokens_used=tokens_used,
-                    user_id=str(user.id),
-                    metadata={'conversation_type': 'chat'}
-                )
+            turn.commit()
         except Exception as e:
-            logger.error(f"Error tracking token usage: {str(e)}")
+            logger.error(f"Error saving failed turn for conversation {turn.conversation.id}: {str(e)}")
+    
+    def _build_conversation_history(self, conversation: Conversation, usage_callback=None) -> List[Dict[str, str]]:
+        """Build token-budgeted conversation history, summarizing older turns"""
+        builder = ConversationContextBuilder(
+            client=self.client,
+            model=self.model,
+            usage_callback=usage_callback
+        )
+        return builder.build_history(conversation)
+    
+    def _build_system_prompt(self, context: Dict[str, Any] = None) -> str:
+        """Render the active system prompts with the request context"""
+        return PromptRegistry.render_system_prompt(context)
+    
+    def _get_available_tools(self) -> List[Dict[str, Any]]:
+        return tool_registry.schemas()
+    
+    def _execute_function(self, function_name: str, function_args: Dict[str, Any], user) -> Dict[str, Any]:
+        """Execute a function called by the AI"""
+        return tool_registry.execute(function_name, function_args, user)
 
 
 class VoiceService:
     
+    AUDIO_URL_KEY_PREFIX = 'ai_voice_audio'
+    
     def __init__(self):
         try:
-            self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+            self.client = get_llm_client()
             self.elevenlabs_api_key = settings.ELEVENLABS_API_KEY
             self.ultravox_api_key = settings.ULTRAVOX_API_KEY
         except Exception as e:
-            logger.error(f"Error initializing VoiceService OpenAI client: {str(e)}")
+            logger.error(f"Error initializing VoiceService LLM client: {str(e)}")
             raise
     
-    def speech_to_text(self, audio_file, user=None) -> str:
+    def speech_to_text(self, audio_file, user=None, deadline: Deadline = None) -> str:
+        deadline = deadline or Deadline(settings.AI_REQUEST_BUDGET_SECONDS)
         try:
             logger.info("Starting speech to text conversion with Whisper")
             
             audio_file.seek(0)
 
-            file_content = audio_file.read()
+            # Hand the upload's own file object to the client so the audio
+            # is streamed from memory or its temp file, not copied first.
+            # Uploads spooled to disk can be reopened, so only they are
+            # hedged: each attempt needs its own read position.
+            on_disk = hasattr(audio_file, 'temporary_file_path')
 
-            openai_file_tuple = (audio_file.name, file_content)
+            def transcribe(timeout):
+                if not on_disk:
+                    return self.client.audio.transcriptions.create(
+                        model="whisper-1",
+                        file=(audio_file.name, audio_file.file),
+                        response_format="text",
+                        timeout=timeout
+                    )
+                with open(audio_file.temporary_file_path(), 'rb') as handle:
+                    return self.client.audio.transcriptions.create(
+                        model="whisper-1",
+                        file=(audio_file.name, handle),
+                        response_format="text",
+                        timeout=timeout
+                    )
 
-            transcript = self.client.audio.transcriptions.create(
-                model="whisper-1",
-                file=openai_file_tuple, 
-                response_format="text"
-            )
+            transcript = call_upstream("stt:whisper-1", transcribe, deadline, hedge=on_disk)
             
             # Track voice token usage (estimate based on audio duration/size)
             if user:
                 try:
                     # Rough estimate: 1 token per 0.75 seconds of audio
-                    estimated_tokens = len(file_content) // 16000  # Approximate
+                    estimated_tokens = (audio_file.size or 0) // 16000  # Approximate
                     self._track_voice_usage(user, estimated_tokens)
                 except Exception as e:
                     logger.warning(f"Could not track voice usage: {str(e)}")
             
             logger.info(f"Successfully transcribed audio")
             return transcript
+        
+        except DeadlineExceeded:
+            raise
             
         except Exception as e:
             # LOG THE REAL ERROR
@@ -366,22 +489,14 @@ class VoiceService:
             logger.error(traceback.format_exc())
             raise Exception(f"Failed to transcribe audio: {str(e)}") # Return actual error for debugging
     
-    def text_to_speech(self, text: str, voice_id: str = None, user=None) -> str:
+    def text_to_speech(self, text: str, voice_id: str = None, user=None, deadline: Deadline = None) -> str:
         try:
             logger.info("Starting text to speech conversion")
             
-            response = self.client.audio.speech.create(
-                model="tts-1",
-                voice=voice_id or "alloy",
-                input=text,
-                response_format="mp3"
-            )
-            
-            # Get audio content as bytes
-            audio_bytes = response.content
+            audio_bytes, cached = self._synthesize(text, voice_id, deadline)
             
-            # Track voice token usage
-            if user:
+            # Track voice token usage; cached audio cost nothing to produce
+            if user and not cached:
                 try:
                     # Estimate tokens based on text length
                     estimated_tokens = len(text) * 2  # Rough estimate
@@ -394,6 +509,9 @@ class VoiceService:
             
             logger.info("Successfully converted text to speech")
             return audio_base64
+        
+        except DeadlineExceeded:
+            raise
             
         except Exception as e:
             logger.error(f"Error in text to speech: {str(e)}")
@@ -401,6 +519,133 @@ class VoiceService:
             logger.error(traceback.format_exc())
             raise Exception("Failed to generate speech. Please try again.")
     
+    def _synthesize(self, text: str, voice_id: str = None, deadline: Deadline = None) -> Tuple[bytes, bool]:
+        """Synthesize text to MP3 bytes, returning ``(audio, served_from_cache)``"""
+        cacheable = TTSCache.is_cacheable(text)
+        if cacheable:
+            audio = TTSCache.get(self._tts_cache_key(text, voice_id))
+            if audio is not None:
+                return audio, True
+        
+        response = call_upstream(
+            "tts:tts-1",
+            lambda timeout: self.client.audio.speech.create(
+                model="tts-1",
+                voice=voice_id or "alloy",
+                input=text,
+                response_format="mp3",
+                timeout=timeout
+            ),
+            deadline or Deadline(settings.AI_REQUEST_BUDGET_SECONDS),
+            hedge=True
+        )
+        if cacheable:
+            TTSCache.set(self._tts_cache_key(text, voice_id), response.content, settings.AI_PROVIDER, voice_id or "alloy", "tts-1")
+        return response.content, False
+    
+    @staticmethod
+    def _tts_cache_key(text: str, voice_id: str = None) -> str:
+        return TTSCache.make_key(settings.AI_PROVIDER, voice_id or "alloy", "tts-1", text)
+    
+    def stream_pipelined_speech(self, text_chunks: Iterable[str], voice_id: str = None, user=None,
+                                deadline: Deadline = None) -> Iterator[bytes]:
+        """Synthesize streamed reply text sentence by sentence, yielding MP3 segments in order
+        
+        Each sentence is synthesized within ``deadline``; one that runs out
+        of time is dropped from the audio, the text is saved regardless.
+        """
+        deadline = deadline or Deadline(settings.AI_REQUEST_BUDGET_SECONDS)
+        
+        def track(sentence):
+            if deadline.expired:
+                return
+            if user and not TTSCache.contains(self._tts_cache_key(sentence, voice_id)):
+                try:
+                    self._track_voice_usage(user, len(sentence) * 2)  # Rough estimate
+                except Exception as e:
+                    logger.warning(f"Could not track voice usage: {str(e)}")
+        
+        return pipeline_speech(
+            text_chunks,
+            lambda sentence: self._synthesize(sentence, voice_id, deadline)[0],
+            on_sentence=track
+        )
+    
+    def stream_speech(self, text: str, voice_id: str = None, user=None, deadline: Deadline = None) -> Iterator[bytes]:
+        """Convert text to speech, returning an iterator of MP3 chunks"""
+        chunk_size = settings.AI_VOICE_STREAM_CHUNK_SIZE
+        cache_key = self._tts_cache_key(text, voice_id) if TTSCache.is_cacheable(text) else None
+        if cache_key:
+            audio = TTSCache.get(cache_key)
+            if audio is not None:
+                return (audio[start:start + chunk_size] for start in range(0, len(audio), chunk_size))
+        
+        try:
+            logger.info("Starting streaming text to speech conversion")
+            
+            # Open the upstream response now so failures surface before the
+            # caller has started its own response
+            deadline = deadline or Deadline(settings.AI_REQUEST_BUDGET_SECONDS)
+            streaming = self.client.audio.speech.with_streaming_response.create(
+                model="tts-1",
+                voice=voice_id or "alloy",
+                input=text,
+                response_format="mp3",
+                timeout=deadline.timeout()
+            )
+            response = streaming.__enter__()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error in streaming text to speech: {str(e)}")
+            raise Exception("Failed to generate speech. Please try again.")
+        
+        if user:
+            try:
+                estimated_tokens = len(text) * 2  # Rough estimate
+                self._track_voice_usage(user, estimated_tokens)
+            except Exception as e:
+                logger.warning(f"Could not track voice usage: {str(e)}")
+        
+        def chunks():
+            received = []
+            try:
+                for chunk in response.iter_bytes(chunk_size):
+                    if cache_key:
+                        received.append(chunk)
+                    yield chunk
+                # Only complete audio is worth caching
+                if cache_key:
+                    TTSCache.set(cache_key, b''.join(received), settings.AI_PROVIDER, voice_id or "alloy", "tts-1")
+            except Exception as e:
+                # Headers are already sent; the client sees a truncated stream
+                logger.error(f"Speech stream interrupted: {str(e)}")
+            finally:
+                streaming.__exit__(None, None, None)
+        
+        return chunks()
+    
+    def create_audio_url_token(self, text: str, voice_id: str = None, user=None) -> str:
+        """Store a reply for deferred synthesis and return its short-lived token"""
+        token = secrets.token_urlsafe(32)
+        cache.set(
+            f"{self.AUDIO_URL_KEY_PREFIX}:{token}",
+            {'text': text, 'voice_id': voice_id, 'user_id': str(user.id) if user else None},
+            settings.AI_VOICE_AUDIO_URL_TTL
+        )
+        return token
+    
+    @classmethod
+    def claim_audio_url_request(cls, token: str) -> Optional[Dict[str, Any]]:
+        """The text, voice and owner stored for an audio URL token; each token is redeemed once"""
+        key = f"{cls.AUDIO_URL_KEY_PREFIX}:{token}"
+        # add() is atomic, so concurrent requests cannot both claim the token
+        if not cache.add(f"{key}:claimed", True, settings.AI_VOICE_AUDIO_URL_TTL):
+            return None
+        audio_request = cache.get(key)
+        cache.delete(key)
+        return audio_request
+    
     def _track_voice_usage(self, user, tokens_used):
         """Track voice token usage"""
         try:
@@ -426,7 +671,7 @@ class VoiceService:
         except Exception as e:
             logger.error(f"Error tracking voice usage: {str(e)}")
     
-    def text_to_speech_elevenlabs(self, text: str, voice_id: str = None) -> str:
+    def text_to_speech_elevenlabs(self, text: str, voice_id: str = None, deadline: Deadline = None) -> str:
         """Convert text to speech using ElevenLabs (alternative)"""
         try:
             if not self.elevenlabs_api_key:
@@ -435,6 +680,15 @@ class VoiceService:
             logger.info("Starting text to speech conversion with ElevenLabs")
             
             default_voice_id = "21m00Tcm4TlvDq8ikWAM"
+            model_id = "eleven_monolingual_v1"
+            
+            cache_key = None
+            if TTSCache.is_cacheable(text):
+                cache_key = TTSCache.make_key('elevenlabs', voice_id or default_voice_id, model_id, text)
+                audio = TTSCache.get(cache_key)
+                if audio is not None:
+                    return base64.b64encode(audio).decode('utf-8')
+            
             url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id or default_voice_id}"
             
             headers = {
@@ -445,16 +699,19 @@ class VoiceService:
             
             data = {
                 "text": text,
-                "model_id": "eleven_monolingual_v1",
+                "model_id": model_id,
                 "voice_settings": {
                     "stability": 0.5,
                     "similarity_boost": 0.5
                 }
             }
             
-            response = requests.post(url, json=data, headers=headers)
+            deadline = deadline or Deadline(settings.AI_REQUEST_BUDGET_SECONDS)
+            response = requests.post(url, json=data, headers=headers, timeout=deadline.timeout())
             
             if response.status_code == 200:
+                if cache_key:
+                    TTSCache.set(cache_key, response.content, 'elevenlabs', voice_id or default_voice_id, model_id)
                 audio_base64 = base64.b64encode(response.content).decode('utf-8')
                 logger.info("Successfully converted text to speech with ElevenLabs")
                 return audio_base64
@@ -513,7 +770,7 @@ class DocumentIntelligenceService:
     """Service for intelligent document processing"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_llm_client()
     
     def extract_document_info(self, document_path: str) -> Dict[str, Any]:
         """Extract information from uploaded documents using OpenAI Vision"""
@@ -548,46 +805,121 @@ class DocumentIntelligenceService:
 class AIAnalyticsService:
     """Service for AI-powered analytics"""
     
+    SENTIMENTS = ('positive', 'neutral', 'negative', 'mixed')
+    
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_llm_client()
+        self.model = settings.AI_ANALYSIS_MODEL
     
     def analyze_conversation(self, conversation: Conversation) -> Dict[str, Any]:
-        """Analyze conversation for insights"""
+        """Analyze conversation for insights and store the result on it"""
         try:
-            messages = Message.objects.filter(conversation=conversation).order_by('created_at')
+            transcript, content_hash, message_count = self.build_transcript(conversation.id)
             
-            if not messages.exists():
+            if not message_count:
                 return {"error": "No messages to analyze"}
             
-            conversation_text = ""
-            for msg in messages:
-                role = "User" if msg.sender == "user" else "Assistant"
-                conversation_text += f"{role}: {msg.content}\n"
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI that analyzes conversations and provides insights about user intent, sentiment, and key topics."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Analyze this conversation and provide:\n1. Main intent\n2. Sentiment\n3. Key topics\n4. Summary\n\nConversation:\n{conversation_text}"
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
-            
-            analysis = response.choices[0].message.content
+            analysis = self.analyze_transcript(transcript)
+            self.store_analysis(conversation.id, analysis, content_hash)
             
             return {
                 "conversation_id": str(conversation.id),
                 "analysis": analysis,
-                "message_count": messages.count()
+                "message_count": message_count
             }
             
         except Exception as e:
             logger.error(f"Error analyzing conversation: {str(e)}")
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+    
+    @staticmethod
+    def build_transcript(conversation_id) -> Tuple[str, str, int]:
+        """Return ``(transcript, content_hash, message_count)`` in one pass over the messages
+        
+        The hash covers every message; the transcript keeps only the most
+        recent messages that fit AI_ANALYSIS_MAX_TRANSCRIPT_TOKENS.
+        """
+        digest = hashlib.sha256()
+        lines = deque()
+        line_tokens = deque()
+        total_tokens = 0
+        message_count = 0
+        
+        messages = Message.objects.filter(conversation_id=conversation_id).order_by('created_at').values_list(
+            'id', 'sender', 'content', 'token_count'
+        )
+        for message_id, sender, content, token_count in messages.iterator(chunk_size=500):
+            message_count += 1
+            digest.update(f"{message_id}\x1f{sender}\x1f{content}\x1e".encode('utf-8'))
+            
+            role = "User" if sender == "user" else "Assistant"
+            lines.append(f"{role}: {content}")
+            tokens = (token_count if token_count is not None else count_tokens(content)) + 2
+            line_tokens.append(tokens)
+            total_tokens += tokens
+            while total_tokens > settings.AI_ANALYSIS_MAX_TRANSCRIPT_TOKENS and len(lines) > 1:
+                lines.popleft()
+                total_tokens -= line_tokens.popleft()
+        
+        return "\n".join(lines), digest.hexdigest(), message_count
+    
+    def analyze_transcript(self, transcript: str) -> Dict[str, Any]:
+        """Ask the model for structured intent, sentiment, topics and summary"""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You are an AI that analyzes conversations and provides insights about user intent, sentiment, and key topics. "
+                        "Reply with a JSON object with the keys intent (short phrase), sentiment (positive, neutral, negative or mixed), "
+                        "topics (list of short strings) and summary (one or two sentences)."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": f"Analyze this conversation:\n\n{transcript}"
+                }
+            ],
+            temperature=0.3,
+            max_tokens=500,
+            response_format={"type": "json_object"}
+        )
+        
+        analysis = self.parse_analysis(response.choices[0].message.content)
+        try:
+            analysis['tokens_used'] = response.usage.total_tokens
+        except Exception:
+            pass
+        return analysis
+    
+    @classmethod
+    def parse_analysis(cls, content: str) -> Dict[str, Any]:
+        """Normalize the model's reply, keeping free text as the summary if it is not JSON"""
+        content = content or ''
+        try:
+            data = json.loads(content[content.index('{'):content.rindex('}') + 1])
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        
+        topics = data.get('topics') or []
+        if isinstance(topics, str):
+            topics = [topic.strip() for topic in topics.split(',')]
+        sentiment = str(data.get('sentiment') or '').strip().lower()
+        
+        return {
+            "intent": str(data.get('intent') or 'unknown')[:200],
+            "sentiment": sentiment if sentiment in cls.SENTIMENTS else 'unknown',
+            "topics": [str(topic)[:100] for topic in topics if topic][:10],
+            "summary": str(data.get('summary') or ('' if data else content))[:2000],
+        }
+    
+    @staticmethod
+    def store_analysis(conversation_id, analysis: Dict[str, Any], content_hash: str) -> None:
+        Conversation.objects.filter(id=conversation_id).update(
+            analysis=analysis,
+            analysis_hash=content_hash,
+            analyzed_at=timezone.now()
+        )
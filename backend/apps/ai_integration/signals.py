@@ -0,0 +1,88 @@
+"""
+Signals for ai_integration app
+"""
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from apps.ai_integration.models import Prompt, Knowledge, Conversation, Message, ModelRoutingConfig
+from apps.ai_integration.response_cache import ResponseCacheService
+from apps.ai_integration.prompt_registry import PromptRegistry
+from apps.ai_integration.context_builder import count_tokens
+from apps.ai_integration.history_buffer import ConversationHistoryBuffer
+from apps.ai_integration.model_router import ModelRouter
+from apps.ai_integration.knowledge_services import KnowledgeIngestionService
+
+
+@receiver([post_save, post_delete], sender=Prompt)
+def invalidate_prompt_caches(sender, instance, **kwargs):
+    """Recompile the prompt registry and drop cached AI responses when prompts change
+
+    Deferred until commit so no worker recompiles, or caches a response, from
+    the rows as they were before the change became visible.
+    """
+    transaction.on_commit(PromptRegistry.invalidate)
+    transaction.on_commit(ResponseCacheService.invalidate_prompts)
+
+
+@receiver([post_save, post_delete], sender=Knowledge)
+def invalidate_knowledge_caches(sender, instance, **kwargs):
+    """Drop cached AI responses when the knowledge base changes"""
+    ResponseCacheService.invalidate_knowledge()
+    KnowledgeIngestionService.invalidate_passage_count()
+
+
+@receiver(post_save, sender=Knowledge)
+def ingest_knowledge_passages(sender, instance, **kwargs):
+    """Re-chunk the entry into passages after it is created or its text changes"""
+    KnowledgeIngestionService.ingest_on_commit(instance.id)
+
+
+@receiver([post_save, post_delete], sender=ModelRoutingConfig)
+def invalidate_model_routing_config(sender, instance, **kwargs):
+    """Pick up a tenant's routing changes on its next turn"""
+    ModelRouter.invalidate(instance.group_id)
+
+
+@receiver(pre_save, sender=Message)
+def set_message_token_count(sender, instance, **kwargs):
+    """Count tokens once, when the message is written"""
+    if instance.token_count is None:
+        instance.token_count = count_tokens(instance.content)
+
+
+@receiver(post_save, sender=Message)
+def update_conversation_summary(sender, instance, created, **kwargs):
+    """Maintain the conversation's denormalized summary columns in one UPDATE"""
+    if created:
+        Conversation.objects.filter(id=instance.conversation_id).update(
+            message_count=F('message_count') + 1,
+            last_message_at=instance.created_at,
+            last_message_preview=Conversation.make_preview(instance.content),
+            last_sender=instance.sender
+        )
+
+
+@receiver(post_delete, sender=Message)
+def refresh_conversation_summary(sender, instance, origin=None, **kwargs):
+    """Recompute the summary columns once a message is gone; counters only ever grow otherwise"""
+    # Deleting the conversation cascades to its messages; nothing is left to summarize
+    if isinstance(origin, Conversation):
+        return
+    Conversation.refresh_summary(instance.conversation_id)
+
+
+@receiver(post_save, sender=Message)
+def append_message_to_history_buffer(sender, instance, created, **kwargs):
+    """Write new messages through to the conversation's history buffer"""
+    if created:
+        ConversationHistoryBuffer.append(instance)
+
+
+@receiver(post_delete, sender=Message)
+@receiver(post_delete, sender=Conversation)
+def invalidate_history_buffer(sender, instance, **kwargs):
+    """Drop the history buffer when messages or the conversation are deleted"""
+    conversation_id = instance.id if sender is Conversation else instance.conversation_id
+    ConversationHistoryBuffer.invalidate(conversation_id)
@@ -0,0 +1,237 @@
+"""
+AI tool registry for Omnifin Platform
+
+Tools the model can call are registered with their JSON-schema metadata.
+All tool calls from one assistant turn are executed concurrently in a
+bounded thread pool.
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Any
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('omnifin')
+
+JSON_SCHEMA_TYPES = {
+    'number': (int, float),
+    'integer': (int,),
+    'string': (str,),
+    'boolean': (bool,),
+    'object': (dict,),
+    'array': (list,),
+}
+
+
+class Tool:
+    """A callable tool with its JSON-schema description"""
+
+    def __init__(self, name: str, description: str, parameters: Dict[str, Any], handler: Callable):
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.handler = handler
+
+    def schema(self) -> Dict[str, Any]:
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters
+            }
+        }
+
+    def validate(self, arguments: Dict[str, Any]) -> Optional[str]:
+        """Return an error message if arguments do not match the schema"""
+        if not isinstance(arguments, dict):
+            return "Arguments must be a JSON object"
+
+        missing = [name for name in self.parameters.get('required', []) if name not in arguments]
+        if missing:
+            return f"Missing required arguments: {', '.join(missing)}"
+
+        for name, value in arguments.items():
+            expected = self.parameters.get('properties', {}).get(name, {}).get('type')
+            python_types = JSON_SCHEMA_TYPES.get(expected)
+            if python_types and (not isinstance(value, python_types) or (isinstance(value, bool) and expected != 'boolean')):
+                return f"Argument '{name}' must be of type {expected}"
+
+        return None
+
+
+class ToolRegistry:
+    """Registry of AI tools and their concurrent executor"""
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def register(self, name: str, description: str, parameters: Dict[str, Any]):
+        """Decorator registering ``handler(arguments, user)`` as a tool"""
+        def decorator(handler):
+            self._tools[name] = Tool(name, description, parameters, handler)
+            return handler
+        return decorator
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        return [tool.schema() for tool in self._tools.values()]
+
+    def execute(self, name: str, arguments: Dict[str, Any], user) -> Dict[str, Any]:
+        """Validate arguments and run a single tool"""
+        tool = self.get(name)
+        if not tool:
+            return {"error": f"Unknown function: {name}"}
+
+        error = tool.validate(arguments)
+        if error:
+            return {"error": error}
+
+        try:
+            return tool.handler(arguments, user)
+        except Exception as e:
+            logger.error(f"Error executing tool {name}: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    def execute_tool_calls(self, tool_calls, user) -> List[Dict[str, Any]]:
+        """Run every tool call of an assistant turn and return tool messages in call order"""
+        def run(tool_call):
+            try:
+                arguments = json.loads(tool_call.function.arguments or '{}')
+            except ValueError:
+                return {"error": "Arguments are not valid JSON"}
+            logger.info(f"AI requested function call: {tool_call.function.name} with args: {arguments}")
+            return self.execute(tool_call.function.name, arguments, user)
+
+        if len(tool_calls) == 1:
+            results = [run(tool_calls[0])]
+        else:
+            futures = [self._get_executor().submit(self._in_worker, run, tool_call) for tool_call in tool_calls]
+            results = [future.result() for future in futures]
+
+        return [
+            {
+                "tool_call_id": tool_call.id,
+                "role": "tool",
+                "name": tool_call.function.name,
+                "content": json.dumps(result)
+            }
+            for tool_call, result in zip(tool_calls, results)
+        ]
+
+    @staticmethod
+    def _in_worker(function, *args):
+        """Run in a pool thread, releasing that thread's DB connections afterwards"""
+        try:
+            return function(*args)
+        finally:
+            connections.close_all()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.AI_TOOL_MAX_WORKERS,
+                    thread_name_prefix='ai-tool'
+                )
+            return self._executor
+
+
+tool_registry = ToolRegistry()
+
+
+@tool_registry.register(
+    name="submit_loan_application",
+    description="Submit a loan application for the user. Use this when you have collected all required information from the user.",
+    parameters={
+        "type": "object",
+        "properties": {
+            "loan_amount": {
+                "type": "number",
+                "description": "The loan amount requested by the user"
+            },
+            "loan_purpose": {
+                "type": "string",
+                "description": "The purpose/reason for the loan"
+            },
+            "loan_term": {
+                "type": "integer",
+                "description": "The loan term in months"
+            },
+            "interest_rate": {
+                "type": "number",
+                "description": "The desired interest rate percentage"
+            }
+        },
+        "required": ["loan_amount", "loan_purpose", "loan_term", "interest_rate"]
+    }
+)
+def submit_loan_application(application_data: Dict[str, Any], user) -> Dict[str, Any]:
+    """Submit a loan application"""
+    try:
+        from apps.loans.models import Application
+        from apps.authentication.activity_utils import log_activity
+
+        # Check if user has applicant profile
+        if not hasattr(user, 'applicant_profile'):
+            return {
+                "success": False,
+                "error": "User must have an applicant profile to apply for loans. Please create your profile first."
+            }
+
+        applicant = user.applicant_profile
+
+        # Get TPB if user was referred
+        tpb = None
+        if hasattr(applicant, 'referred_by') and applicant.referred_by:
+            tpb = applicant.referred_by
+
+        # Create the application
+        application = Application.objects.create(
+            applicant=applicant,
+            tpb=tpb,
+            loan_amount=application_data['loan_amount'],
+            loan_purpose=application_data['loan_purpose'],
+            loan_term=application_data['loan_term'],
+            interest_rate=application_data['interest_rate']
+        )
+
+        # Log activity
+        log_activity(
+            user=user,
+            activity_type='loan_application',
+            description=f"Applied for {application_data['loan_purpose']} loan of ${application_data['loan_amount']} via AI Chat",
+            metadata={
+                'application_id': str(application.id),
+                'application_number': application.application_number,
+                'loan_amount': str(application_data['loan_amount']),
+                'loan_purpose': application_data['loan_purpose'],
+                'loan_term': application_data['loan_term'],
+                'interest_rate': str(application_data['interest_rate']),
+                'source': 'ai_chat'
+            }
+        )
+
+        return {
+            "success": True,
+            "application_id": str(application.id),
+            "application_number": application.application_number,
+            "status": application.status,
+            "message": f"Loan application {application.application_number} submitted successfully! The application has been completed. If you'd like to apply for another loan, please let me know."
+        }
+
+    except Exception as e:
+        logger.error(f"Error submitting loan application: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return {
+            "success": False,
+            "error": str(e)
+        }
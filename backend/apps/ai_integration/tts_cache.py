@@ -0,0 +1,198 @@
+"""
+Content-addressed TTS audio cache for Omnifin Platform
+
+Synthesized MP3s are keyed by a hash of (provider, voice, model,
+normalized text) and stored as files under ``AI_TTS_CACHE_DIR``. Entry
+metadata, the running size and hit/miss counters live in the cache
+backend; once the directory outgrows ``AI_TTS_CACHE_MAX_BYTES`` the least
+recently used files are evicted.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from typing import Dict, Optional, Any
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger('omnifin')
+
+
+class TTSCache:
+    """Size-bounded on-disk LRU of synthesized speech"""
+
+    KEY_PREFIX = 'ai_tts_cache'
+    # Evict down to this fraction of the limit so eviction does not run on every write
+    LOW_WATERMARK = 0.9
+
+    _eviction_lock = threading.Lock()
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return settings.AI_TTS_CACHE_ENABLED
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text or '')).strip()
+
+    @classmethod
+    def make_key(cls, provider: str, voice_id: str, model: str, text: str) -> str:
+        material = '\x1f'.join([provider or '', voice_id or '', model or '', cls.normalize_text(text)])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def is_cacheable(cls, text: str) -> bool:
+        return cls.enabled() and 0 < len(cls.normalize_text(text)) <= settings.AI_TTS_CACHE_MAX_TEXT_CHARS
+
+    @classmethod
+    def contains(cls, key: str) -> bool:
+        return cls.enabled() and cache.get(cls._entry_key(key)) is not None
+
+    @classmethod
+    def get(cls, key: str) -> Optional[bytes]:
+        """Cached audio for ``key``, refreshing its recency, or None"""
+        if not cls.enabled():
+            return None
+
+        meta = cache.get(cls._entry_key(key))
+        if meta is not None:
+            try:
+                with open(cls._path(key), 'rb') as audio_file:
+                    audio = audio_file.read()
+                meta['last_access'] = timezone.now().timestamp()
+                cache.set(cls._entry_key(key), meta, settings.AI_TTS_CACHE_METADATA_TTL)
+                cls._incr('hits')
+                return audio
+            except FileNotFoundError:
+                # Evicted by another worker; forget the stale metadata
+                cache.delete(cls._entry_key(key))
+            except Exception as e:
+                logger.warning(f"Could not read TTS cache entry {key}: {str(e)}")
+
+        cls._incr('misses')
+        return None
+
+    @classmethod
+    def set(cls, key: str, audio: bytes, provider: str, voice_id: str, model: str) -> None:
+        """Store audio for ``key`` and evict old entries if the cache is over its size"""
+        if not cls.enabled() or not audio:
+            return
+
+        try:
+            path = cls._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existed = os.path.exists(path)
+
+            # Write to a temp file and rename so readers never see partial audio
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(audio)
+            os.replace(temp_path, path)
+
+            cache.set(cls._entry_key(key), {
+                'size': len(audio),
+                'provider': provider,
+                'voice_id': voice_id,
+                'model': model,
+                'last_access': timezone.now().timestamp(),
+            }, settings.AI_TTS_CACHE_METADATA_TTL)
+
+            if not existed:
+                total = cls._incr('bytes', len(audio))
+                if total > settings.AI_TTS_CACHE_MAX_BYTES:
+                    cls.evict()
+        except Exception as e:
+            logger.warning(f"Could not store TTS cache entry {key}: {str(e)}")
+
+    @classmethod
+    def evict(cls) -> int:
+        """Delete least recently used files until under the low watermark; returns files removed"""
+        with cls._eviction_lock:
+            entries = cls._scan()
+            total = sum(entry['size'] for entry in entries)
+            target = settings.AI_TTS_CACHE_MAX_BYTES * cls.LOW_WATERMARK
+            removed = 0
+
+            for entry in sorted(entries, key=lambda item: item['last_access']):
+                if total <= target:
+                    break
+                try:
+                    os.remove(entry['path'])
+                except FileNotFoundError:
+                    pass
+                cache.delete(cls._entry_key(entry['key']))
+                total -= entry['size']
+                removed += 1
+
+            # Re-base the running size on what is actually on disk
+            cache.set(cls._stat_key('bytes'), total, None)
+            if removed:
+                logger.info(f"Evicted {removed} TTS cache entries; {total} bytes remain")
+            return removed
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        hits = cache.get(cls._stat_key('hits'), 0)
+        misses = cache.get(cls._stat_key('misses'), 0)
+        lookups = hits + misses
+        return {
+            'enabled': cls.enabled(),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'bytes': cache.get(cls._stat_key('bytes'), 0),
+            'max_bytes': settings.AI_TTS_CACHE_MAX_BYTES,
+        }
+
+    @classmethod
+    def _scan(cls):
+        """Every cached file with its size and last access (metadata first, mtime as fallback)"""
+        entries = []
+        root = str(settings.AI_TTS_CACHE_DIR)
+        if not os.path.isdir(root):
+            return entries
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if not filename.endswith('.mp3'):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append({'key': filename[:-4], 'path': path, 'size': stat.st_size, 'last_access': stat.st_mtime})
+
+        metadata = cache.get_many([cls._entry_key(entry['key']) for entry in entries])
+        for entry in entries:
+            meta = metadata.get(cls._entry_key(entry['key']))
+            if meta:
+                entry['last_access'] = meta['last_access']
+        return entries
+
+    @classmethod
+    def _incr(cls, name: str, delta: int = 1) -> int:
+        key = cls._stat_key(name)
+        # add() is a no-op when the counter exists, so incr() never misses
+        cache.add(key, 0, None)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, None)
+            return delta
+
+    @staticmethod
+    def _path(key: str) -> str:
+        return os.path.join(str(settings.AI_TTS_CACHE_DIR), key[:2], f"{key}.mp3")
+
+    @classmethod
+    def _entry_key(cls, key: str) -> str:
+        return f"{cls.KEY_PREFIX}:entry:{key}"
+
+    @classmethod
+    def _stat_key(cls, name: str) -> str:
+        return f"{cls.KEY_PREFIX}:stats:{name}"
@@ -0,0 +1,91 @@
+"""
+Chat turn unit of work for Omnifin Platform
+
+A turn's writes (user message, AI message, token usage and the
+conversation's summary counters) are buffered while the model runs and
+flushed in one short transaction afterwards. The bulk insert skips per-row
+Message signals, so their effects (token counts, summary columns, history
+buffer) are applied here directly; it also means easyaudit records no
+CRUD event for chat messages, which are already their own record.
+Usage is billed in a savepoint of its own, so a tracking failure is logged
+and never takes the turn's messages with it.
+"""
+
+import logging
+from typing import List, Tuple
+from django.db import transaction
+from django.db.models import F
+from apps.ai_integration.models import Conversation, Message
+from apps.ai_integration.admission import LLMAdmissionController
+from apps.ai_integration.context_builder import count_tokens
+from apps.ai_integration.history_buffer import ConversationHistoryBuffer
+
+logger = logging.getLogger('omnifin')
+
+
+class ChatTurnUnitOfWork:
+    """Buffers one chat turn's writes and commits them together"""
+
+    def __init__(self, conversation: Conversation, metadata: dict = None):
+        self.conversation = conversation
+        self.metadata = metadata or {'conversation_type': 'chat'}
+        self.messages: List[Message] = []
+        self.usage: List[Tuple[str, int]] = []
+        self.committed = False
+
+    def add_message(self, sender: str, content: str) -> Message:
+        message = Message(
+            conversation=self.conversation,
+            sender=sender,
+            content=content,
+            token_count=count_tokens(content)
+        )
+        self.messages.append(message)
+        return message
+
+    def add_usage(self, tokens: int, usage_type: str = 'llm') -> None:
+        if tokens:
+            self.usage.append((usage_type, tokens))
+
+    def commit(self) -> None:
+        """Write everything buffered in one transaction; later calls are no-ops"""
+        if self.committed:
+            return
+
+        from apps.subscriptions.usage_services import UsageTrackingService
+
+        user = self.conversation.user
+        subscription_id = None
+        if self.usage and user.group_id:
+            subscription_id = UsageTrackingService.get_active_subscription_id(user.group_id)
+
+        with transaction.atomic():
+            if self.messages:
+                Message.objects.bulk_create(self.messages)
+                last = self.messages[-1]
+                Conversation.objects.filter(id=self.conversation.id).update(
+                    message_count=F('message_count') + len(self.messages),
+                    last_message_at=last.created_at,
+                    last_message_preview=Conversation.make_preview(last.content),
+                    last_sender=last.sender
+                )
+                messages = list(self.messages)
+                transaction.on_commit(lambda: [ConversationHistoryBuffer.append(message) for message in messages])
+
+            usage_recorded = False
+            if subscription_id:
+                try:
+                    with transaction.atomic():
+                        UsageTrackingService.record_usage_batch(
+                            subscription_id, user.group_id, self.usage,
+                            user_id=str(user.id),
+                            metadata=self.metadata
+                        )
+                    usage_recorded = True
+                except Exception as e:
+                    logger.error(f"Error tracking usage for conversation {self.conversation.id}: {str(e)}")
+
+        self.committed = True
+        if usage_recorded:
+            for usage_type, tokens in self.usage:
+                LLMAdmissionController.record_usage(user, tokens, usage_type)
@@ -6,9 +6,9 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from apps.ai_integration.views import (
     PromptViewSet, KnowledgeViewSet, ConversationViewSet,
-    chat_message, voice_message, get_active_prompts, get_knowledge,
+    chat_message, voice_message, voice_audio, get_active_prompts, get_knowledge,
     create_conversation, get_conversation_history, ai_dashboard,
-    get_user_conversations, get_conversation_messages, delete_conversation
+    get_user_conversations, get_conversation_messages, get_conversation_timeline, delete_conversation
 )
 
 app_name = 'ai_integration'
@@ -22,10 +22,12 @@ urlpatterns = [
     # Chat endpoints
     path('chat/', chat_message, name='chat_message'),
     path('voice/', voice_message, name='voice_message'),
+    path('voice/audio/<str:token>/', voice_audio, name='voice_audio'),
     
     # Conversation history endpoints
     path('conversations/list/', get_user_conversations, name='user_conversations'),
     path('conversations/<uuid:conversation_id>/messages/', get_conversation_messages, name='conversation_messages'),
+    path('conversations/<uuid:conversation_id>/timeline/', get_conversation_timeline, name='conversation_timeline'),
     path('conversations/<uuid:conversation_id>/delete/', delete_conversation, name='delete_conversation'),
     path('conversations/history/<str:session_id>/', get_conversation_history, name='conversation_history'),
     path('conversations/create/', create_conversation, name='create_conversation'),
@@ -0,0 +1,101 @@
+"""
+AI usage rollup services for Omnifin Platform
+"""
+
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Any
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from apps.ai_integration.models import Conversation, Message
+
+logger = logging.getLogger('omnifin')
+
+
+class AIUsageRollupService:
+    """Conversation/message/voice/text counts in one conditional aggregate per table"""
+    
+    CACHE_PREFIX = 'ai_usage_rollup'
+    
+    @staticmethod
+    def get_usage(user=None, group_id=None, start_date: Optional[datetime] = None,
+                  end_date: Optional[datetime] = None) -> Dict[str, Any]:
+        """Get AI usage counts scoped to a user or tenant group and a date range
+        
+        Args:
+            user: Only count this user's conversations
+            group_id: Only count conversations of users in this group
+            start_date: Inclusive lower bound on started_at / created_at
+            end_date: Inclusive upper bound on started_at / created_at
+        """
+        # Truncate to the minute so dashboards polled within a minute share a cache entry;
+        # the upper bound becomes the start of the next minute, exclusive, so the
+        # end_date's own minute is still counted
+        start_date = start_date.replace(second=0, microsecond=0) if start_date else None
+        end_before = end_date.replace(second=0, microsecond=0) + timedelta(minutes=1) if end_date else None
+        
+        cache_key = AIUsageRollupService._cache_key(user, group_id, start_date, end_before)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        conversation_filter = Q()
+        message_filter = Q()
+        if user is not None:
+            conversation_filter &= Q(user=user)
+            message_filter &= Q(conversation__user=user)
+        if group_id is not None:
+            conversation_filter &= Q(user__group_id=group_id)
+            message_filter &= Q(conversation__user__group_id=group_id)
+        if start_date:
+            conversation_filter &= Q(started_at__gte=start_date)
+            message_filter &= Q(created_at__gte=start_date)
+        if end_before:
+            conversation_filter &= Q(started_at__lt=end_before)
+            message_filter &= Q(created_at__lt=end_before)
+        
+        conversations = Conversation.objects.filter(conversation_filter).aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(status='active')),
+            completed=Count('id', filter=Q(status='completed')),
+            voice=Count('id', filter=Q(is_voice_chat=True)),
+            text=Count('id', filter=Q(is_voice_chat=False)),
+        )
+        
+        messages = Message.objects.filter(message_filter).aggregate(
+            total=Count('id'),
+            user=Count('id', filter=Q(sender='user')),
+            ai=Count('id', filter=Q(sender='ai')),
+        )
+        
+        usage = {
+            'conversations': {
+                'total': conversations['total'],
+                'active': conversations['active'],
+                'completed': conversations['completed']
+            },
+            'messages': {
+                'total': messages['total'],
+                'user': messages['user'],
+                'ai': messages['ai']
+            },
+            'chat_types': {
+                'voice': conversations['voice'],
+                'text': conversations['text']
+            }
+        }
+        
+        cache.set(cache_key, usage, settings.AI_USAGE_ROLLUP_CACHE_TTL)
+        return usage
+    
+    @staticmethod
+    def _cache_key(user, group_id, start_date, end_before) -> str:
+        scope = '|'.join([
+            str(user.id) if user is not None else '',
+            str(group_id or ''),
+            start_date.isoformat() if start_date else '',
+            end_before.isoformat() if end_before else '',
+        ])
+        return f"{AIUsageRollupService.CACHE_PREFIX}:{hashlib.md5(scope.encode('utf-8')).hexdigest()}"
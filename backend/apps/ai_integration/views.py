@@ -4,27 +4,65 @@ AI Integration views for Omnifin Platform
 
 from rest_framework import status, generics, permissions, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
 from django.db.models import Count
-from apps.ai_integration.models import Prompt, Knowledge, Conversation, Message
+from apps.ai_integration.models import Prompt, Knowledge, Conversation, Message, ArchivedConversation
 from django.db import transaction
 from apps.ai_integration.serializers import (
     PromptSerializer, PromptCreateSerializer, KnowledgeSerializer, KnowledgeCreateSerializer,
-    ConversationSerializer, ConversationCreateSerializer, MessageSerializer,
+    ConversationSerializer, ConversationListSerializer, ConversationCreateSerializer, MessageSerializer,
     ChatMessageSerializer, VoiceUploadSerializer
 )
+from apps.ai_integration.pagination import MessageTimelinePagination
+from apps.ai_integration.archive_services import ConversationArchiveReader
+from apps.ai_integration.prompt_registry import PromptRegistry
+from apps.ai_integration.admission import AdmissionRejected
+from apps.ai_integration.deadlines import Deadline, DeadlineExceeded
 from apps.ai_integration.services import AIChatService, VoiceService
+from apps.ai_integration.model_router import ModelRouter
+from apps.ai_integration.tts_cache import TTSCache
+from apps.ai_integration.usage_services import AIUsageRollupService
+from apps.authentication.models import Organization, User
 from apps.authentication.permissions import IsSystemAdmin
+from urllib.parse import quote
+import json
 import traceback
+import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _admission_rejected_response(error):
+    """429 telling the client when to retry a turn that was not admitted"""
+    logger.warning(f"AI request not admitted ({error.reason}); retry after {error.retry_after}s")
+    return Response(
+        {'error': error.reason, 'message': error.message, 'retry_after': error.retry_after},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+
+def _get_include_messages(request, default=0):
+    """Parse the opt-in ``include_messages=N`` query parameter"""
+    try:
+        include_messages = int(request.query_params.get('include_messages', default))
+    except (TypeError, ValueError):
+        include_messages = default
+    return max(0, min(include_messages, MessageTimelinePagination.max_page_size))
+
+
 class PromptViewSet(viewsets.ModelViewSet):
     """Prompt management ViewSet"""
     permission_classes = [IsSystemAdmin]
@@ -86,18 +124,27 @@ class ConversationViewSet(viewsets.ModelViewSet):
     """Conversation management ViewSet"""
     permission_classes = [permissions.IsAuthenticated]
     queryset = Conversation.objects.all()
+    UPDATABLE_FIELDS = ['application', 'status', 'ended_at', 'is_voice_chat']
     
     def get_queryset(self):
         user = self.request.user    
         if user.is_system_admin or user.is_tpb_manager or user.is_tpb_staff:
-            return Conversation.objects.all()
+            return Conversation.objects.order_by('-started_at')
         else:
-            return Conversation.objects.filter(user=user)
+            return Conversation.objects.filter(user=user).order_by('-started_at')
     
     def get_serializer_class(self):
         if self.action == 'create' or self.action == 'create_conversation':
             return ConversationCreateSerializer
-        return ConversationSerializer
+        # Messages are only embedded on request; use the timeline API for full history
+        if self.request.query_params.get('include_messages'):
+            return ConversationSerializer
+        return ConversationListSerializer
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_messages'] = _get_include_messages(self.request)
+        return context
     
     @action(detail=False, methods=['post'], url_path='create')
     def create_conversation(self, request):
@@ -105,33 +152,20 @@ class ConversationViewSet(viewsets.ModelViewSet):
         serializer = ConversationCreateSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         conversation = serializer.save()
-        return Response(ConversationSerializer(conversation).data, status=status.HTTP_201_CREATED)
-
-
-def _get_or_create_conversation(session_id, user, is_voice_chat=False):
-    """Safely get an existing conversation for (user, session_id) or create one.
-
-    Uses a conservative lookup and transaction to avoid MultipleObjectsReturned when
-    duplicate rows exist. Returns (conversation, created_bool).
-    """
-    # Prefer explicit user-scoped lookup to avoid matching multiple users with same session_id
-    conv = Conversation.objects.filter(session_id=session_id, user=user).order_by('-started_at').first()
-    if conv:
-        return conv, False
-
-    # No conversation exists yet for this user+session_id. Create one atomically.
-    with transaction.atomic():
-        # Re-check under transaction to avoid race creating duplicates
-        conv = Conversation.objects.select_for_update().filter(session_id=session_id, user=user).order_by('-started_at').first()
-        if conv:
-            return conv, False
-
-        conv = Conversation.objects.create(
-            user=user,
-            session_id=session_id,
-            is_voice_chat=is_voice_chat
-        )
-        return conv, True
+        return Response(ConversationListSerializer(conversation).data, status=status.HTTP_201_CREATED)
+    
+    def perform_update(self, serializer):
+        """Write only the columns a client may change
+        
+        A full save would overwrite the message counters, which turns keep
+        advancing, with the stale values loaded by this request.
+        """
+        conversation = serializer.instance
+        fields = [field for field in self.UPDATABLE_FIELDS if field in serializer.validated_data]
+        for field in fields:
+            setattr(conversation, field, serializer.validated_data[field])
+        if fields:
+            conversation.save(update_fields=fields)
     
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
@@ -147,10 +181,19 @@ def _get_or_create_conversation(session_id, user, is_voice_chat=False):
         conversation = self.get_object()
         conversation.status = 'completed'
         conversation.ended_at = timezone.now()
-        conversation.save()
+        conversation.save(update_fields=['status', 'ended_at'])
         return Response({'message': 'Conversation ended successfully'})
 
 
+def _get_or_create_conversation(session_id, user, is_voice_chat=False):
+    """Get the conversation for (user, session_id), creating it on first use.
+
+    (user, session_id) is unique, so concurrent first turns resolve to the
+    same row. Returns (conversation, created_bool).
+    """
+    return Conversation.resolve_session(user, session_id, is_voice_chat=is_voice_chat)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def chat_message(request):
@@ -176,6 +219,9 @@ def chat_message(request):
             'session_id': session_id,
             'conversation_id': conversation.id
         })
+    
+    except AdmissionRejected as e:
+        return _admission_rejected_response(e)
         
     except Exception as e:
         logger.error(f"Chat message error: {str(e)}\n{traceback.format_exc()}")
@@ -200,19 +246,75 @@ def voice_message(request):
         audio_file = serializer.validated_data['audio_file']
         context = serializer.validated_data.get('context', {})
         
+        # Transcription, reply and speech share one budget
+        deadline = Deadline(settings.AI_VOICE_REQUEST_BUDGET_SECONDS)
+        
         # Convert speech to text
         voice_service = VoiceService()
-        text = voice_service.speech_to_text(audio_file)
+        text = voice_service.speech_to_text(audio_file, deadline=deadline)
         
         # Get or create conversation (defensive to avoid duplicate rows)
         conversation, created = _get_or_create_conversation(session_id, request.user, is_voice_chat=True)
         
-        # Process message with AI
         ai_service = AIChatService()
-        response = ai_service.process_message(conversation, text, context)
+        transport = serializer.validated_data['transport']
+        
+        if transport == 'pipelined':
+            # Overlap generation and synthesis; the reply text is saved to the
+            # conversation as usual but is not known when headers are sent
+            audio_stream = voice_service.stream_pipelined_speech(
+                ai_service.stream_message(conversation, text, context, deadline=deadline),
+                deadline=deadline
+            )
+            streaming_response = StreamingHttpResponse(audio_stream, content_type='audio/mpeg')
+            streaming_response['Cache-Control'] = 'no-store'
+            streaming_response['X-Session-Id'] = session_id
+            streaming_response['X-Conversation-Id'] = str(conversation.id)
+            _set_text_header(streaming_response, 'X-Transcript', text)
+            return streaming_response
+        
+        # Process message with AI
+        response = ai_service.process_message(conversation, text, context, deadline=deadline)
+        
+        
+        if transport == 'stream':
+            # Audio goes out as it is synthesized; the text rides in headers.
+            # Out of time, the reply (already saved) goes back as text only.
+            try:
+                audio_stream = voice_service.stream_speech(response, deadline=deadline)
+            except DeadlineExceeded:
+                logger.warning(f"Voice reply for conversation {conversation.id} sent without audio: budget exhausted")
+                return _text_only_voice_response(text, response, session_id, conversation)
+            streaming_response = StreamingHttpResponse(audio_stream, content_type='audio/mpeg')
+            streaming_response['Cache-Control'] = 'no-store'
+            streaming_response['X-Session-Id'] = session_id
+            streaming_response['X-Conversation-Id'] = str(conversation.id)
+            _set_text_header(streaming_response, 'X-Transcript', text)
+            _set_text_header(streaming_response, 'X-Response-Text', response)
+            return streaming_response
+        
+        if transport == 'url' and deadline.expired:
+            # The link would be synthesized later, but the client has stopped waiting for audio
+            logger.warning(f"Voice reply for conversation {conversation.id} sent without audio: budget exhausted")
+            return _text_only_voice_response(text, response, session_id, conversation)
+        
+        if transport == 'url':
+            token = voice_service.create_audio_url_token(response, user=request.user)
+            return Response({
+                'text': text,
+                'response': response,
+                'audio_url': request.build_absolute_uri(reverse('ai_integration:voice_audio', args=[token])),
+                'audio_url_expires_in': settings.AI_VOICE_AUDIO_URL_TTL,
+                'session_id': session_id,
+                'conversation_id': conversation.id
+            })
         
-        # Convert response to speech
-        audio_response = voice_service.text_to_speech(response)
+        # Convert response to speech; out of time, the reply goes back as text only
+        try:
+            audio_response = voice_service.text_to_speech(response, deadline=deadline)
+        except DeadlineExceeded:
+            logger.warning(f"Voice reply for conversation {conversation.id} sent without audio: budget exhausted")
+            return _text_only_voice_response(text, response, session_id, conversation)
         
         return Response({
             'text': text,
@@ -221,6 +323,19 @@ def voice_message(request):
             'session_id': session_id,
             'conversation_id': conversation.id
         })
+    
+    except AdmissionRejected as e:
+        return _admission_rejected_response(e)
+    
+    except DeadlineExceeded as e:
+        logger.warning(f"Voice message timed out: {str(e)}")
+        return Response(
+            {
+                'error': 'Request timed out',
+                'message': 'Your voice message took too long to process. Please try again.'
+            },
+            status=status.HTTP_504_GATEWAY_TIMEOUT
+        )
         
     except Exception as e:
         logger.error(f"Voice message error: {str(e)}\n{traceback.format_exc()}")
@@ -233,6 +348,106 @@ def voice_message(request):
         )
 
 
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def voice_audio(request, token):
+    """Stream the synthesized audio behind a short-lived, single-use voice reply URL"""
+    # The unguessable token is the credential, so audio elements can load it directly
+    audio_request = VoiceService.claim_audio_url_request(token)
+    if not audio_request:
+        return Response({'error': 'Audio link has expired'}, status=status.HTTP_404_NOT_FOUND)
+    
+    # Synthesis is billed to the user the reply was for
+    owner = User.objects.filter(id=audio_request['user_id']).first() if audio_request.get('user_id') else None
+    
+    try:
+        voice_service = VoiceService()
+        audio_stream = voice_service.stream_speech(audio_request['text'], audio_request.get('voice_id'), user=owner)
+    except Exception as e:
+        logger.error(f"Voice audio error: {str(e)}")
+        return Response(
+            {'error': 'Failed to generate speech. Please try again.'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    streaming_response = StreamingHttpResponse(audio_stream, content_type='audio/mpeg')
+    # The link cannot be fetched again, so let the browser keep what it got
+    streaming_response['Cache-Control'] = f'private, max-age={settings.AI_VOICE_AUDIO_URL_TTL}'
+    return streaming_response
+
+
+def _parse_date_param(request, name: str, end_of_day: bool = False):
+    """An aware datetime from an ISO 8601 timestamp or date query parameter, or None when absent
+
+    A date alone means the start of that day, or its end with ``end_of_day``.
+    """
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        # Dates first: on Python 3.11 parse_datetime also reads a bare date, as midnight
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day, time.max if end_of_day else time.min)
+        else:
+            parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Must be an ISO 8601 date or timestamp.'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_group_id_param(request):
+    """The ``group_id`` query parameter of an existing organization, or None when absent"""
+    value = request.query_params.get('group_id')
+    if not value:
+        return None
+    try:
+        group_id = uuid.UUID(value)
+    except ValueError:
+        raise ValidationError({'group_id': 'Must be a group ID.'})
+    if not Organization.objects.filter(group_id=group_id).exists():
+        raise ValidationError({'group_id': 'Unknown group.'})
+    return group_id
+
+
+def _text_only_voice_response(text: str, response: str, session_id: str, conversation: Conversation) -> Response:
+    """The degraded voice reply: transcript and reply text, no audio"""
+    return Response({
+        'text': text,
+        'response': response,
+        'audio_response': None,
+        'session_id': session_id,
+        'conversation_id': conversation.id
+    })
+
+
+def _set_text_header(response, name: str, text: str) -> None:
+    """Percent-encode text into a header, truncated to AI_VOICE_TEXT_HEADER_MAX_BYTES
+
+    Proxies reject oversized response headers, so a long reply is cut short
+    and flagged with ``<name>-Truncated``; the full text is saved to the
+    conversation.
+    """
+    limit = settings.AI_VOICE_TEXT_HEADER_MAX_BYTES
+    encoded = quote(text or '')
+    if len(encoded) > limit:
+        # Cut on a character boundary so the value still decodes
+        pieces, size = [], 0
+        for char in text:
+            piece = quote(char)
+            if size + len(piece) > limit:
+                break
+            pieces.append(piece)
+            size += len(piece)
+        encoded = ''.join(pieces)
+        response[f'{name}-Truncated'] = '1'
+    response[name] = encoded
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_active_prompts(request):
@@ -240,9 +455,8 @@ def get_active_prompts(request):
     try:
         category = request.query_params.get('category')
         
-        prompts = Prompt.objects.filter(is_active=True)
-        if category:
-            prompts = prompts.filter(category=category)
+        # Served from the registry's compiled prompts instead of a query per call
+        prompts = [compiled.prompt for compiled in PromptRegistry.get_prompts(category)]
         
         serializer = PromptSerializer(prompts, many=True)
         return Response(serializer.data)
@@ -292,7 +506,7 @@ def create_conversation(request):
         
         conversation = serializer.save()
         return Response(
-            ConversationSerializer(conversation).data,
+            ConversationListSerializer(conversation).data,
             status=status.HTTP_201_CREATED
         )
     
@@ -316,7 +530,9 @@ def get_conversation_history(request, session_id):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        serializer = ConversationSerializer(conversation)
+        serializer = ConversationSerializer(conversation, context={
+            'include_messages': _get_include_messages(request, ConversationSerializer.DEFAULT_INCLUDE_MESSAGES)
+        })
         return Response(serializer.data)
     
     except Conversation.DoesNotExist:
@@ -363,7 +579,7 @@ def get_user_conversations(request):
         
         # Exclude empty conversations by default
         if exclude_empty:
-            conversations = conversations.annotate(msg_count=Count('messages')).filter(msg_count__gt=0)
+            conversations = conversations.filter(message_count__gt=0)
         
         # Order by most recent first
         conversations = conversations.order_by('-started_at')
@@ -374,12 +590,9 @@ def get_user_conversations(request):
         # Apply pagination
         conversations = conversations[offset:offset + limit]
         
-        # Serialize with message count
+        # Summary columns are maintained on each message insert, so no per-row queries
         conversations_data = []
         for conv in conversations:
-            message_count = conv.messages.count()
-            last_message = conv.messages.order_by('-created_at').first()
-            
             conversations_data.append({
                 'id': str(conv.id),
                 'session_id': conv.session_id,
@@ -387,12 +600,12 @@ def get_user_conversations(request):
                 'is_voice_chat': conv.is_voice_chat,
                 'started_at': conv.started_at,
                 'ended_at': conv.ended_at,
-                'message_count': message_count,
+                'message_count': conv.message_count,
                 'last_message': {
-                    'content': last_message.content[:100] + '...' if last_message and len(last_message.content) > 100 else last_message.content if last_message else None,
-                    'created_at': last_message.created_at if last_message else None,
-                    'sender': last_message.sender if last_message else None
-                } if last_message else None,
+                    'content': conv.last_message_preview,
+                    'created_at': conv.last_message_at,
+                    'sender': conv.last_sender
+                } if conv.last_message_at else None,
                 'application_id': str(conv.application_id) if conv.application_id else None,
                 'metadata': conv.metadata
             })
@@ -412,35 +625,95 @@ def get_user_conversations(request):
         )
 
 
+def _get_visible_conversation(user, conversation_id):
+    """Fetch a conversation the user may read, or raise Http404"""
+    if user.is_system_admin or user.is_tpb_manager or user.is_tpb_staff:
+        return get_object_or_404(Conversation, id=conversation_id)
+    return get_object_or_404(Conversation, id=conversation_id, user=user)
+
+
+def _get_visible_archived_conversation(user, conversation_id):
+    """Archive index entry for a conversation the user may read, or None"""
+    archived = ArchivedConversation.objects.filter(id=conversation_id)
+    if not (user.is_system_admin or user.is_tpb_manager or user.is_tpb_staff):
+        archived = archived.filter(user=user)
+    return archived.first()
+
+
+def _stream_archived_messages(archived):
+    """JSON body of get_conversation_messages, streamed from the archive segment"""
+    records = ConversationArchiveReader.iter_records(archived)
+    # Read the first record now so a missing segment fails before headers are sent
+    conversation = next(records)
+    
+    def body():
+        header = {
+            'conversation': {
+                'id': conversation['id'],
+                'user': conversation['user_id'],
+                'application': conversation['application_id'],
+                **{field: conversation[field] for field in (
+                    'session_id', 'is_voice_chat', 'status', 'started_at', 'ended_at',
+                    'metadata', 'message_count', 'last_message_at'
+                )}
+            },
+            'archived': True,
+            'has_more': False,
+        }
+        yield json.dumps(header, cls=DjangoJSONEncoder)[:-1] + ', "messages": ['
+        try:
+            for position, message in enumerate(records):
+                yield (', ' if position else '') + json.dumps({
+                    'id': message['id'],
+                    'conversation': message['conversation_id'],
+                    **{field: message[field] for field in (
+                        'sender', 'message_type', 'content', 'audio_url', 'audio_duration', 'created_at'
+                    )}
+                }, cls=DjangoJSONEncoder)
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated body
+            logger.error(f"Archived conversation {archived.id} stream failed: {str(e)}")
+            return
+        yield ']}'
+    
+    return StreamingHttpResponse(body(), content_type='application/json')
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_conversation_messages(request, conversation_id):
-    """Get all messages for a specific conversation"""
+    """Get a page of messages for a specific conversation (latest first page, oldest-first order)
+    
+    Archived conversations are streamed whole from cold storage.
+    """
     try:
-        user = request.user
-        
         # Get conversation and verify ownership
-        if user.is_system_admin or user.is_tpb_manager or user.is_tpb_staff:
-            conversation = get_object_or_404(Conversation, id=conversation_id)
-        else:
-            conversation = get_object_or_404(Conversation, id=conversation_id, user=user)
+        try:
+            conversation = _get_visible_conversation(request.user, conversation_id)
+        except Http404:
+            archived = _get_visible_archived_conversation(request.user, conversation_id)
+            if archived is None:
+                raise
+            return _stream_archived_messages(archived)
         
-        # Get all messages ordered by creation time
-        messages = conversation.messages.order_by('created_at')
-        
-        serializer = MessageSerializer(messages, many=True)
+        paginator = MessageTimelinePagination()
+        page = paginator.paginate_queryset(Message.objects.filter(conversation=conversation), request)
         
         return Response({
-            'conversation': ConversationSerializer(conversation).data,
-            'messages': serializer.data
+            'conversation': ConversationListSerializer(conversation).data,
+            'messages': MessageSerializer(page, many=True).data,
+            **paginator.get_pagination_data()
         })
     
-    except Conversation.DoesNotExist:
+    except (Conversation.DoesNotExist, Http404):
         return Response(
             {'error': 'Conversation not found'},
             status=status.HTTP_404_NOT_FOUND
         )
     
+    except ValidationError as e:
+        return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+    
     except Exception as e:
         logger.error(f"Get conversation messages error: {str(e)}\n{traceback.format_exc()}")
         return Response(
@@ -449,6 +722,17 @@ def get_conversation_messages(request, conversation_id):
         )
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_conversation_timeline(request, conversation_id):
+    """Cursor-paginated message timeline (?before=/?after= created_at, ?before_id=/?after_id=, ?limit=)"""
+    conversation = _get_visible_conversation(request.user, conversation_id)
+    
+    paginator = MessageTimelinePagination()
+    page = paginator.paginate_queryset(Message.objects.filter(conversation=conversation), request)
+    return paginator.get_paginated_response(MessageSerializer(page, many=True).data)
+
+
 @api_view(['DELETE'])
 @permission_classes([permissions.IsAuthenticated])
 def delete_conversation(request, conversation_id):
@@ -457,20 +741,24 @@ def delete_conversation(request, conversation_id):
         user = request.user
         
         # Get conversation and verify ownership
-        if user.is_system_admin or user.is_tpb_manager or user.is_tpb_staff:
-            conversation = get_object_or_404(Conversation, id=conversation_id)
+        try:
+            conversation = _get_visible_conversation(user, conversation_id)
+        except Http404:
+            # Dropping the index entry makes an archived conversation unreachable
+            archived = _get_visible_archived_conversation(user, conversation_id)
+            if archived is None:
+                raise
+            archived.delete()
         else:
-            conversation = get_object_or_404(Conversation, id=conversation_id, user=user)
-        
-        # Delete conversation (messages will cascade delete)
-        conversation.delete()
+            # Delete conversation (messages will cascade delete)
+            conversation.delete()
         
         return Response(
             {'message': 'Conversation deleted successfully'},
             status=status.HTTP_200_OK
         )
     
-    except Conversation.DoesNotExist:
+    except (Conversation.DoesNotExist, Http404):
         return Response(
             {'error': 'Conversation not found'},
             status=status.HTTP_404_NOT_FOUND
@@ -491,50 +779,41 @@ def ai_dashboard(request):
     try:
         user = request.user
         
-        # Filter conversations based on user role
+        # Optional date range: ?days=N or ?start_date=/&end_date= (ISO 8601 dates or timestamps)
+        end_date = _parse_date_param(request, 'end_date', end_of_day=True)
+        start_date = _parse_date_param(request, 'start_date')
+        if request.query_params.get('days'):
+            try:
+                days = int(request.query_params['days'])
+            except ValueError:
+                days = -1
+            if days < 0:
+                raise ValidationError({'days': 'Must be a non-negative integer.'})
+            end_date = end_date or timezone.now()
+            start_date = end_date - timedelta(days=days)
+        if start_date and end_date and start_date > end_date:
+            raise ValidationError({'start_date': 'Must not be after end_date.'})
+        
+        # Filter conversations based on user role: admins may pick a group, TPB users see their own
         if user.is_system_admin:
-            conversations = Conversation.objects.all()
-            messages = Message.objects.all()
-        elif user.is_tpb_manager or user.is_tpb_staff:
-            conversations = Conversation.objects.all()
-            messages = Message.objects.all()
+            data = AIUsageRollupService.get_usage(
+                group_id=_parse_group_id_param(request),
+                start_date=start_date,
+                end_date=end_date
+            )
+        elif (user.is_tpb_manager or user.is_tpb_staff) and user.group_id:
+            data = AIUsageRollupService.get_usage(group_id=user.group_id, start_date=start_date, end_date=end_date)
         else:
-            conversations = Conversation.objects.filter(user=user)
-            messages = Message.objects.filter(conversation__user=user)
-        
-        # Get conversation statistics
-        total_conversations = conversations.count()
-        active_conversations = conversations.filter(status='active').count()
-        completed_conversations = conversations.filter(status='completed').count()
-        
-        # Get message statistics
-        total_messages = messages.count()
-        user_messages = messages.filter(sender='user').count()
-        ai_messages = messages.filter(sender='ai').count()
-        
-        # Get voice vs text statistics
-        voice_conversations = conversations.filter(is_voice_chat=True).count()
-        text_conversations = conversations.filter(is_voice_chat=False).count()
-        
-        data = {
-            'conversations': {
-                'total': total_conversations,
-                'active': active_conversations,
-                'completed': completed_conversations
-            },
-            'messages': {
-                'total': total_messages,
-                'user': user_messages,
-                'ai': ai_messages
-            },
-            'chat_types': {
-                'voice': voice_conversations,
-                'text': text_conversations
-            }
-        }
+            data = AIUsageRollupService.get_usage(user=user, start_date=start_date, end_date=end_date)
+        
+        if user.is_system_admin:
+            data = dict(data, tts_cache=TTSCache.stats(), model_routing=ModelRouter.stats())
         
         return Response(data)
     
+    except ValidationError as e:
+        return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+    
     except Exception as e:
         logger.error(f"AI dashboard error: {str(e)}")
         return Response(
@@ -0,0 +1,100 @@
+"""
+Sentence-pipelined speech synthesis for Omnifin Platform
+
+LLM text deltas are split into sentences as they arrive; each sentence is
+synthesized in a shared thread pool while generation continues, and the
+audio segments are yielded strictly in sentence order.
+"""
+
+import logging
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List
+from django.conf import settings
+
+logger = logging.getLogger('omnifin')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class SentenceSplitter:
+    """Incrementally split streamed text into sentences"""
+
+    # Terminal punctuation (plus closing quotes/brackets) followed by whitespace,
+    # so decimals like "3.5" and the still-growing last sentence are not split
+    BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+
+    def __init__(self, min_length: int = None):
+        self.min_length = settings.AI_VOICE_MIN_SENTENCE_CHARS if min_length is None else min_length
+        self.buffer = ''
+
+    def feed(self, text: str) -> List[str]:
+        """Add text and return the sentences it completed"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in self.BOUNDARY.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            # Very short fragments ride along with the next sentence
+            if len(candidate) >= self.min_length:
+                sentences.append(candidate)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Return whatever text remains"""
+        remainder = self.buffer.strip()
+        self.buffer = ''
+        return [remainder] if remainder else []
+
+
+def pipeline_speech(text_chunks: Iterable[str], synthesize: Callable[[str], bytes],
+                    on_sentence: Callable[[str], None] = None) -> Iterator[bytes]:
+    """Synthesize sentences concurrently as text streams in, yielding audio in order"""
+    splitter = SentenceSplitter()
+    pending = deque()
+
+    def submit(sentence):
+        if on_sentence:
+            on_sentence(sentence)
+        pending.append(_get_executor().submit(synthesize, sentence))
+
+    def result(future):
+        try:
+            return future.result()
+        except Exception as e:
+            # Drop the segment rather than the whole reply
+            logger.error(f"Sentence synthesis failed: {str(e)}")
+            return b''
+
+    try:
+        for text in text_chunks:
+            for sentence in splitter.feed(text):
+                submit(sentence)
+            # Emit finished leading segments without waiting for the rest
+            while pending and pending[0].done():
+                yield result(pending.popleft())
+
+        for sentence in splitter.flush():
+            submit(sentence)
+        while pending:
+            yield result(pending.popleft())
+    finally:
+        # The client went away; do not synthesize audio nobody will hear
+        for future in pending:
+            future.cancel()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.AI_VOICE_TTS_MAX_WORKERS,
+                thread_name_prefix='ai-tts'
+            )
+        return _executor
@@ -151,30 +151,19 @@ class AnalyticsService:
     
     def _get_ai_metrics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """Get AI interaction metrics"""
-        from apps.ai_integration.models import Conversation, Message
+        from apps.ai_integration.usage_services import AIUsageRollupService
         
-        total_conversations = Conversation.objects.count()
-        active_conversations = Conversation.objects.filter(status='active').count()
-        completed_conversations = Conversation.objects.filter(status='completed').count()
-        
-        # Messages
-        total_messages = Message.objects.count()
-        user_messages = Message.objects.filter(sender='user').count()
-        ai_messages = Message.objects.filter(sender='ai').count()
-        
-        # Voice vs Text
-        voice_conversations = Conversation.objects.filter(is_voice_chat=True).count()
-        text_conversations = Conversation.objects.filter(is_voice_chat=False).count()
+        usage = AIUsageRollupService.get_usage(start_date=start_date, end_date=end_date)
         
         return {
-            'total_conversations': total_conversations,
-            'active_conversations': active_conversations,
-            'completed_conversations': completed_conversations,
-            'total_messages': total_messages,
-            'user_messages': user_messages,
-            'ai_messages': ai_messages,
-            'voice_conversations': voice_conversations,
-            'text_conversations': text_conversations
+            'total_conversations': usage['conversations']['total'],
+            'active_conversations': usage['conversations']['active'],
+            'completed_conversations': usage['conversations']['completed'],
+            'total_messages': usage['messages']['total'],
+            'user_messages': usage['messages']['user'],
+            'ai_messages': usage['messages']['ai'],
+            'voice_conversations': usage['chat_types']['voice'],
+            'text_conversations': usage['chat_types']['text']
         }
     
     def get_application_funnel(self, days: int = 30) -> Dict[str, Any]:
@@ -0,0 +1,153 @@
+"""
+Content-addressed document storage for Omnifin Platform
+
+File contents are stored once per SHA-256 as a DocumentBlob, and every
+Document with those contents references it, across applications and
+reapplications. A blob's reference count is the number of Document rows
+pointing at it; the last Document to go takes the blob with it, and
+``gc_document_blobs`` reclaims anything left behind (blobs orphaned by
+cascading deletes and files from uploads that never committed).
+"""
+
+import io
+import logging
+import uuid
+from datetime import timedelta
+from typing import Dict, Iterable, Tuple
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from apps.documents.models import Document, DocumentBlob
+from apps.documents.streaming import DocumentCipher, DocumentIngestStream
+
+logger = logging.getLogger('omnifin')
+
+
+class DocumentBlobStore:
+    """Writes, shares and reclaims blobs keyed by the SHA-256 of their plaintext"""
+
+    PREFIX = 'documents/blobs'
+    DERIVATIVE_PREFIX = 'documents/derivatives'
+
+    def write(self, chunks: Iterable[bytes], max_size: int = None) -> Tuple[str, DocumentIngestStream]:
+        """Stream contents to a fresh blob file; returns its path and the stream (hash, size)"""
+        name = uuid.uuid4().hex
+        path = f"{self.PREFIX}/{name[:2]}/{name}"
+        stream = DocumentIngestStream(chunks, cipher=DocumentCipher.from_settings(), max_size=max_size)
+        try:
+            saved_path = default_storage.save(path, File(io.BufferedReader(stream), name=path))
+        except Exception:
+            self.discard(path)
+            raise
+        return saved_path, stream
+
+    def acquire(self, saved_path: str, stream: DocumentIngestStream) -> Tuple[DocumentBlob, bool]:
+        """Lock the blob for the stream's hash, registering the written file if it is new
+
+        Must run inside the transaction that creates the referencing
+        Document, so a concurrent release cannot remove the blob in between.
+        Returns ``(blob, created)``; when not created the written file is a
+        duplicate and the caller should discard it.
+        """
+        return DocumentBlob.objects.select_for_update().get_or_create(
+            sha256=stream.hexdigest(),
+            defaults={
+                'storage_path': saved_path,
+                'size': stream.size,
+                'is_encrypted': stream.encrypted,
+            }
+        )
+
+    def release(self, document: Document) -> None:
+        """Delete a document, and its blob if no other document references it"""
+        with transaction.atomic():
+            blob = DocumentBlob.objects.select_for_update().filter(pk=document.blob_id).first()
+            document.delete()
+            if blob is not None and not blob.documents.exists():
+                self._delete_blob(blob)
+
+    def collect_garbage(self, grace_seconds: int = None, dry_run: bool = False) -> Dict[str, int]:
+        """Remove unreferenced blobs and blob files without a row, older than the grace period"""
+        grace_seconds = settings.DOCUMENT_BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+        stats = {'blobs': 0, 'files': 0}
+
+        orphaned = (
+            DocumentBlob.objects.filter(created_at__lt=cutoff)
+            .annotate(references=Count('documents'))
+            .filter(references=0)
+            .values_list('sha256', flat=True)
+        )
+        for sha256 in list(orphaned):
+            with transaction.atomic():
+                blob = DocumentBlob.objects.select_for_update().filter(pk=sha256).first()
+                # Re-check under the lock: an upload may have just shared it
+                if blob is None or blob.documents.exists():
+                    continue
+                if not dry_run:
+                    self._delete_blob(blob)
+            stats['blobs'] += 1
+
+        for paths in self._iter_directories():
+            known = set(DocumentBlob.objects.filter(storage_path__in=paths).values_list('storage_path', flat=True))
+            for path in paths:
+                if path in known:
+                    continue
+                try:
+                    # Recent files may belong to an upload still committing
+                    if default_storage.get_modified_time(path) >= cutoff:
+                        continue
+                except (NotImplementedError, OSError):
+                    continue
+                if not dry_run:
+                    self.discard(path)
+                stats['files'] += 1
+
+        logger.info(f"Document blob GC removed {stats['blobs']} blobs and {stats['files']} stray files")
+        return stats
+
+    @staticmethod
+    def discard(path: str) -> None:
+        try:
+            if default_storage.exists(path):
+                default_storage.delete(path)
+        except Exception as e:
+            logger.warning(f"Could not remove document blob file {path}: {str(e)}")
+
+    def derivative_path(self, file_hash: str, kind: str) -> str:
+        """Where a thumbnail or preview of the contents with ``file_hash`` is cached"""
+        return f"{self.DERIVATIVE_PREFIX}/{file_hash[:2]}/{file_hash}/{kind}.webp"
+
+    def discard_derivatives(self, file_hash: str) -> None:
+        directory = f"{self.DERIVATIVE_PREFIX}/{file_hash[:2]}/{file_hash}"
+        try:
+            _, files = default_storage.listdir(directory)
+        except (FileNotFoundError, NotImplementedError):
+            return
+        for name in files:
+            self.discard(f"{directory}/{name}")
+
+    def _delete_blob(self, blob: DocumentBlob) -> None:
+        path = blob.storage_path
+        file_hash = blob.sha256
+        blob.delete()
+
+        # The row goes first; the files only once that is durable
+        def remove_files():
+            self.discard(path)
+            self.discard_derivatives(file_hash)
+        transaction.on_commit(remove_files)
+
+    def _iter_directories(self):
+        """Yield the file paths of each blob directory in turn"""
+        try:
+            directories, _ = default_storage.listdir(self.PREFIX)
+        except (FileNotFoundError, NotImplementedError):
+            return
+        for directory in directories:
+            _, files = default_storage.listdir(f"{self.PREFIX}/{directory}")
+            if files:
+                yield [f"{self.PREFIX}/{directory}/{name}" for name in files]
@@ -0,0 +1,211 @@
+"""
+Document thumbnails and review previews for Omnifin Platform
+
+Derivatives are WebP renditions cached next to the original blob, keyed by
+the contents' SHA-256 so every document sharing a blob shares them too.
+They are rendered with Pillow in a process pool, in the background after an
+upload and lazily when requested. Requests for a derivative that is still
+being rendered wait on the job already running: in-process through a shared
+future, and across processes through a cache lease.
+"""
+
+import logging
+import multiprocessing
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from apps.documents.blob_store import DocumentBlobStore
+from apps.documents.imaging import render_derivatives
+from apps.documents.models import Document
+from apps.documents.services import DocumentService
+from apps.documents.streaming import DocumentCipher, is_encrypted_header
+
+logger = logging.getLogger('omnifin')
+
+DERIVATIVE_MIME_TYPES = ('image/jpeg', 'image/jpg', 'image/png', 'image/webp', 'image/gif')
+LEASE_POLL_SECONDS = 0.25
+
+_process_pool = None
+_thread_pool = None
+_pool_lock = threading.Lock()
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.RLock()
+
+
+class DerivativeUnavailable(Exception):
+    """The document cannot have this derivative (unsupported type or unreadable image)"""
+
+
+class DocumentDerivativeService:
+    """Renders, caches and reads thumbnails and previews of image documents"""
+
+    KEY_PREFIX = 'document_derivatives'
+
+    def __init__(self):
+        self.blob_store = DocumentBlobStore()
+        self.sizes = settings.DOCUMENT_DERIVATIVE_SIZES
+
+    def supports(self, document: Document) -> bool:
+        return document.mime_type in DERIVATIVE_MIME_TYPES
+
+    def schedule(self, document: Document) -> Optional[Future]:
+        """Start rendering in the background unless the derivatives already exist"""
+        if not self.supports(document) or self._all_stored(document.file_hash):
+            return None
+        return self._start(document)
+
+    def get(self, document: Document, kind: str, wait: float = None) -> Optional[bytes]:
+        """The derivative's bytes, rendering it if missing; None if it is not ready within ``wait`` seconds"""
+        if kind not in self.sizes or not self.supports(document):
+            raise DerivativeUnavailable(f"No {kind} derivative for {document.mime_type} documents")
+        failure = cache.get(self._failure_key(document.file_hash))
+        if failure:
+            raise DerivativeUnavailable(failure)
+
+        content = self._read(document.file_hash, kind)
+        if content is not None:
+            return content
+
+        future = self._start(document)
+        try:
+            future.result(timeout=settings.DOCUMENT_DERIVATIVE_WAIT_SECONDS if wait is None else wait)
+        except FutureTimeoutError:
+            return None
+        except DerivativeUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Error rendering derivatives of document {document.id}: {str(e)}")
+            return None
+        return self._read(document.file_hash, kind)
+
+    def _start(self, document: Document) -> Future:
+        """The running job for these contents, or a new one; concurrent callers share it"""
+        file_hash = document.file_hash
+        with _inflight_lock:
+            future = _inflight.get(file_hash)
+            if future is None:
+                future = _get_thread_pool().submit(self._generate, document)
+                _inflight[file_hash] = future
+                future.add_done_callback(lambda _: _discard_inflight(file_hash, future))
+            return future
+
+    def _generate(self, document: Document) -> None:
+        file_hash = document.file_hash
+        timeout = settings.DOCUMENT_DERIVATIVE_TIMEOUT_SECONDS
+        lease_key = f"{self.KEY_PREFIX}:lease:{file_hash}"
+        give_up_at = time.monotonic() + timeout
+
+        # Another process holding the lease is already rendering these contents
+        while not cache.add(lease_key, True, timeout):
+            if self._all_stored(file_hash):
+                return
+            if time.monotonic() > give_up_at:
+                raise FutureTimeoutError(f"Derivatives of {file_hash} still rendering elsewhere")
+            time.sleep(LEASE_POLL_SECONDS)
+
+        try:
+            if self._all_stored(file_hash):
+                return
+            started = time.monotonic()
+            # The worker reads a plaintext copy spooled to disk a chunk at a time
+            with tempfile.NamedTemporaryFile(prefix='omnifin-derivative-') as original:
+                for chunk in DocumentService().open_document(document):
+                    original.write(chunk)
+                original.flush()
+                try:
+                    derivatives = _get_process_pool().submit(
+                        render_derivatives, original.name, dict(self.sizes), settings.DOCUMENT_DERIVATIVE_QUALITY
+                    ).result(timeout=timeout)
+                except BrokenProcessPool:
+                    _reset_process_pool()
+                    raise
+                except FutureTimeoutError:
+                    # Slow, not broken: don't cache a failure. Caught before OSError,
+                    # which the built-in TimeoutError it aliases on 3.11 subclasses
+                    raise
+                except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+                    # Pillow's errors for unreadable or oversized images; don't retry them for a while
+                    cache.set(self._failure_key(file_hash), f"Image could not be rendered: {str(e)}", timeout * 60)
+                    raise DerivativeUnavailable(str(e))
+
+            for kind, content in derivatives.items():
+                self._store(file_hash, kind, content)
+            logger.info(f"Rendered derivatives of document {document.id} in {(time.monotonic() - started) * 1000:.0f}ms")
+        finally:
+            cache.delete(lease_key)
+
+    def _store(self, file_hash: str, kind: str, content: bytes) -> None:
+        path = self.blob_store.derivative_path(file_hash, kind)
+        cipher = DocumentCipher.from_settings()
+        if cipher is not None:
+            content = b''.join(cipher.encrypt([content]))
+        # Replace rather than let storage pick an alternative name
+        self.blob_store.discard(path)
+        default_storage.save(path, ContentFile(content))
+
+    def _read(self, file_hash: str, kind: str) -> Optional[bytes]:
+        path = self.blob_store.derivative_path(file_hash, kind)
+        try:
+            with default_storage.open(path, 'rb') as stored:
+                content = stored.read()
+        except (FileNotFoundError, OSError):
+            return None
+        if is_encrypted_header(content):
+            cipher = DocumentCipher.from_settings()
+            if cipher is None:
+                return None
+            content = b''.join(cipher.decrypt([content]))
+        return content
+
+    def _all_stored(self, file_hash: str) -> bool:
+        return all(default_storage.exists(self.blob_store.derivative_path(file_hash, kind)) for kind in self.sizes)
+
+    def _failure_key(self, file_hash: str) -> str:
+        return f"{self.KEY_PREFIX}:failed:{file_hash}"
+
+
+def _discard_inflight(file_hash: str, future: Future) -> None:
+    with _inflight_lock:
+        if _inflight.get(file_hash) is future:
+            del _inflight[file_hash]
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            # spawn: forking a threaded server process is unsafe, and the
+            # rendering module needs nothing from Django
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.DOCUMENT_DERIVATIVE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _process_pool
+
+
+def _reset_process_pool() -> None:
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(
+                max_workers=settings.DOCUMENT_DERIVATIVE_WORKERS * 2,
+                thread_name_prefix='document-derivatives'
+            )
+        return _thread_pool
@@ -0,0 +1,110 @@
+"""
+Authorized document downloads for Omnifin Platform
+
+Django decides whether the user may see a document; the bytes are then
+sent by nginx through an ``X-Accel-Redirect`` to an internal location, which
+also takes care of Range and If-Range. Documents encrypted at rest cannot be
+handed over that way, so they (and every download when nginx is not in front,
+as in development) are streamed here, with single byte-range support:
+only the encrypted segments overlapping the range are read and decrypted.
+"""
+
+import re
+from typing import Iterator
+from urllib.parse import quote
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from apps.documents.models import Document
+from apps.documents.streaming import DocumentCipher
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class DocumentDownloadService:
+    """Builds the download response for a document the caller may already access"""
+
+    def response(self, request, document: Document, as_attachment: bool = True) -> HttpResponse:
+        etag = f'"{document.file_hash}"'
+        if request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified(headers={'ETag': etag})
+
+        encrypted = document.is_encrypted
+        if settings.DOCUMENT_DOWNLOAD_ACCEL_REDIRECT and not encrypted:
+            response = HttpResponse(content_type=document.mime_type)
+            response['X-Accel-Redirect'] = settings.DOCUMENT_DOWNLOAD_ACCEL_PREFIX + quote(document.storage_path)
+            response['X-Accel-Buffering'] = 'no'
+        else:
+            response = self._streamed(request, document, encrypted, etag)
+
+        # nginx keeps these on an X-Accel-Redirect and sets ETag/Last-Modified itself
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(document.file_name)}"
+        response['Cache-Control'] = f'private, max-age={settings.DOCUMENT_DOWNLOAD_MAX_AGE}'
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['X-Content-Type-Options'] = 'nosniff'
+        return response
+
+    def _streamed(self, request, document: Document, encrypted: bool, etag: str) -> HttpResponse:
+        size = document.file_size
+        byte_range = self._requested_range(request, etag, size)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        # Opened here so a missing file fails before the response starts
+        stored = default_storage.open(document.storage_path, 'rb')
+        response = StreamingHttpResponse(
+            self._iter_range(stored, document, encrypted, start, end),
+            status=206 if byte_range else 200,
+            content_type=document.mime_type
+        )
+        response['Content-Length'] = str(max(0, end - start + 1))
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response
+
+    @staticmethod
+    def _requested_range(request, etag: str, size: int):
+        """``(start, end)`` of a single satisfiable byte range, None for the whole file, or 'unsatisfiable'"""
+        header = request.headers.get('Range')
+        if not header:
+            return None
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range != etag:
+            return None
+        match = RANGE_PATTERN.match(header.strip())
+        if not match or not any(match.groups()):
+            # Multiple or malformed ranges: the whole file is a valid answer
+            return None
+
+        first, last = match.groups()
+        if not first:
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            return 'unsatisfiable'
+        return start, end
+
+    def _iter_range(self, stored, document: Document, encrypted: bool, start: int, end: int) -> Iterator[bytes]:
+        with stored:
+            if encrypted:
+                cipher = DocumentCipher.from_settings()
+                if cipher is None:
+                    raise ValueError("DOCUMENT_ENCRYPTION_KEY is required to read encrypted documents")
+                yield from cipher.decrypt_range(stored, document.file_size, start, end)
+                return
+            stored.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = stored.read(min(READ_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
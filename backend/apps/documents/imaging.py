@@ -0,0 +1,39 @@
+"""
+Image derivative rendering for Omnifin Platform
+
+Runs inside the derivative process pool, so it imports nothing from Django:
+it takes the path of a plaintext copy of the original and returns encoded
+derivatives. Pillow reads the file as it decodes, so the original is never
+held in memory whole.
+"""
+
+import io
+from typing import Dict, Tuple
+from PIL import Image, ImageOps
+
+
+def render_derivatives(path: str, sizes: Dict[str, int], quality: int) -> Dict[str, bytes]:
+    """Decode an image once and return a WebP per ``{kind: longest edge}``, never upscaled"""
+    with Image.open(path) as image:
+        largest = max(sizes.values())
+        # JPEG can decode at a reduced scale, which is much cheaper for big scans
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+
+        derivatives = {}
+        for kind, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+            resized = image.copy()
+            resized.thumbnail(_bounds(edge), Image.LANCZOS)
+            output = io.BytesIO()
+            resized.save(output, 'WEBP', quality=quality, method=4)
+            derivatives[kind] = output.getvalue()
+        return derivatives
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _bounds(edge: int) -> Tuple[int, int]:
+    return edge, edge
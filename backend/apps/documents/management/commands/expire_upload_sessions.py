@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from apps.documents.uploads import ResumableUploadService
+
+
+class Command(BaseCommand):
+    help = 'Delete resumable upload sessions past their expiry (DOCUMENT_UPLOAD_SESSION_TTL_SECONDS after their last chunk) and the part files of abandoned ones. Intended to run on a schedule.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count the sessions that would be removed')
+
+    def handle(self, *args, **options):
+        stats = ResumableUploadService().expire_sessions(dry_run=options['dry_run'])
+        verb = 'Would expire' if options['dry_run'] else 'Expired'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['sessions']} upload sessions holding {stats['bytes']} bytes."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from apps.documents.blob_store import DocumentBlobStore
+
+
+class Command(BaseCommand):
+    help = 'Reclaim document blobs no Document references any more, and blob files left behind by uploads that never committed. Only items older than --grace-seconds (default DOCUMENT_BLOB_GC_GRACE_SECONDS) are removed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-seconds', type=int, default=None, help='Leave blobs and files newer than this alone')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be removed')
+
+    def handle(self, *args, **options):
+        stats = DocumentBlobStore().collect_garbage(grace_seconds=options['grace_seconds'], dry_run=options['dry_run'])
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['blobs']} unreferenced blobs and {stats['files']} stray files."
+        ))
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('loans', '0003_add_group_id_to_application'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Document',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('document_type', models.CharField(choices=[('identification', 'Identification'), ('proof_of_income', 'Proof of Income'), ('bank_statement', 'Bank Statement'), ('tax_return', 'Tax Return'), ('proof_of_address', 'Proof of Address'), ('business_license', 'Business License'), ('other', 'Other')], max_length=50)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_size', models.IntegerField()),
+                ('file_hash', models.CharField(max_length=64)),
+                ('mime_type', models.CharField(max_length=100)),
+                ('storage_path', models.TextField()),
+                ('is_encrypted', models.BooleanField(default=True)),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                ('verified', models.BooleanField(default=False)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='loans.application')),
+                ('uploader', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('verified_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='verified_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'documents_document',
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentVerification',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('verified', 'Verified'), ('rejected', 'Rejected'), ('needs_review', 'Needs Review')], max_length=50)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verification_history', to='documents.document')),
+                ('verified_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'documents_documentverification',
+                'indexes': [models.Index(fields=['document'], name='documents_d_documen_78dbc2_idx'), models.Index(fields=['status'], name='documents_d_status_fa1519_idx'), models.Index(fields=['created_at'], name='documents_d_created_d674e1_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['application'], name='documents_d_applica_bd788a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['uploader'], name='documents_d_uploade_b207af_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['uploaded_at'], name='documents_d_uploade_65506e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['verified'], name='documents_d_verifie_132bda_idx'),
+        ),
+    ]
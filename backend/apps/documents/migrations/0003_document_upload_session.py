@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0003_add_group_id_to_application'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0002_document_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentUploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('document_type', models.CharField(choices=[('identification', 'Identification'), ('proof_of_income', 'Proof of Income'), ('bank_statement', 'Bank Statement'), ('tax_return', 'Tax Return'), ('proof_of_address', 'Proof of Address'), ('business_license', 'Business License'), ('other', 'Other')], max_length=50)),
+                ('file_name', models.CharField(max_length=255)),
+                ('mime_type', models.CharField(max_length=100)),
+                ('upload_length', models.BigIntegerField()),
+                ('upload_offset', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('completed', 'Completed')], default='open', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='loans.application')),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='documents.document')),
+                ('uploader', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'documents_documentuploadsession',
+                'indexes': [models.Index(fields=['uploader'], name='documents_d_uploade_8409c3_idx'), models.Index(fields=['expires_at'], name='documents_d_expires_c4caf0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_document_upload_session'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentuploadsession',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('finalizing', 'Finalizing'), ('completed', 'Completed')], default='open', max_length=20),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:20
+
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+
+def correct_legacy_is_encrypted(apps, schema_editor):
+    """Make is_encrypted true only for files that really are encrypted
+
+    Documents stored before encryption at rest said is_encrypted=True over
+    plaintext. Readers now trust the flag, so it is settled here once: a
+    file counts as encrypted only if its first segment authenticates under
+    the configured key, which a plaintext upload cannot forge.
+    """
+    from apps.documents.streaming import DocumentCipher
+
+    Document = apps.get_model('documents', 'Document')
+    cipher = DocumentCipher.from_settings()
+    legacy = Document.objects.filter(blob__isnull=True, is_encrypted=True)
+    if cipher is None:
+        # Without a key nothing can have been encrypted
+        legacy.update(is_encrypted=False)
+        return
+
+    plaintext_ids = []
+    for document in legacy.only('id', 'storage_path', 'file_size').iterator():
+        try:
+            with default_storage.open(document.storage_path, 'rb') as stored:
+                next(cipher.decrypt_range(stored, document.file_size, 0, 0), None)
+        except Exception:
+            plaintext_ids.append(document.id)
+    Document.objects.filter(id__in=plaintext_ids).update(is_encrypted=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_upload_session_finalizing'),
+    ]
+
+    operations = [
+        migrations.RunPython(correct_legacy_is_encrypted, migrations.RunPython.noop),
+    ]
@@ -9,6 +9,22 @@ from apps.authentication.models import User
 from apps.loans.models import Application
 
 
+class DocumentBlob(models.Model):
+    """Stored file contents, shared by every Document with the same SHA-256"""
+    
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    storage_path = models.TextField(unique=True)
+    size = models.BigIntegerField()
+    is_encrypted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'documents_documentblob'
+    
+    def __str__(self):
+        return f"{self.sha256} ({self.size} bytes)"
+
+
 class Document(models.Model):
     """Uploaded documents for loan applications"""
     
@@ -31,6 +47,7 @@ class Document(models.Model):
     file_hash = models.CharField(max_length=64)
     mime_type = models.CharField(max_length=100)
     storage_path = models.TextField()
+    blob = models.ForeignKey(DocumentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='documents', help_text="Shared contents; empty for documents stored before deduplication")
     is_encrypted = models.BooleanField(default=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     verified = models.BooleanField(default=False)
@@ -76,4 +93,37 @@ class DocumentVerification(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.document.file_name} - {self.status}"
\ No newline at end of file
+        return f"{self.document.file_name} - {self.status}"
+
+
+class DocumentUploadSession(models.Model):
+    """Resumable chunked upload, assembled on the server until finalized"""
+    
+    STATUS_CHOICES = [
+        ('open', _('Open')),
+        ('finalizing', _('Finalizing')),
+        ('completed', _('Completed')),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='upload_sessions')
+    uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_upload_sessions')
+    document_type = models.CharField(max_length=50, choices=Document.DOCUMENT_TYPE_CHOICES)
+    file_name = models.CharField(max_length=255)
+    mime_type = models.CharField(max_length=100)
+    upload_length = models.BigIntegerField()
+    upload_offset = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'documents_documentuploadsession'
+        indexes = [
+            models.Index(fields=['uploader']),
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.upload_offset}/{self.upload_length})"
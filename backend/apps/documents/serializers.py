@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from apps.documents.models import Document, DocumentVerification
+from apps.documents.models import Document, DocumentUploadSession, DocumentVerification
 
 class DocumentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,3 +10,10 @@ class DocumentVerificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = DocumentVerification
         fields = '__all__'
+
+class DocumentUploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentUploadSession
+        fields = ['id', 'application', 'document_type', 'file_name', 'mime_type', 'upload_length',
+                  'upload_offset', 'status', 'document', 'created_at', 'expires_at']
+        read_only_fields = fields
@@ -2,16 +2,15 @@
 Documents Services for Omnifin Platform
 """
 
-import os
-import uuid
-import hashlib
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
 from django.conf import settings
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from django.db import transaction
 from django.utils import timezone
-from apps.documents.models import Document, DocumentVerification
+from apps.documents.models import Document, DocumentBlob, DocumentVerification
+from apps.documents.blob_store import DocumentBlobStore
+from apps.documents.streaming import DocumentCipher
 from apps.authentication.models import User
 from apps.loans.models import Application
 
@@ -24,6 +23,7 @@ class DocumentService:
     def __init__(self):
         self.allowed_file_types = settings.ALLOWED_FILE_TYPES
         self.max_file_size = settings.MAX_UPLOAD_SIZE
+        self.blob_store = DocumentBlobStore()
     
     def upload_document(self, file, application: Application, uploader: User, document_type: str) -> Document:
         """Upload and store a document"""
@@ -31,67 +31,121 @@ class DocumentService:
             # Validate file
             self._validate_file(file)
             
-            # Generate file hash
-            file_hash = self._generate_file_hash(file)
-            
-            # Check for duplicate
-            existing_doc = Document.objects.filter(
-                application=application,
-                file_hash=file_hash
-            ).first()
-            
-            if existing_doc:
-                logger.info(f"Duplicate document detected for application {application.application_number}")
-                return existing_doc
-            
-            # Generate storage path
-            storage_path = self._generate_storage_path(application, file.name)
-            
-            # Save file
-            saved_path = default_storage.save(storage_path, ContentFile(file.read()))
-            
-            # Create document record
-            document = Document.objects.create(
-                application=application,
-                uploader=uploader,
-                document_type=document_type,
+            return self.store_document(
+                file.chunks(), application, uploader, document_type,
                 file_name=file.name,
-                file_size=file.size,
-                file_hash=file_hash,
-                mime_type=file.content_type or 'application/octet-stream',
-                storage_path=saved_path,
-                is_encrypted=True
+                mime_type=file.content_type
             )
             
-            logger.info(f"Uploaded document {document.file_name} for application {application.application_number}")
-            return document
-            
         except Exception as e:
             logger.error(f"Error uploading document: {str(e)}")
             raise
     
+    def store_document(self, chunks, application: Application, uploader: User, document_type: str,
+                       file_name: str, mime_type: str, file_hash: str = None) -> Document:
+        """Store already validated contents as a document
+        
+        When the caller already knows the SHA-256 of the contents and a blob
+        with that hash exists, nothing is written at all.
+        """
+        if file_hash:
+            with transaction.atomic():
+                existing_doc = self._find_duplicate(application, file_hash)
+                if existing_doc:
+                    return existing_doc
+                blob = DocumentBlob.objects.select_for_update().filter(pk=file_hash).first()
+                if blob is not None:
+                    return self._create_document(blob, application, uploader, document_type, file_name, mime_type)
+        
+        # Hash, encrypt and save in one chunked pass
+        saved_path, stream = self.blob_store.write(chunks, max_size=self.max_file_size)
+        
+        keep_file = False
+        try:
+            with transaction.atomic():
+                # Check for duplicate (the hash is only known once the file is written)
+                existing_doc = self._find_duplicate(application, stream.hexdigest())
+                if existing_doc:
+                    return existing_doc
+                
+                # Share the blob of any identical upload, from any application
+                blob, blob_created = self.blob_store.acquire(saved_path, stream)
+                document = self._create_document(blob, application, uploader, document_type, file_name, mime_type)
+            keep_file = blob_created
+        finally:
+            # The written file is kept only if it became a new blob that committed
+            if not keep_file:
+                self.blob_store.discard(saved_path)
+        
+        return document
+    
+    def _find_duplicate(self, application: Application, file_hash: str) -> Optional[Document]:
+        existing_doc = Document.objects.filter(
+            application=application,
+            file_hash=file_hash
+        ).first()
+        
+        if existing_doc:
+            logger.info(f"Duplicate document detected for application {application.application_number}")
+        return existing_doc
+    
+    def _create_document(self, blob: DocumentBlob, application: Application, uploader: User, document_type: str,
+                         file_name: str, mime_type: str) -> Document:
+        document = Document.objects.create(
+            application=application,
+            uploader=uploader,
+            document_type=document_type,
+            file_name=file_name,
+            file_size=blob.size,
+            file_hash=blob.sha256,
+            mime_type=mime_type or 'application/octet-stream',
+            storage_path=blob.storage_path,
+            blob=blob,
+            is_encrypted=blob.is_encrypted
+        )
+        
+        if settings.DOCUMENT_DERIVATIVES_ON_UPLOAD:
+            from apps.documents.derivatives import DocumentDerivativeService
+            transaction.on_commit(lambda: DocumentDerivativeService().schedule(document))
+        
+        logger.info(f"Uploaded document {document.file_name} for application {application.application_number}")
+        return document
+    
     def _validate_file(self, file):
         """Validate uploaded file"""
+        self.validate_upload(file.size, file.content_type)
+    
+    def validate_upload(self, size: int, content_type: str):
+        """Validate an upload's declared size and type"""
         # Check file size
-        if file.size > self.max_file_size:
+        if size > self.max_file_size:
             raise ValueError(f"File size exceeds maximum allowed size of {self.max_file_size} bytes")
         
         # Check file type
-        if file.content_type not in self.allowed_file_types:
-            raise ValueError(f"File type {file.content_type} is not allowed")
+        if content_type not in self.allowed_file_types:
+            raise ValueError(f"File type {content_type} is not allowed")
     
-    def _generate_file_hash(self, file) -> str:
-        """Generate SHA-256 hash of file content"""
-        hasher = hashlib.sha256()
-        for chunk in file.chunks():
-            hasher.update(chunk)
-        return hasher.hexdigest()
+    def open_document(self, document: Document) -> Iterator[bytes]:
+        """Stream a document's plaintext, decrypting it segment by segment if needed"""
+        # The row says whether the file is encrypted; the contents are the uploader's to choose
+        with default_storage.open(document.storage_path, 'rb') as stored:
+            if document.is_encrypted:
+                cipher = DocumentCipher.from_settings()
+                if cipher is None:
+                    raise ValueError("DOCUMENT_ENCRYPTION_KEY is required to read encrypted documents")
+                yield from cipher.decrypt(stored.chunks())
+            else:
+                yield from stored.chunks()
     
-    def _generate_storage_path(self, application: Application, filename: str) -> str:
-        """Generate secure storage path for document"""
-        ext = os.path.splitext(filename)[1]
-        unique_filename = f"{uuid.uuid4().hex}{ext}"
-        return f"documents/{application.application_number}/{unique_filename}"
+    def get_accessible_applications(self, user: User):
+        """Applications whose documents the user may upload and read"""
+        if user.is_system_admin:
+            return Application.objects.all()
+        if user.is_tpb_manager or user.is_tpb_staff:
+            return Application.objects.filter(group_id=user.group_id)
+        if user.role == 'tpb_customer' and hasattr(user, 'applicant_profile'):
+            return Application.objects.filter(applicant=user.applicant_profile)
+        return Application.objects.none()
     
     def get_application_documents(self, application: Application) -> List[Document]:
         """Get all documents for an application"""
@@ -107,12 +161,19 @@ class DocumentService:
     def delete_document(self, document: Document) -> bool:
         """Delete a document"""
         try:
-            # Delete file from storage
-            if default_storage.exists(document.storage_path):
-                default_storage.delete(document.storage_path)
-            
-            # Delete document record
-            document.delete()
+            if document.blob_id:
+                # Shared contents: the blob goes only with its last reference
+                self.blob_store.release(document)
+            else:
+                # Delete file from storage
+                if default_storage.exists(document.storage_path):
+                    default_storage.delete(document.storage_path)
+                
+                # Delete document record
+                document.delete()
+                
+                if not Document.objects.filter(file_hash=document.file_hash).exists():
+                    self.blob_store.discard_derivatives(document.file_hash)
             
             logger.info(f"Deleted document {document.file_name}")
             return True
@@ -0,0 +1,155 @@
+"""
+Streaming document storage for Omnifin Platform
+
+Uploads are hashed, optionally encrypted and written to storage in a single
+chunked pass, so memory per upload stays at one segment regardless of file
+size. Encrypted files use a segmented AES-GCM format: a header holding a
+random nonce prefix, then fixed-size segments each sealed with a nonce made
+of that prefix, the segment counter and a last-segment flag, which lets a
+reader authenticate and decrypt them one at a time and detect truncation.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import struct
+from typing import Iterable, Iterator, Optional
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.conf import settings
+
+MAGIC = b'OFDE1'
+NONCE_PREFIX_SIZE = 7
+HEADER_SIZE = len(MAGIC) + NONCE_PREFIX_SIZE
+TAG_SIZE = 16
+
+
+class DocumentCipher:
+    """Segmented AES-GCM encryption for document contents"""
+
+    def __init__(self, key: bytes, segment_size: int = None):
+        self.aead = AESGCM(key)
+        self.segment_size = segment_size or settings.DOCUMENT_STREAM_SEGMENT_SIZE
+
+    @classmethod
+    def from_settings(cls) -> Optional['DocumentCipher']:
+        """The configured cipher, or None when DOCUMENT_ENCRYPTION_KEY is unset"""
+        if not settings.DOCUMENT_ENCRYPTION_KEY:
+            return None
+        return cls(base64.urlsafe_b64decode(settings.DOCUMENT_ENCRYPTION_KEY))
+
+    def encrypt(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        prefix = os.urandom(NONCE_PREFIX_SIZE)
+        yield MAGIC + prefix
+        counter = 0
+        buffer = bytearray()
+        for chunk in chunks:
+            buffer += chunk
+            # Keep at least one byte back so the last segment is always flagged
+            while len(buffer) > self.segment_size:
+                yield self._seal(prefix, counter, bytes(buffer[:self.segment_size]), False)
+                del buffer[:self.segment_size]
+                counter += 1
+        yield self._seal(prefix, counter, bytes(buffer), True)
+
+    def decrypt(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        sealed_size = self.segment_size + TAG_SIZE
+        buffer = bytearray()
+        prefix = None
+        counter = 0
+        for chunk in chunks:
+            buffer += chunk
+            if prefix is None:
+                if len(buffer) < HEADER_SIZE:
+                    continue
+                if bytes(buffer[:len(MAGIC)]) != MAGIC:
+                    raise ValueError("Not an encrypted document")
+                prefix = bytes(buffer[len(MAGIC):HEADER_SIZE])
+                del buffer[:HEADER_SIZE]
+            # A full segment is only known not to be the last once more follows it
+            while len(buffer) > sealed_size:
+                yield self._open(prefix, counter, bytes(buffer[:sealed_size]), False)
+                del buffer[:sealed_size]
+                counter += 1
+        if prefix is None:
+            raise ValueError("Encrypted document is truncated")
+        yield self._open(prefix, counter, bytes(buffer), True)
+
+    def decrypt_range(self, stored, plaintext_size: int, start: int, end: int) -> Iterator[bytes]:
+        """Plaintext bytes ``start``..``end`` (inclusive) of a seekable encrypted file
+
+        Only the segments overlapping the range are read and authenticated.
+        """
+        header = stored.read(HEADER_SIZE)
+        if not is_encrypted_header(header) or len(header) < HEADER_SIZE:
+            raise ValueError("Not an encrypted document")
+        prefix = header[len(MAGIC):]
+        sealed_size = self.segment_size + TAG_SIZE
+        # encrypt() always leaves the last segment non-empty (or the only one)
+        last_segment = max(0, (plaintext_size - 1) // self.segment_size)
+
+        segment = start // self.segment_size
+        stored.seek(HEADER_SIZE + segment * sealed_size)
+        position = segment * self.segment_size
+        while position <= end and segment <= last_segment:
+            data = self._open(prefix, segment, stored.read(sealed_size), segment == last_segment)
+            yield data[max(0, start - position):end - position + 1]
+            position += len(data)
+            segment += 1
+
+    def _seal(self, prefix: bytes, counter: int, data: bytes, last: bool) -> bytes:
+        return self.aead.encrypt(self._nonce(prefix, counter, last), data, None)
+
+    def _open(self, prefix: bytes, counter: int, data: bytes, last: bool) -> bytes:
+        return self.aead.decrypt(self._nonce(prefix, counter, last), data, None)
+
+    @staticmethod
+    def _nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+        return prefix + struct.pack('>IB', counter, 1 if last else 0)
+
+
+def is_encrypted_header(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+class DocumentIngestStream(io.RawIOBase):
+    """A read-only stream over an upload that hashes and encrypts as storage pulls from it
+
+    The SHA-256 and size of the plaintext are available once the storage
+    backend has read the stream to the end.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], cipher: DocumentCipher = None, max_size: int = None):
+        super().__init__()
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.max_size = max_size
+        self.encrypted = cipher is not None
+        plaintext = self._measure(chunks)
+        self._chunks = cipher.encrypt(plaintext) if cipher else plaintext
+        self._pending = b''
+
+    def _measure(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self.size += len(chunk)
+            if self.max_size is not None and self.size > self.max_size:
+                raise ValueError(f"File size exceeds maximum allowed size of {self.max_size} bytes")
+            self.hasher.update(chunk)
+            yield chunk
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
@@ -0,0 +1,322 @@
+"""
+Resumable document uploads for Omnifin Platform
+
+A tus-style protocol: the client creates a session declaring the file's
+size and type, PATCHes chunks at the offset the server reports, and
+finalizes once every byte has arrived. Chunks are appended to a part file
+outside MEDIA_ROOT, so a dropped connection only costs the chunk in flight.
+Each worker keeps the SHA-256 of the bytes received so far for the sessions
+it has seen; when the chunks all landed on one worker the hash is known at
+finalize and an already stored blob is reused without writing anything.
+
+No lock is held while bytes come from the client or go to storage: a chunk
+is staged in a file of its own and only appended to the part file, and the
+offset advanced, under a brief row lock once it has fully arrived, and a
+session is claimed for finalizing by a conditional update. A reconnecting
+client therefore never waits on its own dead request.
+"""
+
+import base64
+import glob
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Iterator, Optional
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from apps.documents.models import Document, DocumentUploadSession
+from apps.documents.services import DocumentService
+
+logger = logging.getLogger('omnifin')
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class UploadOffsetMismatch(Exception):
+    """The chunk does not start where the session's received bytes end"""
+
+
+class UploadChecksumMismatch(Exception):
+    """The chunk does not match the checksum the client sent with it"""
+
+
+class UploadSessionClosed(Exception):
+    """The session expired, was completed, or is missing bytes for the requested step"""
+
+
+class RollingHashes:
+    """SHA-256 state of recent sessions in this process, keyed by session and offset"""
+
+    def __init__(self, max_sessions: int = 256):
+        self.max_sessions = max_sessions
+        self._states: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, offset: int):
+        """A copy of the hash state covering exactly ``offset`` bytes, or None"""
+        if offset == 0:
+            return hashlib.sha256()
+        with self._lock:
+            state = self._states.get(str(session_id))
+            if state is None or state[0] != offset:
+                return None
+            self._states.move_to_end(str(session_id))
+            return state[1].copy()
+
+    def put(self, session_id, offset: int, hasher) -> None:
+        with self._lock:
+            self._states[str(session_id)] = (offset, hasher)
+            self._states.move_to_end(str(session_id))
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+
+    def discard(self, session_id) -> None:
+        with self._lock:
+            self._states.pop(str(session_id), None)
+
+
+rolling_hashes = RollingHashes()
+
+
+class ResumableUploadService:
+    """Creates, appends to, finalizes and expires resumable upload sessions"""
+
+    def __init__(self):
+        self.document_service = DocumentService()
+        self.directory = str(settings.DOCUMENT_UPLOAD_SESSION_DIR)
+
+    def create_session(self, application, uploader, document_type: str, file_name: str,
+                       mime_type: str, upload_length: int) -> DocumentUploadSession:
+        # The same validation as a one-shot upload, before any bytes are sent
+        if upload_length < 0:
+            raise ValueError("Upload length must not be negative")
+        self.document_service.validate_upload(upload_length, mime_type)
+        if document_type not in dict(Document.DOCUMENT_TYPE_CHOICES):
+            raise ValueError(f"Unknown document type {document_type}")
+
+        session = DocumentUploadSession.objects.create(
+            application=application,
+            uploader=uploader,
+            document_type=document_type,
+            file_name=file_name,
+            mime_type=mime_type,
+            upload_length=upload_length,
+            expires_at=self._expiry()
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        open(self.part_path(session), 'wb').close()
+        logger.info(f"Opened upload session {session.id} for {file_name} ({upload_length} bytes)")
+        return session
+
+    def append(self, session_id, uploader, offset: int, stream, content_length: int = None,
+               checksum: str = None) -> DocumentUploadSession:
+        """Write a chunk read from ``stream`` at ``offset``; returns the session with its new offset
+
+        Bytes received before the connection dropped are kept, unless the
+        client sent a checksum for the chunk.
+        """
+        session = self._get_open_session(session_id, uploader)
+        self._check_offset(session, offset)
+
+        limit = session.upload_length - offset
+        if content_length is not None:
+            if content_length > limit:
+                raise ValueError("Chunk extends past the declared upload length")
+            limit = content_length
+
+        hasher = rolling_hashes.get(session.id, offset)
+        chunk_hasher = self._chunk_hasher(checksum)
+        written = 0
+        chunk_path = os.path.join(self.directory, f"{session.id}.{uuid.uuid4().hex}.chunk")
+        try:
+            with open(chunk_path, 'wb') as chunk:
+                try:
+                    while written < limit:
+                        data = stream.read(min(READ_CHUNK_SIZE, limit - written))
+                        if not data:
+                            break
+                        chunk.write(data)
+                        written += len(data)
+                        if hasher is not None:
+                            hasher.update(data)
+                        if chunk_hasher is not None:
+                            chunk_hasher.update(data)
+                except Exception as e:
+                    if chunk_hasher is not None:
+                        raise
+                    logger.info(f"Upload session {session.id} interrupted after {written} bytes: {str(e)}")
+            if chunk_hasher is not None and not self._checksum_matches(chunk_hasher, checksum):
+                raise UploadChecksumMismatch("Chunk checksum does not match")
+
+            with transaction.atomic():
+                # Another request may have advanced the session while this chunk arrived
+                session = self._lock_open_session(session_id, uploader)
+                self._check_offset(session, offset)
+                with open(self.part_path(session), 'r+b') as part, open(chunk_path, 'rb') as chunk:
+                    # Anything past the offset is from a chunk that never committed
+                    part.seek(offset)
+                    part.truncate()
+                    shutil.copyfileobj(chunk, part, READ_CHUNK_SIZE)
+                    part.flush()
+                    # The offset must never run ahead of what is on disk
+                    os.fsync(part.fileno())
+
+                session.upload_offset = offset + written
+                session.expires_at = self._expiry()
+                # update() rather than save(): no audit entry per chunk
+                DocumentUploadSession.objects.filter(pk=session.pk).update(
+                    upload_offset=session.upload_offset,
+                    expires_at=session.expires_at
+                )
+        finally:
+            self._remove_file(chunk_path)
+
+        if hasher is not None:
+            rolling_hashes.put(session.id, session.upload_offset, hasher)
+        else:
+            rolling_hashes.discard(session.id)
+        return session
+
+    def finalize(self, session_id, uploader) -> Document:
+        """Turn a fully received session into a Document; repeating it returns the same document"""
+        session = (
+            DocumentUploadSession.objects.select_related('application', 'document')
+            .filter(pk=session_id, uploader=uploader)
+            .first()
+        )
+        if session is None:
+            raise DocumentUploadSession.DoesNotExist()
+        if session.status == 'completed' and session.document is not None:
+            return session.document
+        if session.status == 'finalizing':
+            raise UploadSessionClosed("Upload session is already being finalized")
+        if session.status != 'open' or session.expires_at <= timezone.now():
+            raise UploadSessionClosed("Upload session has expired")
+        if session.upload_offset != session.upload_length:
+            raise UploadSessionClosed(
+                f"Upload incomplete: {session.upload_offset} of {session.upload_length} bytes received"
+            )
+
+        # Claim the session without holding a lock while the file is stored
+        claimed = DocumentUploadSession.objects.filter(
+            pk=session.pk, status='open', upload_offset=session.upload_length
+        ).update(status='finalizing')
+        if not claimed:
+            raise UploadSessionClosed("Upload session changed while finalizing; check its status")
+
+        hasher = rolling_hashes.get(session.id, session.upload_offset)
+        try:
+            with transaction.atomic():
+                document = self.document_service.store_document(
+                    self._read_part(session),
+                    session.application,
+                    uploader,
+                    session.document_type,
+                    file_name=session.file_name,
+                    mime_type=session.mime_type,
+                    file_hash=hasher.hexdigest() if hasher is not None else None
+                )
+                DocumentUploadSession.objects.filter(pk=session.pk).update(status='completed', document=document)
+                transaction.on_commit(lambda: self._remove_part(session))
+        except Exception:
+            # Let the client retry
+            DocumentUploadSession.objects.filter(pk=session.pk, status='finalizing').update(status='open')
+            raise
+
+        rolling_hashes.discard(session.id)
+        return document
+
+    def abort(self, session_id, uploader) -> None:
+        with transaction.atomic():
+            session = self._lock_open_session(session_id, uploader, allow_expired=True)
+            session.delete()
+            transaction.on_commit(lambda: self._remove_part(session))
+        rolling_hashes.discard(session.id)
+
+    def expire_sessions(self, dry_run: bool = False) -> Dict[str, int]:
+        """Delete sessions past their expiry, and the part files of abandoned ones"""
+        expired = list(DocumentUploadSession.objects.filter(expires_at__lt=timezone.now()))
+        stats = {'sessions': len(expired), 'bytes': sum(s.upload_offset for s in expired if s.status == 'open')}
+        if dry_run:
+            return stats
+        for session in expired:
+            self._remove_part(session)
+            # Chunks staged by requests that died before they could clean up
+            for path in glob.glob(os.path.join(self.directory, f"{session.id}.*.chunk")):
+                self._remove_file(path)
+            rolling_hashes.discard(session.id)
+        DocumentUploadSession.objects.filter(pk__in=[session.pk for session in expired])._raw_delete(
+            DocumentUploadSession.objects.db
+        )
+        logger.info(f"Expired {stats['sessions']} upload sessions ({stats['bytes']} bytes)")
+        return stats
+
+    def part_path(self, session: DocumentUploadSession) -> str:
+        return os.path.join(self.directory, f"{session.id}.part")
+
+    def _lock_open_session(self, session_id, uploader, allow_expired: bool = False) -> DocumentUploadSession:
+        return self._get_open_session(session_id, uploader, allow_expired, lock=True)
+
+    @staticmethod
+    def _get_open_session(session_id, uploader, allow_expired: bool = False,
+                          lock: bool = False) -> DocumentUploadSession:
+        sessions = DocumentUploadSession.objects.select_for_update() if lock else DocumentUploadSession.objects
+        session = sessions.filter(pk=session_id, uploader=uploader).first()
+        if session is None:
+            raise DocumentUploadSession.DoesNotExist()
+        if session.status != 'open' or (not allow_expired and session.expires_at <= timezone.now()):
+            raise UploadSessionClosed("Upload session is no longer open")
+        return session
+
+    @staticmethod
+    def _check_offset(session: DocumentUploadSession, offset: int) -> None:
+        if offset != session.upload_offset:
+            raise UploadOffsetMismatch(f"Expected offset {session.upload_offset}, got {offset}")
+
+    def _read_part(self, session: DocumentUploadSession) -> Iterator[bytes]:
+        with open(self.part_path(session), 'rb') as part:
+            while True:
+                data = part.read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                yield data
+
+    def _remove_part(self, session: DocumentUploadSession) -> None:
+        self._remove_file(self.part_path(session))
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove upload file {path}: {str(e)}")
+
+    @staticmethod
+    def _expiry():
+        return timezone.now() + timedelta(seconds=settings.DOCUMENT_UPLOAD_SESSION_TTL_SECONDS)
+
+    @staticmethod
+    def _chunk_hasher(checksum: Optional[str]):
+        """A hasher for a tus ``Upload-Checksum`` header (``sha256 <base64>``), or None without one"""
+        if not checksum:
+            return None
+        algorithm, _, _ = checksum.partition(' ')
+        if algorithm.lower() not in ('sha1', 'sha256'):
+            raise ValueError(f"Unsupported checksum algorithm {algorithm}")
+        return hashlib.new(algorithm.lower())
+
+    @staticmethod
+    def _checksum_matches(hasher, checksum: str) -> bool:
+        _, _, expected = checksum.partition(' ')
+        try:
+            return base64.b64decode(expected.strip(), validate=True) == hasher.digest()
+        except ValueError:
+            return False
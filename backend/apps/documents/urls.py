@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from apps.documents.views import DocumentViewSet
+from apps.documents.views import DocumentViewSet, DocumentUploadViewSet
 
 router = DefaultRouter()
 router.register(r'documents', DocumentViewSet)
+router.register(r'uploads', DocumentUploadViewSet, basename='document-upload')
 
 urlpatterns = [
 	path('', include(router.urls)),
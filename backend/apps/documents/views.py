@@ -1,9 +1,16 @@
-from rest_framework import viewsets, permissions
+import logging
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Document
-from .serializers import DocumentSerializer
+from .models import Document, DocumentUploadSession
+from .serializers import DocumentSerializer, DocumentUploadSessionSerializer
 from .services import DocumentService
+from .derivatives import DerivativeUnavailable, DocumentDerivativeService
+from .downloads import DocumentDownloadService
+from .uploads import ResumableUploadService, UploadChecksumMismatch, UploadOffsetMismatch, UploadSessionClosed
+
+logger = logging.getLogger('omnifin')
 
 class DocumentViewSet(viewsets.ModelViewSet):
     queryset = Document.objects.all()
@@ -23,3 +30,155 @@ class DocumentViewSet(viewsets.ModelViewSet):
         service = DocumentService()
         result = service.verify_document(pk, status, notes)
         return Response(result)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """The original file; nginx sends it when it can, Django only authorizes"""
+        document = self._get_accessible_document()
+        if document is None:
+            return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+        as_attachment = request.query_params.get('disposition') != 'inline'
+        try:
+            return DocumentDownloadService().response(request, document, as_attachment=as_attachment)
+        except FileNotFoundError:
+            logger.error(f"Stored file missing for document {document.id}")
+            return Response({'error': 'Document file not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=True, methods=['get'], url_path=r'derivatives/(?P<kind>[a-z_]+)')
+    def derivative(self, request, pk=None, kind=None):
+        """A thumbnail or review preview, rendered on first request if it is missing"""
+        document = self._get_accessible_document()
+        if document is None:
+            return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'"{document.file_hash}-{kind}"'
+        if request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified(headers={'ETag': etag})
+
+        try:
+            content = DocumentDerivativeService().get(document, kind)
+        except DerivativeUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        if content is None:
+            response = Response({'status': 'rendering'}, status=status.HTTP_202_ACCEPTED)
+            response['Retry-After'] = '2'
+            return response
+
+        response = HttpResponse(content, content_type='image/webp')
+        response['ETag'] = etag
+        # Derivatives of given contents never change; only the holder may cache them
+        response['Cache-Control'] = 'private, max-age=86400, immutable'
+        return response
+
+    def _get_accessible_document(self):
+        document = self.get_object()
+        if not DocumentService().get_accessible_applications(self.request.user).filter(id=document.application_id).exists():
+            return None
+        return document
+
+
+class DocumentUploadViewSet(viewsets.ViewSet):
+    """Resumable uploads: create a session, PATCH chunks at Upload-Offset, then finalize"""
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_value_regex = '[0-9a-f-]{36}'
+
+    # tus status for a chunk that fails its Upload-Checksum
+    CHECKSUM_MISMATCH = 460
+
+    def create(self, request):
+        application = DocumentService().get_accessible_applications(request.user).filter(
+            id=request.data.get('application')
+        ).first()
+        if application is None:
+            return Response({'error': 'Application not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            upload_length = int(request.data.get('upload_length') or request.headers.get('Upload-Length'))
+        except (TypeError, ValueError):
+            return Response({'error': 'upload_length is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            session = ResumableUploadService().create_session(
+                application,
+                request.user,
+                document_type=request.data.get('document_type', 'other'),
+                file_name=request.data.get('file_name') or 'upload',
+                mime_type=request.data.get('mime_type') or 'application/octet-stream',
+                upload_length=upload_length
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = Response(DocumentUploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+        response['Location'] = request.build_absolute_uri(f"{request.path.rstrip('/')}/{session.id}/")
+        return self._offset_headers(response, session)
+
+    def retrieve(self, request, pk=None):
+        session = DocumentUploadSession.objects.filter(pk=pk, uploader=request.user).first()
+        if session is None:
+            return Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+        response = Response(DocumentUploadSessionSerializer(session).data)
+        response['Cache-Control'] = 'no-store'
+        return self._offset_headers(response, session)
+
+    def partial_update(self, request, pk=None):
+        if request.content_type != 'application/offset+octet-stream':
+            return Response({'error': 'Content-Type must be application/offset+octet-stream'},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset header is required'}, status=status.HTTP_400_BAD_REQUEST)
+        content_length = request.META.get('CONTENT_LENGTH')
+
+        try:
+            session = ResumableUploadService().append(
+                pk,
+                request.user,
+                offset,
+                request.stream or _EmptyStream(),
+                content_length=int(content_length) if content_length else None,
+                checksum=request.headers.get('Upload-Checksum')
+            )
+        except DocumentUploadSession.DoesNotExist:
+            return Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+        except UploadSessionClosed as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+        except UploadOffsetMismatch as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except UploadChecksumMismatch as e:
+            return Response({'error': str(e)}, status=self.CHECKSUM_MISMATCH)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self._offset_headers(Response(status=status.HTTP_204_NO_CONTENT), session)
+
+    def destroy(self, request, pk=None):
+        try:
+            ResumableUploadService().abort(pk, request.user)
+        except DocumentUploadSession.DoesNotExist:
+            return Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+        except UploadSessionClosed as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        try:
+            document = ResumableUploadService().finalize(pk, request.user)
+        except DocumentUploadSession.DoesNotExist:
+            return Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+        except UploadSessionClosed as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(DocumentSerializer(document).data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def _offset_headers(response, session):
+        response['Upload-Offset'] = str(session.upload_offset)
+        response['Upload-Length'] = str(session.upload_length)
+        response['Upload-Expires'] = session.expires_at.strftime('%a, %d %b %Y %H:%M:%S GMT')
+        return response
+
+
+class _EmptyStream:
+    def read(self, size=-1):
+        return b''
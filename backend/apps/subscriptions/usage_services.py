@@ -4,8 +4,9 @@ Token usage tracking services for Omnifin Platform
 
 import logging
 from datetime import datetime, timedelta
+from django.core.cache import cache
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Case, F, Q, Sum, Value, When
 from apps.subscriptions.models import Subscription
 from apps.subscriptions.usage_models import TokenUsage, UsageSummary
 
@@ -38,6 +39,75 @@ class UsageTrackingService:
             logger.error(f"Error recording usage: {str(e)}")
             raise
     
+    @staticmethod
+    def get_active_subscription_id(group_id):
+        """ID of the group's active subscription, cached briefly since it rarely changes"""
+        cache_key = f"usage_active_subscription:{group_id}"
+        subscription_id = cache.get(cache_key)
+        if subscription_id is None:
+            subscription = Subscription.objects.filter(group_id=group_id, status='active').values_list('id', flat=True).first()
+            # '' caches "no subscription" so unmetered groups do not query every turn
+            subscription_id = str(subscription) if subscription else ''
+            cache.set(cache_key, subscription_id, 300)
+        return subscription_id or None
+    
+    @staticmethod
+    def record_usage_batch(subscription_id, group_id, entries, user_id=None, metadata=None):
+        """Record several (usage_type, tokens) entries and bump the summary in place
+        
+        Meant to run inside the caller's transaction: one multi-row INSERT and
+        one UPDATE instead of re-aggregating the whole period.
+        """
+        entries = [(usage_type, tokens) for usage_type, tokens in entries if tokens]
+        if not entries:
+            return
+        
+        TokenUsage.objects.bulk_create([
+            TokenUsage(
+                subscription_id=subscription_id,
+                group_id=group_id,
+                usage_type=usage_type,
+                tokens_used=tokens,
+                user_id=user_id,
+                metadata=metadata or {}
+            )
+            for usage_type, tokens in entries
+        ])
+        
+        llm = sum(tokens for usage_type, tokens in entries if usage_type == 'llm')
+        voice = sum(tokens for usage_type, tokens in entries if usage_type == 'voice')
+        if not UsageTrackingService.increment_usage_summary(subscription_id, llm, voice):
+            # No summary for this period yet; create it from the full aggregate
+            UsageTrackingService.update_usage_summary(Subscription.objects.get(id=subscription_id))
+    
+    @staticmethod
+    def increment_usage_summary(subscription_id, llm_tokens=0, voice_tokens=0):
+        """Add tokens to the current period's summary with one UPDATE; returns False if there is none"""
+        now = timezone.now()
+        
+        def flags(used, limit, delta, reached, warned):
+            # Same thresholds as update_usage_summary, evaluated against the new total
+            reached_q = Q(**{f'{limit}__gt': 0, f'{used}__gte': F(limit) - delta})
+            warning_q = Q(**{f'{limit}__gt': 0, f'{used}__gte': F(limit) * 0.8 - delta})
+            return {
+                reached: Case(When(reached_q, then=Value(True)), default=F(reached)),
+                warned: Case(When(reached_q, then=F(warned)), When(warning_q, then=Value(True)), default=F(warned)),
+            }
+        
+        updates = {'updated_at': now}
+        if llm_tokens:
+            updates.update(flags('llm_tokens_used', 'llm_tokens_limit', llm_tokens, 'llm_limit_reached', 'llm_warning_sent'))
+            updates['llm_tokens_used'] = F('llm_tokens_used') + llm_tokens
+        if voice_tokens:
+            updates.update(flags('voice_tokens_used', 'voice_tokens_limit', voice_tokens, 'voice_limit_reached', 'voice_warning_sent'))
+            updates['voice_tokens_used'] = F('voice_tokens_used') + voice_tokens
+        
+        return UsageSummary.objects.filter(
+            subscription_id=subscription_id,
+            period_start__lte=now,
+            period_end__gte=now
+        ).update(**updates) > 0
+    
     @staticmethod
     def get_or_create_current_summary(subscription):
         """Get or create current month's usage summary"""
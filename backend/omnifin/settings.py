@@ -161,13 +161,37 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Voice replies streamed as audio carry their text in response headers
+CORS_EXPOSE_HEADERS = [
+    'X-Session-Id',
+    'X-Conversation-Id',
+    'X-Transcript',
+    'X-Response-Text',
+]
+
 # MFA Configuration
 MFA_UNALLOWED_METHODS = ()
 MFA_LOGIN_CALLBACK = "apps.authentication.utils.login_callback"
 MFA_QR_ISSUER_NAME = "Omnifin Platform"
 
 # File Upload Configuration
-MAX_UPLOAD_SIZE = 10485760  # 10MB
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 10485760))  # 10MB; uploads are streamed, so larger limits cost no memory
+DOCUMENT_ENCRYPTION_KEY = os.getenv('DOCUMENT_ENCRYPTION_KEY', '')  # urlsafe base64 32-byte AES key; empty stores documents unencrypted
+DOCUMENT_STREAM_SEGMENT_SIZE = int(os.getenv('DOCUMENT_STREAM_SEGMENT_SIZE', 65536))  # bytes per encrypted segment; do not change once documents exist
+DOCUMENT_BLOB_GC_GRACE_SECONDS = int(os.getenv('DOCUMENT_BLOB_GC_GRACE_SECONDS', 86400))  # gc_document_blobs leaves newer blobs and files alone
+DOCUMENT_UPLOAD_SESSION_DIR = os.getenv('DOCUMENT_UPLOAD_SESSION_DIR', str(BASE_DIR / 'uploads' / 'sessions'))  # resumable upload part files; outside MEDIA_ROOT
+DOCUMENT_UPLOAD_SESSION_TTL_SECONDS = int(os.getenv('DOCUMENT_UPLOAD_SESSION_TTL_SECONDS', 86400))  # an untouched session expires after this
+DOCUMENT_DOWNLOAD_ACCEL_REDIRECT = os.getenv('DOCUMENT_DOWNLOAD_ACCEL_REDIRECT', 'False') == 'True'  # let nginx send unencrypted downloads; enable only behind nginx.conf
+DOCUMENT_DOWNLOAD_ACCEL_PREFIX = os.getenv('DOCUMENT_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')  # nginx internal location aliased to MEDIA_ROOT
+DOCUMENT_DOWNLOAD_MAX_AGE = int(os.getenv('DOCUMENT_DOWNLOAD_MAX_AGE', 3600))  # private browser cache lifetime for downloads
+
+# Document Derivative Configuration (thumbnails and review previews)
+DOCUMENT_DERIVATIVE_SIZES = {'thumbnail': 256, 'preview': 1600}  # longest edge in pixels per derivative kind
+DOCUMENT_DERIVATIVE_QUALITY = int(os.getenv('DOCUMENT_DERIVATIVE_QUALITY', 80))  # WebP quality
+DOCUMENT_DERIVATIVE_WORKERS = int(os.getenv('DOCUMENT_DERIVATIVE_WORKERS', 2))  # rendering processes per app worker
+DOCUMENT_DERIVATIVES_ON_UPLOAD = os.getenv('DOCUMENT_DERIVATIVES_ON_UPLOAD', 'True') == 'True'  # render in the background right after upload
+DOCUMENT_DERIVATIVE_WAIT_SECONDS = float(os.getenv('DOCUMENT_DERIVATIVE_WAIT_SECONDS', 5))  # a request waits this long for a missing derivative before answering 202
+DOCUMENT_DERIVATIVE_TIMEOUT_SECONDS = int(os.getenv('DOCUMENT_DERIVATIVE_TIMEOUT_SECONDS', 60))  # upper bound on one rendering job
 ALLOWED_FILE_TYPES = [
     'image/jpeg',
     'image/jpg',
@@ -180,6 +204,23 @@ ALLOWED_FILE_TYPES = [
 # Redis Configuration
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
+# Cache Configuration (use redis when running more than one worker process)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'omnifin',
+        }
+    }
+
 # Celery Configuration
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
@@ -195,6 +236,104 @@ ULTRAVOX_API_KEY = os.getenv('ULTRAVOX_API_KEY', '')
 # OpenAI Model Configuration
 AI_MODEL = os.getenv('AI_MODEL', 'gpt-3.5-turbo')
 
+# AI Provider Configuration: openai, local (offline stand-in), record or replay
+AI_PROVIDER = os.getenv('AI_PROVIDER', 'openai')
+AI_PROVIDER_CASSETTE = os.getenv('AI_PROVIDER_CASSETTE', str(BASE_DIR / 'ai_cassettes' / 'responses.jsonl'))
+AI_LOCAL_LATENCY_MS = int(os.getenv('AI_LOCAL_LATENCY_MS', '0'))
+AI_LOCAL_COMPLETION_TOKENS = int(os.getenv('AI_LOCAL_COMPLETION_TOKENS', '60'))
+AI_LOCAL_TOOL_CALL_KEYWORD = os.getenv('AI_LOCAL_TOOL_CALL_KEYWORD', 'submit my application')
+
+# AI Voice Configuration
+AI_VOICE_STREAM_CHUNK_SIZE = int(os.getenv('AI_VOICE_STREAM_CHUNK_SIZE', '8192'))  # bytes per streamed audio chunk
+AI_VOICE_AUDIO_URL_TTL = int(os.getenv('AI_VOICE_AUDIO_URL_TTL', '300'))  # seconds a reply audio URL stays valid
+AI_VOICE_TEXT_HEADER_MAX_BYTES = int(os.getenv('AI_VOICE_TEXT_HEADER_MAX_BYTES', '4096'))  # encoded transcript/reply text per response header
+AI_VOICE_TTS_MAX_WORKERS = int(os.getenv('AI_VOICE_TTS_MAX_WORKERS', '4'))  # concurrent sentence syntheses per process
+AI_VOICE_MIN_SENTENCE_CHARS = int(os.getenv('AI_VOICE_MIN_SENTENCE_CHARS', '12'))  # shorter fragments join the next sentence
+
+# AI TTS Cache Configuration
+AI_TTS_CACHE_ENABLED = os.getenv('AI_TTS_CACHE_ENABLED', 'True') == 'True'
+AI_TTS_CACHE_DIR = os.getenv('AI_TTS_CACHE_DIR', str(BASE_DIR / 'tts_cache'))  # outside MEDIA_ROOT, which nginx serves
+AI_TTS_CACHE_MAX_BYTES = int(os.getenv('AI_TTS_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+AI_TTS_CACHE_MAX_TEXT_CHARS = int(os.getenv('AI_TTS_CACHE_MAX_TEXT_CHARS', '1000'))  # longer replies are rarely repeated
+AI_TTS_CACHE_METADATA_TTL = int(os.getenv('AI_TTS_CACHE_METADATA_TTL', str(30 * 24 * 3600)))
+
+# AI Prompt Registry Configuration
+AI_PROMPT_REGISTRY_CHECK_INTERVAL = float(os.getenv('AI_PROMPT_REGISTRY_CHECK_INTERVAL', '5'))  # seconds between version checks
+AI_PROMPT_CONTEXT_VALUE_MAX_CHARS = int(os.getenv('AI_PROMPT_CONTEXT_VALUE_MAX_CHARS', '500'))
+
+# AI Admission Control Configuration (per tenant group)
+AI_ADMISSION_ENABLED = os.getenv('AI_ADMISSION_ENABLED', 'True') == 'True'
+AI_ADMISSION_BACKEND = os.getenv('AI_ADMISSION_BACKEND', CACHE_BACKEND)  # redis or local (per process)
+AI_ADMISSION_REQUESTS_PER_MINUTE = int(os.getenv('AI_ADMISSION_REQUESTS_PER_MINUTE', '60'))
+AI_ADMISSION_TOKENS_PER_MINUTE = int(os.getenv('AI_ADMISSION_TOKENS_PER_MINUTE', '90000'))
+AI_ADMISSION_MAX_CONCURRENT = int(os.getenv('AI_ADMISSION_MAX_CONCURRENT', '8'))  # in-flight LLM turns per group
+AI_ADMISSION_LEASE_SECONDS = int(os.getenv('AI_ADMISSION_LEASE_SECONDS', '120'))  # a crashed worker's slot frees after this
+AI_ADMISSION_MAX_QUEUE_SECONDS = float(os.getenv('AI_ADMISSION_MAX_QUEUE_SECONDS', '2'))
+AI_ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv('AI_ADMISSION_RETRY_AFTER_SECONDS', '5'))
+AI_ADMISSION_QUOTA_CACHE_TTL = int(os.getenv('AI_ADMISSION_QUOTA_CACHE_TTL', '60'))
+
+# AI Model Routing Configuration (defaults; tenants override via ModelRoutingConfig)
+AI_ROUTING_ENABLED = os.getenv('AI_ROUTING_ENABLED', 'True') == 'True'
+AI_FAST_MODEL = os.getenv('AI_FAST_MODEL', 'gpt-4o-mini')  # small talk and FAQ turns, sent without tools
+AI_ROUTING_FAST_MAX_CHARS = int(os.getenv('AI_ROUTING_FAST_MAX_CHARS', '200'))  # longer messages go to AI_MODEL
+AI_ROUTING_STICKY_SECONDS = int(os.getenv('AI_ROUTING_STICKY_SECONDS', '1800'))  # a conversation in intake stays on AI_MODEL
+AI_ROUTING_CONFIG_CACHE_TTL = int(os.getenv('AI_ROUTING_CONFIG_CACHE_TTL', '300'))
+
+# AI Deadline and Hedging Configuration (LLM, STT and TTS calls)
+AI_REQUEST_BUDGET_SECONDS = float(os.getenv('AI_REQUEST_BUDGET_SECONDS', '30'))  # end-to-end budget of a chat turn
+AI_VOICE_REQUEST_BUDGET_SECONDS = float(os.getenv('AI_VOICE_REQUEST_BUDGET_SECONDS', '45'))  # transcription, reply and speech together
+AI_DEADLINE_MIN_CALL_SECONDS = float(os.getenv('AI_DEADLINE_MIN_CALL_SECONDS', '0.5'))  # less left than this counts as expired
+AI_HEDGE_ENABLED = os.getenv('AI_HEDGE_ENABLED', 'True') == 'True'
+AI_HEDGE_MIN_DELAY_MS = int(os.getenv('AI_HEDGE_MIN_DELAY_MS', '250'))  # floor under the p95-derived hedge delay
+AI_HEDGE_MIN_SAMPLES = int(os.getenv('AI_HEDGE_MIN_SAMPLES', '20'))  # no hedging until p95 is meaningful
+AI_HEDGE_LATENCY_WINDOW = int(os.getenv('AI_HEDGE_LATENCY_WINDOW', '200'))  # recent calls per operation
+AI_HEDGE_MAX_WORKERS = int(os.getenv('AI_HEDGE_MAX_WORKERS', '16'))
+
+# AI Conversation Archive Configuration (archive_conversations job)
+AI_ARCHIVE_DIR = os.getenv('AI_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'conversations'))  # outside MEDIA_ROOT: not web-served
+AI_ARCHIVE_AFTER_DAYS = int(os.getenv('AI_ARCHIVE_AFTER_DAYS', '180'))  # days after ended_at
+AI_ARCHIVE_BATCH_SIZE = int(os.getenv('AI_ARCHIVE_BATCH_SIZE', '100'))  # conversations per transaction
+AI_ARCHIVE_DELETE_BATCH_SIZE = int(os.getenv('AI_ARCHIVE_DELETE_BATCH_SIZE', '1000'))  # messages per DELETE
+AI_ARCHIVE_SEGMENT_MAX_BYTES = int(os.getenv('AI_ARCHIVE_SEGMENT_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# AI Knowledge Retrieval Configuration
+AI_KNOWLEDGE_PASSAGE_MAX_TOKENS = int(os.getenv('AI_KNOWLEDGE_PASSAGE_MAX_TOKENS', '200'))
+AI_KNOWLEDGE_TOKEN_BUDGET = int(os.getenv('AI_KNOWLEDGE_TOKEN_BUDGET', '800'))  # passages packed into one prompt
+AI_KNOWLEDGE_MAX_PASSAGES = int(os.getenv('AI_KNOWLEDGE_MAX_PASSAGES', '8'))
+# Passages and terms are a derived index rebuilt in bulk; auditing each row would swamp CRUD events
+DJANGO_EASY_AUDIT_UNREGISTERED_CLASSES_EXTRA = ['ai_integration.KnowledgePassage', 'ai_integration.KnowledgeTerm']
+
+# AI Conversation Analysis Configuration (analyze_conversations job)
+AI_ANALYSIS_MODEL = os.getenv('AI_ANALYSIS_MODEL', 'gpt-3.5-turbo')
+AI_ANALYSIS_MAX_TRANSCRIPT_TOKENS = int(os.getenv('AI_ANALYSIS_MAX_TRANSCRIPT_TOKENS', '3000'))  # most recent messages kept
+AI_ANALYSIS_MAX_WORKERS = int(os.getenv('AI_ANALYSIS_MAX_WORKERS', '4'))
+AI_ANALYSIS_REQUESTS_PER_MINUTE = int(os.getenv('AI_ANALYSIS_REQUESTS_PER_MINUTE', '60'))
+
+# AI Tool Execution Configuration
+AI_TOOL_MAX_WORKERS = int(os.getenv('AI_TOOL_MAX_WORKERS', '4'))  # concurrent tool calls per process
+
+# AI Conversation Context Configuration
+AI_CONTEXT_TOKEN_BUDGET = int(os.getenv('AI_CONTEXT_TOKEN_BUDGET', '2000'))  # history tokens per turn
+AI_SUMMARY_MAX_TOKENS = int(os.getenv('AI_SUMMARY_MAX_TOKENS', '300'))
+AI_SUMMARY_MIN_MESSAGES = int(os.getenv('AI_SUMMARY_MIN_MESSAGES', '4'))  # batch size for summary updates
+AI_SUMMARY_TIMEOUT_SECONDS = float(os.getenv('AI_SUMMARY_TIMEOUT_SECONDS', '8'))  # a slower summary update is skipped for the turn
+
+# AI History Buffer Configuration (needs a shared cache across workers)
+AI_HISTORY_BUFFER_ENABLED = os.getenv('AI_HISTORY_BUFFER_ENABLED', str(CACHE_BACKEND == 'redis')) == 'True'
+AI_HISTORY_BUFFER_SIZE = int(os.getenv('AI_HISTORY_BUFFER_SIZE', '50'))  # messages per conversation
+AI_HISTORY_BUFFER_TTL = int(os.getenv('AI_HISTORY_BUFFER_TTL', '3600'))  # 1 hour
+
+# AI Usage Rollup Configuration
+AI_USAGE_ROLLUP_CACHE_TTL = int(os.getenv('AI_USAGE_ROLLUP_CACHE_TTL', '60'))  # seconds
+
+# AI Response Cache Configuration
+AI_RESPONSE_CACHE_ENABLED = os.getenv('AI_RESPONSE_CACHE_ENABLED', 'True') == 'True'
+AI_RESPONSE_CACHE_TTL = int(os.getenv('AI_RESPONSE_CACHE_TTL', '86400'))  # 24 hours
+AI_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('AI_RESPONSE_CACHE_MAX_ENTRIES', '500'))  # per tenant
+AI_RESPONSE_CACHE_MIN_WORDS = int(os.getenv('AI_RESPONSE_CACHE_MIN_WORDS', '4'))
+AI_RESPONSE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv('AI_RESPONSE_CACHE_SIMILARITY_THRESHOLD', '0.9'))  # 0 disables
+AI_RESPONSE_CACHE_EMBEDDING_MODEL = os.getenv('AI_RESPONSE_CACHE_EMBEDDING_MODEL', '')  # empty uses local term vectors
+
 # Stripe Configuration
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
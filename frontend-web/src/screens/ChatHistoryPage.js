@@ -42,6 +42,9 @@ const ChatHistoryPage = () => {
   const [error, setError] = useState(null);
   const [selectedConversation, setSelectedConversation] = useState(null);
   const [messages, setMessages] = useState([]);
+  // Cursor for the page before the oldest loaded message of the open conversation
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [dialogOpen, setDialogOpen] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
   const [tabValue, setTabValue] = useState(0); // 0: all, 1: active, 2: completed
@@ -81,12 +84,38 @@ const ChatHistoryPage = () => {
     loadConversations();
   }, [loadConversations]);
 
+  const getOlderCursor = (data) => (
+    data.has_more ? { before: data.next_before, before_id: data.next_before_id } : null
+  );
+
+  // Fetch the page before the oldest loaded message when scrolled to the top
+  const handleMessagesScroll = async (event) => {
+    if (event.currentTarget.scrollTop > 50 || !olderCursor || loadingOlder) return;
+    const container = event.currentTarget;
+    try {
+      setLoadingOlder(true);
+      const data = await chatService.getConversationMessages(selectedConversation.id, olderCursor);
+      const previousHeight = container.scrollHeight;
+      setMessages((prev) => [...(data.messages || []), ...prev]);
+      setOlderCursor(getOlderCursor(data));
+      // Keep the same messages in view once the older page is rendered above them
+      requestAnimationFrame(() => {
+        container.scrollTop += container.scrollHeight - previousHeight;
+      });
+    } catch (err) {
+      console.error('Error loading older messages:', err);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const handleViewConversation = async (conversation) => {
     try {
       setLoading(true);
       const data = await chatService.getConversationMessages(conversation.id);
       setSelectedConversation(data.conversation);
       setMessages(data.messages || []);
+      setOlderCursor(getOlderCursor(data));
       setDialogOpen(true);
     } catch (err) {
       console.error('Error loading messages:', err);
@@ -301,7 +330,12 @@ const ChatHistoryPage = () => {
           </Typography>
         </DialogTitle>
         
-        <DialogContent dividers>
+        <DialogContent dividers onScroll={handleMessagesScroll}>
+          {loadingOlder && (
+            <Box sx={{ display: 'flex', justifyContent: 'center', py: 1 }}>
+              <CircularProgress size={20} />
+            </Box>
+          )}
           <List>
             {messages.map((message, index) => (
               <ListItem 
@@ -76,7 +76,14 @@ const ChatPage = () => {
     return null; // Return null initially, will be set by the promise
   });
 
+  // Cursor for the page before the oldest loaded message of a previous chat
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
+
   const messagesEndRef = useRef(null);
+  const messagesContainerRef = useRef(null);
+  // Scroll height before older messages were prepended, to keep the view in place
+  const prependScrollHeightRef = useRef(null);
   const fileInputRef = useRef(null);
   const initializedRef = useRef(false);
 
@@ -114,6 +121,12 @@ const ChatPage = () => {
   };
 
   useEffect(() => {
+    const container = messagesContainerRef.current;
+    if (prependScrollHeightRef.current !== null && container) {
+      container.scrollTop += container.scrollHeight - prependScrollHeightRef.current;
+      prependScrollHeightRef.current = null;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -136,21 +149,28 @@ const ChatPage = () => {
     loadChatHistory();
   }
 
+  // Map a stored message to display format
+  const toDisplayMessage = (msg) => ({
+    id: msg.id,
+    content: msg.content,
+    sender: msg.sender, // 'user' or 'ai' from backend
+    timestamp: msg.created_at,
+    user: msg.sender === 'user' ? (user?.name || 'User') : 'Omnifin AI',
+  });
+
+  const getOlderCursor = (data, conversationId) => (
+    data.has_more ? { conversationId, before: data.next_before, before_id: data.next_before_id } : null
+  );
+
   const handleLoadPreviousChat = async (conversation) => {
     try {
       const data = await chatService.getConversationMessages(conversation.id);
       setSessionId(conversation.session_id);
       
-      // Map messages to display format
-      const loadedMessages = (data.messages || []).map((msg, idx) => ({
-        id: idx + 1,
-        content: msg.content,
-        sender: msg.sender, // 'user' or 'ai' from backend
-        timestamp: msg.created_at,
-        user: msg.sender === 'user' ? (user?.name || 'User') : 'Omnifin AI',
-      }));
+      const loadedMessages = (data.messages || []).map(toDisplayMessage);
       
       setMessages(loadedMessages);
+      setOlderCursor(getOlderCursor(data, conversation.id));
       
       if (isMobile) setMobileOpen(false);
       
@@ -165,8 +185,26 @@ const ChatPage = () => {
     }
   };
 
+  // Fetch the page before the oldest loaded message when scrolled to the top
+  const handleMessagesScroll = async (event) => {
+    if (event.currentTarget.scrollTop > 50 || !olderCursor || loadingOlder) return;
+    const container = event.currentTarget;
+    try {
+      setLoadingOlder(true);
+      const data = await chatService.getConversationMessages(olderCursor.conversationId, olderCursor);
+      prependScrollHeightRef.current = container.scrollHeight;
+      setMessages((prev) => [...(data.messages || []).map(toDisplayMessage), ...prev]);
+      setOlderCursor(getOlderCursor(data, olderCursor.conversationId));
+    } catch (err) {
+      console.error('Error loading older messages:', err);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const handleNewChat = async () => {
     setMessages([]);
+    setOlderCursor(null);
     setError(null);
     // Create new conversation immediately
     try {
@@ -549,9 +587,18 @@ const ChatPage = () => {
             </Box>
 
             {/* Messages Area */}
-            <Box sx={{ flex: 1, overflowY: 'auto', p: 2, bgcolor: '#f8f9fa' }}>
+            <Box
+              ref={messagesContainerRef}
+              onScroll={handleMessagesScroll}
+              sx={{ flex: 1, overflowY: 'auto', p: 2, bgcolor: '#f8f9fa' }}
+            >
               {sessionId ? (
                 <>
+                  {loadingOlder && (
+                    <Box sx={{ display: 'flex', justifyContent: 'center', py: 1 }}>
+                      <CircularProgress size={20} />
+                    </Box>
+                  )}
                   {messages.length === 0 && (
                     <Box sx={{ textAlign: 'center', mt: 4, opacity: 0.7 }}>
                       <AIIcon sx={{ fontSize: 64, color: 'primary.main', mb: 2, opacity: 0.5 }} />
@@ -57,10 +57,17 @@ export const chatService = {
     }
   },
 
-  // Get specific conversation with all messages
-  getConversationMessages: async (conversationId) => {
+  // Get one page of a conversation's messages (oldest-first within the page)
+  // Without a cursor this is the latest page; pass the previous page's next_before
+  // and next_before_id to fetch the page before it
+  getConversationMessages: async (conversationId, cursor = {}) => {
     try {
       const response = await axios.get(`${API_BASE_URL}/ai/conversations/${conversationId}/messages/`, {
+        params: {
+          limit: cursor.limit || 50,
+          before: cursor.before,
+          before_id: cursor.before_id
+        },
         headers: {
           'Authorization': `Token ${localStorage.getItem('authToken')}`
         }